@@ -0,0 +1,103 @@
+"""
+Microbenchmark for inbound frame parsing and outbound frame encoding.
+
+Compares the previous hot path (json.loads + Model(**data) inbound,
+json.dumps outbound) with the shared codec layer (model_validate_json
+inbound, orjson outbound, and MessagePack for binary clients).
+
+Usage:
+    python benchmarks/bench_codec.py --iterations 100000
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(ROOT)
+from shared.websocket import JSON_CODEC, MSGPACK_CODEC, encode_frame
+
+import msgpack
+
+
+def load_model(relative_path: str, name: str):
+    # Both services have a top-level "models" package, so load the files directly
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+gateway_models = load_model("services/api-gateway/models/websocket_models.py", "gateway_models")
+chat_models = load_model("services/chat-service/models/message_models.py", "chat_models")
+
+INBOUND = {
+    "type": "message",
+    "content": "Hello everyone, how is it going? 👋",
+    "room_id": "room-1",
+    "user_id": "user-42",
+    "timestamp": "2024-01-01T00:00:00Z",
+}
+
+OUTBOUND = {
+    "type": "message",
+    "content": INBOUND["content"],
+    "room_id": "room-1",
+    "user_id": "user-42",
+    "username": "john_doe",
+    "timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc),
+}
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    fn()
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def legacy_dumps(payload: dict) -> bytes:
+    text = json.dumps(payload, default=lambda value: value.isoformat())
+    return text.encode("utf-8")
+
+
+def run(n: int) -> List[Tuple[str, float]]:
+    """(name, ns per frame) for every parse and encode path"""
+    raw_json = json.dumps(INBOUND)
+    raw_json_bytes = raw_json.encode("utf-8")
+    raw_msgpack = msgpack.packb(list(INBOUND.values()))
+
+    results = []
+    for label, model in (("MessageRequest", gateway_models.MessageRequest),
+                         ("WebSocketMessage", chat_models.WebSocketMessage)):
+        results.append((f"parse {label}: json.loads + Model(**data)",
+                        per_call_ns(lambda: model(**json.loads(raw_json)), n)))
+        results.append((f"parse {label}: model_validate_json (bytes)",
+                        per_call_ns(lambda: JSON_CODEC.decode(raw_json_bytes, model), n)))
+        results.append((f"parse {label}: msgpack array",
+                        per_call_ns(lambda: MSGPACK_CODEC.decode(raw_msgpack, model), n)))
+
+    results.append(("encode: json.dumps + utf-8", per_call_ns(lambda: legacy_dumps(OUTBOUND), n)))
+    results.append(("encode: Frame.data (orjson)", per_call_ns(lambda: encode_frame(OUTBOUND).data, n)))
+    results.append(("encode: Frame.packed (msgpack)", per_call_ns(lambda: encode_frame(OUTBOUND).packed, n)))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    width = max(len(name) for name, _ in results)
+    for name, ns in results:
+        print(f"{name:<{width}}  {ns / 1000:8.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
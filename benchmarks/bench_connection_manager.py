@@ -0,0 +1,84 @@
+"""
+Microbenchmark for ConnectionManager room bookkeeping.
+
+Fills the manager with a growing number of rooms and times join_room,
+leave_room and disconnect for a user that belongs to a handful of them.
+With the user -> rooms index the cost per call should stay flat as the
+room count grows.
+
+Usage:
+    python benchmarks/bench_connection_manager.py --rooms 1000 100000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services', 'api-gateway'))
+from utils.connection_manager import ConnectionManager
+
+
+def fresh_manager() -> ConnectionManager:
+    manager = ConnectionManager()
+    manager.logger.setLevel(logging.WARNING)
+    return manager
+
+
+async def bench_rooms(total_rooms: int, user_rooms: int, iterations: int) -> dict:
+    manager = fresh_manager()
+    for i in range(total_rooms):
+        await manager.join_room(f"room-{i}", f"member-{i}")
+
+    # Spread the probe user's rooms across the whole key space
+    step = max(total_rooms // user_rooms, 1)
+    probe_rooms = [f"room-{i * step}" for i in range(user_rooms)]
+
+    join_ns = leave_ns = disconnect_ns = 0
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        for room_id in probe_rooms:
+            await manager.join_room(room_id, "probe")
+        join_ns += time.perf_counter_ns() - start
+
+        start = time.perf_counter_ns()
+        for room_id in probe_rooms:
+            await manager.leave_room(room_id, "probe")
+        leave_ns += time.perf_counter_ns() - start
+
+        for room_id in probe_rooms:
+            await manager.join_room(room_id, "probe")
+        start = time.perf_counter_ns()
+        await manager.disconnect("probe")
+        disconnect_ns += time.perf_counter_ns() - start
+
+    ops = iterations * user_rooms
+    return {
+        "rooms": total_rooms,
+        "join_us": join_ns / ops / 1000,
+        "leave_us": leave_ns / ops / 1000,
+        "disconnect_us": disconnect_ns / iterations / 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--user-rooms", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    results = [await bench_rooms(n, args.user_rooms, args.iterations) for n in args.rooms]
+
+    print(f"{'rooms':>10} {'join us/op':>12} {'leave us/op':>12} {'disconnect us':>14}")
+    for r in results:
+        print(f"{r['rooms']:>10} {r['join_us']:>12.2f} {r['leave_us']:>12.2f} {r['disconnect_us']:>14.2f}")
+
+    if len(results) > 1:
+        ratio = results[-1]["disconnect_us"] / results[0]["disconnect_us"]
+        print(f"\ndisconnect cost ratio {results[-1]['rooms']} vs {results[0]['rooms']} rooms: {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
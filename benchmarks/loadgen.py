@@ -0,0 +1,364 @@
+"""
+WebSocket load generator for /ws/{user_id}.
+
+Opens N simulated users against a running gateway or chat-service, spreads
+them across M rooms, then sends messages and typing events at a target rate.
+Every message carries its send time, so receivers measure end-to-end
+delivery latency. The report is a single JSON document (stdout or --output)
+so runs of different builds can be diffed or checked in CI.
+
+The gateway requires a JWT per user unless it runs with WS_AUTH_REQUIRED=false;
+pass --jwt-key (the gateway's JWT_KEY) to mint one token per simulated user.
+
+Usage:
+    python benchmarks/loadgen.py --url ws://localhost:8000/ws --users 2000 \\
+        --rooms 200 --distribution zipf --message-rate 5000 --duration 30 \\
+        --metrics-url http://localhost:8000/metrics --output report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import urllib.request
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import websockets
+
+# Content prefix that marks messages sent by this tool:
+# "lg|<send perf_counter_ns>|<1 if sent while measuring, else 0>|<padding>"
+MARKER = "lg|"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def assign_rooms(users: int, rooms: int, rooms_per_user: int, distribution: str, zipf_s: float, rng: random.Random) -> List[List[str]]:
+    """Rooms joined by each user; the distribution shapes the room-size histogram"""
+    room_ids = [f"lg-room-{i}" for i in range(rooms)]
+    if distribution == "zipf":
+        # A few very large rooms and a long tail of small ones
+        weights = [1 / (rank ** zipf_s) for rank in range(1, rooms + 1)]
+    else:
+        weights = None
+
+    assignments = []
+    for index in range(users):
+        if distribution == "fixed":
+            # Round robin: every room ends up with the same size (+-1)
+            chosen = {room_ids[(index * rooms_per_user + k) % rooms] for k in range(rooms_per_user)}
+        else:
+            chosen = set()
+            while len(chosen) < min(rooms_per_user, rooms):
+                chosen.add(rng.choices(room_ids, weights)[0])
+        assignments.append(sorted(chosen))
+    return assignments
+
+
+def mint_token(jwt_key: str, user_id: str) -> str:
+    # Same claims auth-service issues; only needed when the gateway enforces auth
+    from jose import jwt
+    return jwt.encode({"sub": user_id, "exp": int(time.time()) + 3600}, jwt_key, algorithm="HS256")
+
+
+def scrape_rss(metrics_url: Optional[str], pid: Optional[int]) -> Optional[int]:
+    """Server RSS from its /metrics endpoint, or from /proc when it runs locally"""
+    if metrics_url:
+        try:
+            with urllib.request.urlopen(metrics_url, timeout=5) as response:
+                for line in response.read().decode("utf-8").splitlines():
+                    if line.startswith("process_resident_memory_bytes "):
+                        return int(float(line.split()[1]))
+        except OSError:
+            return None
+    if pid:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+    return None
+
+
+def raise_fd_limit() -> None:
+    # Thousands of sockets need more than the usual 1024 descriptors
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.measuring = False
+        self.sent = 0
+        self.typing_sent = 0
+        self.expected = 0
+        self.delivered = 0
+        self.received_frames = 0
+        self.errors = Counter()
+        self.latencies_ms: List[float] = []
+        self.connect_ms: List[float] = []
+
+
+class SimulatedUser:
+    def __init__(self, user_id: str, rooms: List[str], args: argparse.Namespace, stats: Stats, room_sizes: Dict[str, int]) -> None:
+        self.user_id = user_id
+        self.rooms = rooms
+        self.args = args
+        self.stats = stats
+        self.room_sizes = room_sizes
+        self.websocket = None
+        self.padding = "x" * args.message_size
+
+    def frame(self, type: str, room_id: str, content: str = "") -> str:
+        return json.dumps({
+            "type": type,
+            "content": content,
+            "room_id": room_id,
+            "user_id": self.user_id,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+
+    async def connect(self) -> bool:
+        url = f"{self.args.url.rstrip('/')}/{self.user_id}"
+        if self.args.jwt_key:
+            url += f"?token={mint_token(self.args.jwt_key, self.user_id)}"
+        started = time.perf_counter()
+        try:
+            self.websocket = await websockets.connect(
+                url,
+                open_timeout=self.args.connect_timeout,
+                ping_interval=None,
+                compression=None,
+                max_size=None
+            )
+        except Exception as e:
+            self.stats.errors[f"connect:{type(e).__name__}"] += 1
+            return False
+        self.stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+        for room_id in self.rooms:
+            await self.websocket.send(self.frame("join_room", room_id))
+        return True
+
+    async def read(self) -> None:
+        stats = self.stats
+        try:
+            async for raw in self.websocket:
+                received_ns = time.perf_counter_ns()
+                stats.received_frames += 1
+                content = raw if isinstance(raw, str) else raw.decode("utf-8", "replace")
+                if content.startswith("{"):
+                    # chat-service wraps broadcasts in a JSON message frame
+                    try:
+                        payload = json.loads(content)
+                    except ValueError:
+                        continue
+                    if payload.get("type") == "ping":
+                        # Server heartbeat; idle simulated users must not be reaped
+                        await self.websocket.send('{"type":"pong"}')
+                        continue
+                    if payload.get("type") == "error":
+                        stats.errors[f"server:{payload.get('message')}"] += 1
+                        continue
+                    if payload.get("type") != "message":
+                        continue
+                    content = payload.get("content") or ""
+                # The gateway relays the content string as is
+                if content.startswith(MARKER):
+                    _, sent_ns, measured, _ = content.split("|", 3)
+                    if measured == "1":
+                        stats.latencies_ms.append((received_ns - int(sent_ns)) / 1e6)
+                        stats.delivered += 1
+        except websockets.ConnectionClosed as e:
+            if e.rcvd is None or e.rcvd.code not in (1000, 1001):
+                stats.errors[f"closed:{e.rcvd.code if e.rcvd else 'abnormal'}"] += 1
+
+    async def send_loop(self, message_rate: float, typing_rate: float, stop_at: float, rng: random.Random) -> None:
+        """Poisson arrivals for messages and typing events, merged into one loop"""
+        total_rate = message_rate + typing_rate
+        if total_rate <= 0 or not self.rooms:
+            return
+        loop = asyncio.get_running_loop()
+        next_at = loop.time() + rng.expovariate(total_rate)
+        while next_at < stop_at:
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            room_id = rng.choice(self.rooms)
+            try:
+                if rng.random() < message_rate / total_rate:
+                    measuring = self.stats.measuring
+                    content = f"{MARKER}{time.perf_counter_ns()}|{int(measuring)}|{self.padding}"
+                    await self.websocket.send(self.frame("message", room_id, content))
+                    if measuring:
+                        self.stats.sent += 1
+                        self.stats.expected += self.room_sizes[room_id] - 1
+                else:
+                    await self.websocket.send(self.frame("typing", room_id))
+                    if self.stats.measuring:
+                        self.stats.typing_sent += 1
+            except websockets.ConnectionClosed:
+                return
+            next_at += rng.expovariate(total_rate)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    stats = Stats()
+    assignments = assign_rooms(args.users, args.rooms, args.rooms_per_user, args.distribution, args.zipf_s, rng)
+    room_sizes: Dict[str, int] = Counter(room for rooms in assignments for room in rooms)
+    users = [
+        SimulatedUser(f"{args.user_prefix}{index}", rooms, args, stats, room_sizes)
+        for index, rooms in enumerate(assignments)
+    ]
+
+    rss_before = scrape_rss(args.metrics_url, args.server_pid)
+
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(user: SimulatedUser) -> bool:
+        async with semaphore:
+            return await user.connect()
+
+    ramp_started = time.perf_counter()
+    connected = await asyncio.gather(*(connect(user) for user in users))
+    ramp_seconds = time.perf_counter() - ramp_started
+    live = [user for user, ok in zip(users, connected) if ok]
+    readers = [asyncio.create_task(user.read()) for user in live]
+
+    # Let joins settle before anything is measured
+    await asyncio.sleep(args.settle)
+
+    loop = asyncio.get_running_loop()
+    message_rate = args.message_rate / max(len(live), 1)
+    typing_rate = args.typing_rate / max(len(live), 1)
+    warmup_until = loop.time() + args.warmup
+    stop_at = warmup_until + args.duration
+    senders = [
+        asyncio.create_task(user.send_loop(message_rate, typing_rate, stop_at, random.Random(rng.random())))
+        for user in live
+    ]
+
+    await asyncio.sleep(args.warmup)
+    stats.measuring = True
+    measure_started = time.perf_counter()
+    await asyncio.gather(*senders)
+    send_seconds = time.perf_counter() - measure_started
+
+    # Messages still in flight when sending stops are given time to arrive
+    await asyncio.sleep(args.drain)
+    stats.measuring = False
+    measured_seconds = time.perf_counter() - measure_started
+
+    rss_peak = scrape_rss(args.metrics_url, args.server_pid)
+
+    for user in live:
+        await user.websocket.close()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    latencies = sorted(stats.latencies_ms)
+    connect_ms = sorted(stats.connect_ms)
+    sizes = sorted(room_sizes.values())
+    return {
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("jwt_key", "output")
+        },
+        "connections": {
+            "requested": len(users),
+            "opened": len(live),
+            "failed": len(users) - len(live),
+            "ramp_seconds": round(ramp_seconds, 3),
+            "connect_ms": {
+                "p50": percentile(connect_ms, 0.50),
+                "p99": percentile(connect_ms, 0.99),
+                "max": connect_ms[-1] if connect_ms else None
+            }
+        },
+        "rooms": {
+            "count": len(room_sizes),
+            "size_p50": percentile(sizes, 0.50),
+            "size_p99": percentile(sizes, 0.99),
+            "size_max": sizes[-1] if sizes else 0
+        },
+        "messages": {
+            "sent": stats.sent,
+            "typing_sent": stats.typing_sent,
+            "expected_deliveries": stats.expected,
+            "delivered": stats.delivered,
+            "delivery_ratio": round(stats.delivered / stats.expected, 4) if stats.expected else None,
+            "frames_received": stats.received_frames
+        },
+        "throughput": {
+            "sent_per_second": round(stats.sent / send_seconds, 1) if send_seconds else 0,
+            "delivered_per_second": round(stats.delivered / measured_seconds, 1) if measured_seconds else 0
+        },
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p99": percentile(latencies, 0.99),
+            "p999": percentile(latencies, 0.999),
+            "max": latencies[-1] if latencies else None,
+            "mean": sum(latencies) / len(latencies) if latencies else None
+        },
+        "server": {
+            "rss_bytes_before": rss_before,
+            "rss_bytes_peak": rss_peak
+        },
+        "errors": dict(stats.errors)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000/ws", help="WebSocket base URL; /{user_id} is appended")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--rooms-per-user", type=int, default=1)
+    parser.add_argument("--distribution", choices=("uniform", "zipf", "fixed"), default="uniform",
+                        help="How users are spread across rooms")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Skew for --distribution zipf")
+    parser.add_argument("--message-rate", type=float, default=500, help="Messages per second across all users")
+    parser.add_argument("--typing-rate", type=float, default=0, help="Typing events per second across all users")
+    parser.add_argument("--message-size", type=int, default=64, help="Padding bytes per message")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds of sending")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of unmeasured sending first")
+    parser.add_argument("--settle", type=float, default=1, help="Seconds to wait after joining rooms")
+    parser.add_argument("--drain", type=float, default=2, help="Seconds to wait for in-flight deliveries")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument("--user-prefix", default="lg-user-")
+    parser.add_argument("--jwt-key", default=os.getenv("JWT_KEY"), help="Mint per-user tokens for an authenticated gateway")
+    parser.add_argument("--metrics-url", help="Server /metrics URL, used to read process RSS")
+    parser.add_argument("--server-pid", type=int, help="Local server PID, used to read RSS when there is no /metrics")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+        summary = report["latency_ms"]
+        print(
+            f"delivered {report['messages']['delivered']}/{report['messages']['expected_deliveries']} "
+            f"p50 {summary['p50']} ms p99 {summary['p99']} ms p999 {summary['p999']} ms -> {args.output}",
+            file=sys.stderr
+        )
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+In-process microbenchmarks for the WebSocket building blocks, checked
+against a stored baseline.
+
+Covers ConnectionManager join_room/leave_room/disconnect at growing room
+counts, broadcast fan-out into fake sockets of different speeds, inbound
+frame parse/validate and outbound serialization (bench_connection_manager
+and bench_codec are reused for those).
+
+Two kinds of checks, and either one failing exits non-zero:
+  * Scaling checks compare the same operation at two sizes, e.g. disconnect
+    with 100k rooms vs 1k rooms. They do not depend on the machine, so an
+    O(n) regression fails everywhere.
+  * Baseline checks compare each timing against benchmarks/baseline.json
+    with a generous tolerance, since absolute numbers vary between hosts.
+
+Usage:
+    python benchmarks/microbench.py                    # check
+    python benchmarks/microbench.py --update-baseline  # record on this host
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import bench_codec
+from bench_connection_manager import bench_rooms, fresh_manager
+from shared.websocket import encode_frame
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# (numerator, denominator, max ratio): the numerator runs at 10-100x the size of the denominator
+SCALING_LIMITS = [
+    ("manager.disconnect_us@100000_rooms", "manager.disconnect_us@1000_rooms", 3.0),
+    ("manager.join_us@100000_rooms", "manager.join_us@1000_rooms", 3.0),
+    ("manager.leave_us@100000_rooms", "manager.leave_us@1000_rooms", 3.0),
+    ("broadcast.enqueue_us_per_member@10000", "broadcast.enqueue_us_per_member@1000", 3.0),
+    # Slow consumers must not delay delivery to fast ones (no head-of-line blocking)
+    ("broadcast.fast_drain_ms@10pct_slow", "broadcast.fast_drain_ms@all_fast", 3.0),
+]
+
+
+class Deliveries:
+    """Frames received across a set of fake sockets, awaitable up to a target"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.target = 0
+        self.reached = asyncio.Event()
+
+    def add(self) -> None:
+        self.count += 1
+        if self.count >= self.target:
+            self.reached.set()
+
+    async def wait_for(self, target: int) -> None:
+        self.target = target
+        if self.count < target:
+            self.reached.clear()
+            await self.reached.wait()
+
+
+class FakeSocket:
+    """Stands in for a Starlette WebSocket; `delay` simulates a slow client"""
+
+    def __init__(self, delay: float, expected: int, deliveries: Deliveries = None) -> None:
+        self.delay = delay
+        self.expected = expected
+        self.deliveries = deliveries
+        self.received = 0
+        self.done = asyncio.Event()
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if self.deliveries is not None:
+            self.deliveries.add()
+        if self.received >= self.expected:
+            self.done.set()
+
+
+async def bench_broadcast_enqueue(members: int, iterations: int) -> float:
+    """us per member to fan one frame out into every writer queue"""
+    manager = fresh_manager()
+    deliveries = Deliveries()
+    for index in range(members):
+        user_id = f"member-{index}"
+        await manager.connect(FakeSocket(0, iterations, deliveries), user_id)
+        await manager.join_room("bench-room", user_id)
+    # Every writer parked on its empty queue, as in a quiet room
+    await asyncio.sleep(0)
+
+    frame = encode_frame({"type": "message", "content": "hello", "room_id": "bench-room"})
+    elapsed_ns = 0
+    # Like timeit: collector pauses would dominate the per-member numbers of large rooms
+    gc.disable()
+    for iteration in range(1, iterations + 1):
+        start = time.perf_counter_ns()
+        await manager.broadcast_frame(frame, "bench-room")
+        elapsed_ns += time.perf_counter_ns() - start
+        # Drain fully so each broadcast starts from the same state
+        await deliveries.wait_for(iteration * members)
+        await asyncio.sleep(0)
+    gc.enable()
+
+    for index in range(members):
+        await manager.disconnect(f"member-{index}")
+    return elapsed_ns / iterations / members / 1000
+
+
+async def bench_fast_drain(members: int, slow_fraction: float, broadcasts: int, slow_delay: float) -> float:
+    """ms until every fast member has received all broadcasts, with some slow members in the room"""
+    manager = fresh_manager()
+    fast_sockets: List[FakeSocket] = []
+    slow_every = int(1 / slow_fraction) if slow_fraction else 0
+    for index in range(members):
+        slow = slow_every and index % slow_every == 0
+        socket = FakeSocket(slow_delay if slow else 0, broadcasts)
+        if not slow:
+            fast_sockets.append(socket)
+        user_id = f"member-{index}"
+        await manager.connect(socket, user_id)
+        await manager.join_room("bench-room", user_id)
+
+    frame = encode_frame({"type": "message", "content": "hello", "room_id": "bench-room"})
+    start = time.perf_counter()
+    for _ in range(broadcasts):
+        await manager.broadcast_frame(frame, "bench-room")
+    await asyncio.gather(*(socket.done.wait() for socket in fast_sockets))
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for index in range(members):
+        await manager.disconnect(f"member-{index}")
+    return elapsed
+
+
+async def collect(args: argparse.Namespace) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+
+    # Untimed pass so the first measured size does not pay for imports and cold caches
+    await bench_rooms(1_000, 10, args.iterations)
+
+    for total_rooms in (1_000, 100_000):
+        # 100k rooms make every full collection expensive; keep it out of the per-call cost
+        gc.collect()
+        gc.disable()
+        rooms = await bench_rooms(total_rooms, 10, args.iterations)
+        gc.enable()
+        for key in ("join_us", "leave_us", "disconnect_us"):
+            results[f"manager.{key}@{total_rooms}_rooms"] = rooms[key]
+
+    for members in (1_000, 10_000):
+        results[f"broadcast.enqueue_us_per_member@{members}"] = await bench_broadcast_enqueue(members, 20)
+
+    # Best of a few runs; scheduling noise only ever makes this slower
+    for label, slow_fraction in (("all_fast", 0), ("10pct_slow", 0.1)):
+        runs = [await bench_fast_drain(1_000, slow_fraction, 20, 0.005) for _ in range(3)]
+        results[f"broadcast.fast_drain_ms@{label}"] = min(runs)
+
+    for name, ns in bench_codec.run(args.codec_iterations):
+        results[f"codec.{name}"] = ns / 1000
+
+    return results
+
+
+def check(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    failures = []
+    for numerator, denominator, limit in SCALING_LIMITS:
+        ratio = results[numerator] / results[denominator]
+        status = "ok" if ratio <= limit else "FAIL"
+        print(f"  [{status}] {numerator} / {denominator} = {ratio:.2f}x (limit {limit:.1f}x)")
+        if ratio > limit:
+            failures.append(f"{numerator} is {ratio:.2f}x {denominator}, limit {limit:.1f}x")
+
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if value > reference * tolerance:
+            print(f"  [FAIL] {name}: {value:.2f} vs baseline {reference:.2f} ({value / reference:.2f}x)")
+            failures.append(f"{name} is {value / reference:.2f}x its baseline ({value:.2f} vs {reference:.2f})")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="Iterations per room-bookkeeping benchmark")
+    parser.add_argument("--codec-iterations", type=int, default=20_000)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Allowed slowdown vs baseline, as a factor")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--output", help="Also write this run's results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(collect(args))
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        unit = "ms" if "_ms" in name else "us"
+        print(f"{name:<{width}}  {value:10.3f} {unit}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as output:
+            json.dump({
+                "recorded_on": {"python": platform.python_version(), "machine": platform.machine()},
+                "results": {name: round(value, 3) for name, value in results.items()}
+            }, output, indent=2)
+            output.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    baseline: Dict[str, float] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)["results"]
+    else:
+        print(f"\nno baseline at {args.baseline}; only scaling checks apply")
+
+    print("\nchecks:")
+    failures = check(results, baseline, args.tolerance)
+    if failures:
+        print("\nPERFORMANCE REGRESSION:", file=sys.stderr)
+        for failure in failures:
+            print(f"  - {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("\nall checks passed")
+
+
+if __name__ == "__main__":
+    main()
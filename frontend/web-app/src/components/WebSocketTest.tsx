@@ -16,7 +16,7 @@ const WebSocketTest: React.FC <WebSocketTestParams> = ({username} ) => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputMessage, setInputMessage] = useState('');
   const [isConnected, setIsConnected] = useState(false);
-  const [userId, setUserId] = useState('testuser');
+  const [userId, setUserId] = useState(username);
   const [roomId, setRoomId] = useState<string>('');
   const [currentRoom, setCurrentRoom] = useState<string>('');
   const [availableRooms, setAvailableRooms] = useState<string>('');
@@ -40,7 +40,9 @@ const WebSocketTest: React.FC <WebSocketTestParams> = ({username} ) => {
     }
 
     try {
-      const ws = new WebSocket(`ws://localhost:8000/ws/${userId}`);
+      // The gateway authenticates the handshake with the JWT from login
+      const token = localStorage.getItem('token') ?? '';
+      const ws = new WebSocket(`ws://localhost:8000/ws/${userId}?token=${encodeURIComponent(token)}`);
       wsRef.current = ws;
 
       ws.onopen = () => {
@@ -49,6 +51,11 @@ const WebSocketTest: React.FC <WebSocketTestParams> = ({username} ) => {
       };
 
       ws.onmessage = (event) => {
+        // Answer server heartbeats so the connection is not reaped as dead
+        if (event.data === '{"type":"ping"}') {
+          ws.send('{"type":"pong"}');
+          return;
+        }
         addMessage(event.data, 'received');
       };
 
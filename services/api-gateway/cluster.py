@@ -0,0 +1,89 @@
+"""
+Run several API gateway workers on one host.
+
+All workers accept connections from one shared listening socket, and room
+traffic between them goes over the Unix-socket worker mesh
+(utils/worker_mesh.py). Rooms are assigned to workers by consistent hashing
+of room_id. A worker that exits is started again with the same id; its
+siblings drop it from the ring meanwhile and take it back once it is up.
+
+Usage:
+    python cluster.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+# Pause before restarting a worker that exited, so a crash loop does not spin
+RESTART_DELAY = float(os.getenv("GATEWAY_RESTART_DELAY", "1"))
+
+
+def run_worker(sock: socket.socket, worker_id: int, workers: int, ipc_dir: str, host: str, port: int) -> None:
+    # Must be set before main imports utils.backplane, which reads them once
+    os.environ["GATEWAY_WORKER_ID"] = str(worker_id)
+    os.environ["GATEWAY_WORKERS"] = str(workers)
+    os.environ["GATEWAY_IPC_DIR"] = ipc_dir
+
+    config = uvicorn.Config("main:app", host=host, port=port)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("GATEWAY_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--ipc-dir", default=os.getenv("GATEWAY_IPC_DIR", f"/tmp/socket-hub-{os.getpid()}"))
+    args = parser.parse_args()
+
+    config = uvicorn.Config("main:app", host=args.host, port=args.port)
+    sock = config.bind_socket()
+
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def spawn(worker_id: int):
+        process = context.Process(
+            target=run_worker,
+            args=(sock, worker_id, args.workers, args.ipc_dir, args.host, args.port),
+            name=f"gateway-worker-{worker_id}"
+        )
+        process.start()
+        return process
+
+    processes = {worker_id: spawn(worker_id) for worker_id in range(args.workers)}
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while not stopping:
+        sentinels = {process.sentinel: worker_id for worker_id, process in processes.items()}
+        for sentinel in multiprocessing.connection.wait(list(sentinels)):
+            worker_id = sentinels[sentinel]
+            processes[worker_id].join()
+            if stopping:
+                break
+            print(f"gateway-worker-{worker_id} exited with {processes[worker_id].exitcode}; restarting")
+            time.sleep(RESTART_DELAY)
+            if not stopping:
+                processes[worker_id] = spawn(worker_id)
+
+    for process in processes.values():
+        process.join()
+    sock.close()
+
+if __name__ == "__main__":
+    main()
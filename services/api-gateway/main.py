@@ -1,9 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 
 from routes.health import router as health_router
 from routes.api import router as api_router
+from routes.api import create_upstream_client
 from routes.websocket import router as ws_router
+from routes.websocket import WS_AUTH_REQUIRED, manager
+from routes.metrics import router as metrics_router
+from utils.admission import admission
+from utils.backplane import create_backplane
+from utils.token_verifier import jwt_key_error
 import sys
 import os
 
@@ -14,15 +21,41 @@ from shared.logging import SocketHubLogger
 # Crear logger para api-gateway
 logger = SocketHubLogger("api-gateway").get_logger()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sin una JWT_KEY válida cualquiera podría firmar tokens para cualquier user_id
+    key_error = jwt_key_error()
+    if WS_AUTH_REQUIRED and key_error is not None:
+        logger.error(f"❌ WebSocket auth is required but {key_error}")
+        raise RuntimeError(key_error)
+
+    # One keep-alive pool for all proxied requests instead of a client per call
+    app.state.upstream_client = create_upstream_client()
+
+    backplane = create_backplane()
+    if backplane is not None:
+        await manager.attach_backplane(backplane)
+        logger.info(f"✅ Backplane attached (node {backplane.node_id})")
+
+    # Mide el lag del event loop para rechazar handshakes cuando está saturado
+    admission.start()
+
+    logger.info("🚀 API Gateway started successfully")
+    yield
+
+    logger.info("🛑 API Gateway shutting down...")
+    await admission.close()
+    await manager.heartbeat.close()
+    await manager.detach_backplane()
+    await app.state.upstream_client.aclose()
+
 app = FastAPI(
     title="API gateway",
     description="app gateway to end user",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Log startup
-logger.info("🚀 API Gateway started successfully")
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -34,6 +67,7 @@ app.add_middleware(
 app.include_router(health_router)
 app.include_router(api_router)
 app.include_router(ws_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 async def root():
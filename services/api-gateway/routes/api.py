@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import os
+import sys
+import time
 from typing import Dict
 
+# Agregar el directorio shared al path para importar las métricas
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.metrics import REGISTRY, REQUEST_BUCKETS
+
 router = APIRouter(
     prefix="/api",
     tags=["api gateway"]
@@ -11,6 +18,51 @@ router = APIRouter(
 
 AUTH_SERVICE_URL =  os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
 
+# Shared upstream pool, created once by the app lifespan
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+
+# Connection-level headers that must not be forwarded by a proxy (RFC 9110 7.6.1)
+HOP_BY_HOP_HEADERS = {
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+    b"host",
+}
+
+AUTH_UPSTREAM_SECONDS = REGISTRY.histogram(
+    "socket_hub_auth_upstream_seconds",
+    "Time until auth-service returned response headers to the proxy.",
+    REQUEST_BUCKETS
+)
+AUTH_UPSTREAM_ERRORS = REGISTRY.counter(
+    "socket_hub_auth_upstream_errors_total",
+    "Proxied auth requests that failed before auth-service responded."
+)
+
+
+def create_upstream_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT)
+    )
+
+
+def get_upstream_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.upstream_client
+
+
 @router.get("/")
 def read_root()-> Dict[str, str]:
     return {
@@ -18,24 +70,41 @@ def read_root()-> Dict[str, str]:
         "docs": "/docs"
     }
 @router.api_route("/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def auth_proxy(request: Request, path: str):
-    
+async def auth_proxy(request: Request, path: str, client: httpx.AsyncClient = Depends(get_upstream_client)):
+
     target_url = f"{AUTH_SERVICE_URL}/auth/{path}"
-    body = await request.body()
-    headers = dict (request.headers)
-    headers.pop("host", None)
-
-    async with httpx.AsyncClient() as client:
-        response = await client.request(
-            method=request.method,
-            url=target_url,
-            headers=headers,
-            content=body,
-            params=request.query_params
-        )
+    headers = [
+        (name, value) for name, value in request.headers.raw
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    ]
+    # Stream the body through instead of buffering it; bodiless requests stay bodiless
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+
+    upstream_request = client.build_request(
+        method=request.method,
+        url=target_url,
+        headers=headers,
+        content=request.stream() if has_body else None,
+        params=request.query_params
+    )
+    started = time.perf_counter()
+    try:
+        response = await client.send(upstream_request, stream=True)
+    except httpx.RequestError:
+        AUTH_UPSTREAM_ERRORS.inc()
+        raise HTTPException(status_code=502, detail="Auth service unavailable")
+
+    AUTH_UPSTREAM_SECONDS.observe(time.perf_counter() - started)
+
+    response_headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in response.headers.raw
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    }
+    # The pooled connection goes back to the pool once the body is fully relayed
     return StreamingResponse(
-        content=response.aiter_bytes(),
+        content=response.aiter_raw(),
         status_code=response.status_code,
-        headers=dict(response.headers)
+        headers=response_headers,
+        background=BackgroundTask(response.aclose)
     )
-    
\ No newline at end of file
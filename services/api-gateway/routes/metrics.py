@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+import sys
+import os
+
+# Agregar el directorio shared al path para importar las métricas
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.metrics import CONTENT_TYPE, REGISTRY
+
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics")
+async def metrics() -> Response:
+    """Runtime metrics in Prometheus text format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
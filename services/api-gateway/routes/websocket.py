@@ -1,58 +1,105 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
-import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from typing import Dict, Optional
+import logging
 import sys
 import os
 
 from models.websocket_models import MessageRequest, MessageResponse
+from utils.admission import admission, reject_handshake
 from utils.connection_manager import ConnectionManager
+from utils.token_verifier import authenticate
 
 # Agregar el directorio shared al path para importar el logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 from shared.logging import SocketHubLogger
+from shared.websocket import negotiate_codec
 
 # Crear logger para websocket
-logger = SocketHubLogger("api-gateway").get_logger()
+hub_logger = SocketHubLogger("api-gateway")
+logger = hub_logger.get_logger()
+
+# Logs por mensaje: limitados por punto de log y resumidos cada ventana
+sampler = hub_logger.get_sampler()
+log_handshake = sampler.site("ws_handshake")
+log_join = sampler.site("ws_join")
+log_leave = sampler.site("ws_leave")
+log_message = sampler.site("ws_message")
+log_shed = sampler.site("ws_shed", level=logging.WARNING)
 
 
 manager = ConnectionManager()
 
+WS_AUTH_REQUIRED = os.getenv("WS_AUTH_REQUIRED", "true").lower() == "true"
+
 router = APIRouter(
     prefix="/ws",
     tags=["websocker router"]
 )
 
+def _handshake_token(websocket: WebSocket) -> Optional[str]:
+    """Browsers cannot set headers on WebSocket, so ?token= is accepted too"""
+    token = websocket.query_params.get("token")
+    if token:
+        return token
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return None
+
 @router.websocket("/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    logger.info(f"🔌 User {user_id} connecting via WebSocket")
-    await websocket.accept()
-    logger.info(f"✅ User {user_id} connected successfully")
+    # Control de admisión antes de verificar el token: rechazar debe ser barato
+    rejection = admission.admit(len(manager.active_connections))
+    if rejection is not None:
+        reason, retry_after = rejection
+        log_shed.log("⚠️ Shedding WebSocket handshake for %s (%s, retry after %.1fs)", user_id, reason, retry_after)
+        await reject_handshake(websocket, reason, retry_after)
+        return
+
+    log_handshake.log("🔌 User %s connecting via WebSocket", user_id)
+    if WS_AUTH_REQUIRED:
+        token = _handshake_token(websocket)
+        claims = authenticate(token) if token else None
+        if claims is None or claims["sub"] != user_id:
+            logger.warning("⚠️ Rejected WebSocket handshake for %s: invalid or missing token", user_id)
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+    codec = negotiate_codec(websocket)
+    writer = await manager.connect(websocket, user_id, codec)
+    log_handshake.log("✅ User %s connected successfully (%s)", user_id, codec.name)
+    heartbeat = manager.heartbeat
 
     try:
         while True:
-            raw_data = await websocket.receive_text()
-            logger.debug(f"📨 Message received from {user_id}: {raw_data}")
+            raw_data = await codec.receive(websocket)
+            heartbeat.seen(writer)
+            # ping/pong del heartbeat: no pasan por la validación de mensajes
+            if heartbeat.handle_control(raw_data, writer):
+                continue
+            logger.debug("📨 Message received from %s: %s", user_id, raw_data)
 
-            data = json.loads(raw_data)
-            msg = MessageRequest(**data)
+            msg = codec.decode(raw_data, MessageRequest)
             
             if msg.type == "join_room":
-                logger.info(f"🚪 User {user_id} joining room: {msg.room_id}")
-                await manager.join_room(msg.room_id, msg.user_id)
+                log_join.log("🚪 User %s joining room: %s", user_id, msg.room_id)
+                await manager.join_room(msg.room_id, user_id)
                 
             elif msg.type == "leave_room":
-                logger.info(f"🚪 User {user_id} leaving room: {msg.room_id}")
-                await manager.leave_room(msg.room_id, msg.user_id)
+                log_leave.log("🚪 User %s leaving room: %s", user_id, msg.room_id)
+                await manager.leave_room(msg.room_id, user_id)
                 
             elif msg.type == "message":
-                logger.info(f"💬 User {user_id} sending message to room: {msg.room_id}")
-                await manager.send_personal_message(msg.content, msg.user_id)
+                log_message.log("💬 User %s sending message to room: %s", user_id, msg.room_id)
+                await manager.broadcast_to_room(msg.content, msg.room_id, exclude_user=user_id)
 
-            await websocket.send_text(f"Echo: {data}")
-            logger.debug(f"📤 Echo sent to {user_id}")
+            await manager.send_personal_message(f"Echo: {msg.model_dump(mode='json')}", user_id)
+            logger.debug("📤 Echo queued for %s", user_id)
 
     except WebSocketDisconnect:
-        logger.info(f"🔌 User {user_id} disconnected")
+        log_handshake.log("🔌 User %s disconnected", user_id)
+        await manager.disconnect(user_id, writer)
     except Exception as e:
-        logger.error(f"❌ WebSocket error for user {user_id}: {e}")
+        logger.error("❌ WebSocket error for user %s: %s", user_id, e)
+        await manager.disconnect(user_id, writer)
         raise
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from utils.backplane import InMemoryBackplane, InMemoryBroker
+from utils.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def _eventually(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_managers_are_independent():
+    assert ConnectionManager() is not ConnectionManager()
+
+
+def test_broadcast_on_one_node_reaches_members_on_another():
+    async def scenario():
+        broker = InMemoryBroker()
+        node_a, node_b = ConnectionManager(), ConnectionManager()
+        await node_a.attach_backplane(InMemoryBackplane(broker, "node-a"))
+        await node_b.attach_backplane(InMemoryBackplane(broker, "node-b"))
+
+        alice = FakeWebSocket()
+        await node_a.connect(alice, "alice")
+        await node_a.join_room("general", "alice")
+        assert "general" not in node_b.room_connections
+
+        await node_b.broadcast_to_room(json.dumps({"content": "hi"}), "general")
+        await _eventually(lambda: alice.sent == ['{"content": "hi"}'])
+        assert broker.published == 1
+
+        # The last local member leaving drops the node's subscription
+        await node_a.disconnect("alice")
+        assert "general" not in broker.subscribers
+        for node in (node_a, node_b):
+            await node.detach_backplane()
+            await node.heartbeat.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import logging
+
+from shared.logging.sampling import SampledLogSite
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(record.getMessage())
+
+
+def _logger(name: str):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def test_burst_then_one_in_n_then_summary():
+    logger, handler = _logger("test.sampling.burst")
+    site = SampledLogSite(logger, "broadcast", timing="fanout", interval=3600, burst=2, sample_rate=10)
+    for number in range(25):
+        site.log("event %d", number, elapsed=0.003)
+    assert handler.lines == ["event 0", "event 1", "event 9", "event 19"]
+
+    site.flush()
+    assert handler.lines[-1] == "broadcast x 25 in last 0s, p99 fanout 3.0ms"
+    # A window without suppressed events writes no summary
+    site.log("event %d", 25)
+    site.flush()
+    assert handler.lines[-1] == "event 25"
+
+
+def test_window_closes_without_another_event():
+    logger, handler = _logger("test.sampling.roll")
+    site = SampledLogSite(logger, "join", interval=10, burst=1)
+    for _ in range(3):
+        site.log("join")
+    site.roll_if_due(site._window_end - 1)
+    assert handler.lines == ["join"]
+    site.roll_if_due(site._window_end)
+    assert handler.lines == ["join", "join x 3 in last 10s"]
+
+
+def test_disabled_level_skips_formatting():
+    logger, handler = _logger("test.sampling.disabled")
+    logger.setLevel(logging.WARNING)
+    site = SampledLogSite(logger, "broadcast")
+    site.log("never formatted %d", object())
+    site.flush()
+    assert handler.lines == []
+    assert site._count == 0
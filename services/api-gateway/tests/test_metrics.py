@@ -0,0 +1,81 @@
+from fastapi.testclient import TestClient
+
+import main
+from shared.metrics import Registry
+from shared.websocket.metrics import register_connection_metrics
+from shared.websocket.rooms import RoomRegistry
+
+
+class FakeWriter:
+    depth = 3
+
+
+def _sample(text: str, name: str) -> str:
+    lines = [line for line in text.splitlines() if line.startswith(name + " ")]
+    assert len(lines) == 1, lines
+    return lines[0].split()[1]
+
+
+def test_managers_share_one_set_of_series():
+    registry = Registry()
+    first, second = RoomRegistry(), RoomRegistry()
+    register_connection_metrics({"alice": FakeWriter()}, first, registry)
+    register_connection_metrics({}, second, registry)
+    first.join("r", "alice")
+    second.join("r", "bob")
+    second.join("s", "bob")
+
+    text = registry.render()
+    assert text.count("# TYPE socket_hub_ws_active_connections ") == 1
+    assert float(_sample(text, "socket_hub_ws_rooms")) == 3
+    assert float(_sample(text, "socket_hub_ws_active_connections")) == 1
+    assert float(_sample(text, "socket_hub_ws_send_queue_depth_max")) == 3
+
+    del first
+    text = registry.render()
+    assert float(_sample(text, "socket_hub_ws_rooms")) == 2
+
+
+def test_render_is_prometheus_text():
+    registry = Registry()
+    frames = registry.counter("frames_total", "Frames.")
+    assert registry.counter("frames_total", "Frames.") is frames
+    frames.inc(3)
+    registry.gauge("open", "Open things.", lambda: 7)
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        latency.observe(value)
+    collected = Registry().histogram("sizes", "Sizes.", buckets=(1,))
+    registry.add_collector(lambda: [collected])
+
+    assert registry.render().splitlines() == [
+        "# HELP frames_total Frames.",
+        "# TYPE frames_total counter",
+        "frames_total 3",
+        "# HELP open Open things.",
+        "# TYPE open gauge",
+        "open 7",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+        "# HELP sizes Sizes.",
+        "# TYPE sizes histogram",
+        'sizes_bucket{le="1"} 0',
+        'sizes_bucket{le="+Inf"} 0',
+        "sizes_sum 0.0",
+        "sizes_count 0",
+    ]
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(main, "WS_AUTH_REQUIRED", False)
+    with TestClient(main.app) as client:
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE socket_hub_ws_frames_out_total counter" in response.text
+    assert response.text.count("# TYPE socket_hub_ws_active_connections ") == 1
@@ -0,0 +1,113 @@
+import asyncio
+
+from shared.websocket.frames import Frame
+from shared.websocket.outbound import SLOW_CONSUMER_CLOSE_CODE, ConnectionWriter, OverflowPolicy
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False) -> None:
+        self.sent = []
+        self.closed_with = None
+        self.fail = fail
+
+    async def send_text(self, text: str) -> None:
+        if self.fail:
+            raise RuntimeError("socket is gone")
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+def _queued(writer: ConnectionWriter):
+    return [frame.text for frame in writer._queue]
+
+
+def _fill(writer: ConnectionWriter, *frames) -> None:
+    for text, droppable in frames:
+        assert writer.enqueue(Frame(text, droppable))
+
+
+def test_writer_sends_frames_in_order():
+    async def scenario():
+        websocket = FakeWebSocket()
+        writer = ConnectionWriter(websocket, "alice", max_queue=8)
+        writer.start()
+        _fill(writer, ("a", False), ("b", True), ("c", False))
+        for _ in range(100):
+            if len(websocket.sent) == 3:
+                break
+            await asyncio.sleep(0.01)
+        assert websocket.sent == ["a", "b", "c"]
+        assert writer.depth == 0
+        await writer.close()
+        assert not writer.enqueue(Frame("d"))
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_evicts_the_head():
+    async def scenario():
+        writer = ConnectionWriter(FakeWebSocket(), "alice", max_queue=2, policy=OverflowPolicy.DROP_OLDEST)
+        _fill(writer, ("a", False), ("b", True), ("c", False))
+        assert _queued(writer) == ["b", "c"]
+        assert writer.dropped == 1
+
+    asyncio.run(scenario())
+
+
+def test_drop_typing_first_evicts_typing_before_messages():
+    async def scenario():
+        writer = ConnectionWriter(FakeWebSocket(), "alice", max_queue=3, policy=OverflowPolicy.DROP_TYPING_FIRST)
+        _fill(writer, ("a", False), ("typing", True), ("b", False))
+        assert writer.enqueue(Frame("c"))
+        assert _queued(writer) == ["a", "b", "c"]
+
+        # A full queue of messages turns new typing frames away...
+        assert not writer.enqueue(Frame("typing", True))
+        assert _queued(writer) == ["a", "b", "c"]
+        # ...and makes room for messages by dropping the oldest one
+        assert writer.enqueue(Frame("d"))
+        assert _queued(writer) == ["b", "c", "d"]
+        assert writer.dropped == 3
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_policy_closes_a_slow_consumer():
+    async def scenario():
+        websocket = FakeWebSocket()
+        closed = []
+
+        async def on_close(writer):
+            closed.append(writer)
+
+        writer = ConnectionWriter(websocket, "alice", max_queue=1, policy=OverflowPolicy.DISCONNECT, on_close=on_close)
+        _fill(writer, ("a", False))
+        assert not writer.enqueue(Frame("b"))
+        assert writer.closed
+        assert writer.depth == 0
+        await asyncio.sleep(0)
+        assert websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+        assert closed == [writer]
+        assert not writer.enqueue(Frame("c"))
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_notifies_the_owner():
+    async def scenario():
+        closed = []
+
+        async def on_close(writer):
+            closed.append(writer)
+
+        writer = ConnectionWriter(FakeWebSocket(fail=True), "alice", on_close=on_close)
+        writer.start()
+        _fill(writer, ("a", False), ("b", False))
+        await asyncio.sleep(0.01)
+        assert closed == [writer]
+        assert writer.closed
+        assert writer.depth == 0
+
+    asyncio.run(scenario())
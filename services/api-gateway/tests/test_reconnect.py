@@ -0,0 +1,61 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from routes import websocket as ws_routes
+from utils.connection_manager import SESSION_REPLACED_CLOSE_CODE
+
+
+def _frame(kind: str, user_id: str, room_id: str = "r") -> str:
+    return json.dumps({
+        "type": kind,
+        "content": "",
+        "room_id": room_id,
+        "user_id": user_id,
+        "timestamp": "2024-01-01T00:00:00Z"
+    })
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "WS_AUTH_REQUIRED", False)
+    monkeypatch.setattr(ws_routes, "WS_AUTH_REQUIRED", False)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _join(socket, user_id: str) -> None:
+    socket.send_text(_frame("join_room", user_id))
+    assert socket.receive_text().startswith("Echo:")
+
+
+def test_reconnect_keeps_the_new_session_when_the_old_socket_goes_away(client):
+    manager = ws_routes.manager
+    with client.websocket_connect("/ws/bob") as bob:
+        _join(bob, "bob")
+        old = client.websocket_connect("/ws/alice").__enter__()
+        _join(old, "alice")
+        with client.websocket_connect("/ws/alice") as new:
+            # The replaced socket is closed by the server
+            with pytest.raises(WebSocketDisconnect) as closed:
+                old.receive_text()
+            assert closed.value.code == SESSION_REPLACED_CLOSE_CODE
+            old.__exit__(None, None, None)
+
+            _join(new, "alice")
+            assert manager.writers["alice"] is not None
+            assert manager.room_connections["r"] == {"alice", "bob"}
+
+            bob.send_text(_frame("message", "bob"))
+            bob.receive_text()
+            assert new.receive_text() == ""
+        # The handler of the new socket cleans up once its close is processed
+        deadline = time.monotonic() + 2
+        while "alice" in manager.writers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "alice" not in manager.writers
+        assert manager.room_connections["r"] == {"bob"}
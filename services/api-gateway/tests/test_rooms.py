@@ -0,0 +1,72 @@
+import asyncio
+
+from shared.websocket.rooms import RoomRegistry
+from utils.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def test_join_and_leave_keep_both_indexes_in_step():
+    rooms = RoomRegistry()
+    assert rooms.join("a", "alice")
+    assert not rooms.join("a", "bob")
+    assert rooms.join("b", "alice")
+    assert rooms.members("a") == {"alice", "bob"}
+    assert rooms.rooms_of("alice") == {"a", "b"}
+
+    assert rooms.leave("a", "alice")
+    assert not rooms.leave("a", "alice")
+    assert not rooms.leave("missing", "alice")
+    assert rooms.members("a") == {"bob"}
+    assert rooms.rooms_of("alice") == {"b"}
+
+    # The last member leaving drops the room and the user's entry
+    assert rooms.leave("b", "alice")
+    assert "b" not in rooms
+    assert "alice" not in rooms.user_rooms
+
+
+def test_remove_user_leaves_every_room():
+    rooms = RoomRegistry()
+    for room_id in ("a", "b", "c"):
+        rooms.join(room_id, "alice")
+    rooms.join("b", "bob")
+
+    assert sorted(rooms.remove_user("alice")) == ["a", "b", "c"]
+    assert rooms.rooms == {"b": {"bob"}}
+    assert rooms.user_rooms == {"bob": {"b"}}
+    assert rooms.remove_user("alice") == []
+
+
+def test_disconnect_cleans_up_the_users_rooms():
+    async def scenario():
+        manager = ConnectionManager()
+        for user_id in ("alice", "bob"):
+            await manager.connect(FakeWebSocket(), user_id)
+        for room_id in ("a", "b"):
+            await manager.join_room(room_id, "alice")
+        await manager.join_room("b", "bob")
+
+        await manager.leave_room("a", "alice")
+        assert "a" not in manager.room_connections
+
+        await manager.disconnect("alice")
+        assert manager.room_connections == {"b": {"bob"}}
+        assert manager.rooms.rooms_of("alice") == set()
+        assert "alice" not in manager.writers
+
+        await manager.disconnect("bob")
+        assert manager.room_connections == {}
+        assert manager.rooms.user_rooms == {}
+        await manager.heartbeat.close()
+
+    asyncio.run(scenario())
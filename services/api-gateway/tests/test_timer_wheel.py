@@ -0,0 +1,50 @@
+from shared.websocket.timer_wheel import TimerWheel
+
+
+def _advance_until(wheel: TimerWheel, tick: int) -> dict:
+    """Advance to `tick` and return key -> tick it expired at"""
+    expired = {}
+    while wheel.now < tick:
+        for key in wheel.advance():
+            expired[key] = wheel.now
+    return expired
+
+
+def test_near_deadlines_expire_on_their_tick():
+    wheel = TimerWheel(slots=8, levels=3)
+    wheel.schedule("a", 1)
+    wheel.schedule("b", 5)
+    wheel.schedule("c", 5)
+    assert _advance_until(wheel, 10) == {"a": 1, "b": 5, "c": 5}
+    assert len(wheel) == 0
+
+
+def test_far_deadlines_cascade_down_to_the_exact_tick():
+    wheel = TimerWheel(slots=8, levels=3)
+    # Level 1 covers 8..63 ticks ahead, level 2 64..511, beyond that is past the horizon
+    deadlines = {"l1": 13, "l1-edge": 63, "l2": 100, "l2-far": 450, "beyond": 1000}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    assert _advance_until(wheel, 1100) == deadlines
+
+
+def test_touch_defers_without_moving_and_cancel_forgets():
+    wheel = TimerWheel(slots=8, levels=2)
+    wheel.schedule("talker", 4)
+    wheel.schedule("quiet", 4)
+    wheel.schedule("gone", 4)
+    wheel.touch("talker", 30)
+    wheel.touch("unknown", 30)
+    wheel.cancel("gone")
+    assert "unknown" not in wheel and "gone" not in wheel
+    assert _advance_until(wheel, 40) == {"quiet": 4, "talker": 30}
+
+
+def test_schedule_earlier_replaces_later_deadline():
+    wheel = TimerWheel(slots=8, levels=2)
+    wheel.schedule("key", 20)
+    wheel.schedule("key", 3)
+    assert _advance_until(wheel, 25) == {"key": 3}
+    # Deadlines in the past fire on the next tick
+    wheel.schedule("late", 0)
+    assert wheel.advance() == ["late"]
@@ -0,0 +1,32 @@
+from jose import jwt
+
+from utils import token_verifier
+
+KEY = "k" * 32
+
+
+def _use_key(monkeypatch, key):
+    monkeypatch.setattr(token_verifier, "JWT_KEY", key)
+    monkeypatch.setattr(token_verifier, "_JWT_KEY_ERROR", token_verifier.jwt_key_error())
+
+
+def test_valid_key_accepts_signed_token(monkeypatch):
+    _use_key(monkeypatch, KEY)
+    claims = token_verifier.verify_token(jwt.encode({"sub": "alice"}, KEY, "HS256"))
+    assert claims["sub"] == "alice"
+
+
+def test_token_without_sub_is_rejected(monkeypatch):
+    _use_key(monkeypatch, KEY)
+    assert token_verifier.verify_token(jwt.encode({"name": "alice"}, KEY, "HS256")) is None
+
+
+def test_empty_key_rejects_tokens_signed_with_it(monkeypatch):
+    _use_key(monkeypatch, "")
+    assert token_verifier.jwt_key_error() is not None
+    assert token_verifier.verify_token(jwt.encode({"sub": "alice"}, "", "HS256")) is None
+
+
+def test_short_key_rejects_every_token(monkeypatch):
+    _use_key(monkeypatch, "short")
+    assert token_verifier.verify_token(jwt.encode({"sub": "alice"}, "short", "HS256")) is None
@@ -0,0 +1,78 @@
+import asyncio
+
+from shared.websocket import Frame
+
+from utils import worker_mesh
+from utils.worker_mesh import LocalMeshBackplane
+
+
+def _room_owned_by(mesh, worker):
+    return next(f"room-{i}" for i in range(1000) if mesh.owner_of(f"room-{i}") == worker)
+
+
+async def _start_mesh(ipc_dir, count):
+    received = {worker: [] for worker in range(count)}
+    meshes = [LocalMeshBackplane(worker, count, str(ipc_dir), "node") for worker in range(count)]
+
+    def collector(worker):
+        async def on_message(room_id, frame, exclude_user):
+            received[worker].append((room_id, frame.text))
+        return on_message
+
+    await asyncio.gather(*(mesh.start(collector(mesh.worker_id)) for mesh in meshes))
+    return meshes, received
+
+
+async def _eventually(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_publish_reaches_interested_workers_through_owner(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_mesh, "STARTUP_GRACE", 1.0)
+
+    async def scenario():
+        meshes, received = await _start_mesh(tmp_path, 3)
+        room = _room_owned_by(meshes[0], 2)
+        await meshes[0].subscribe(room)
+        await _eventually(lambda: meshes[2].interest.get(room) == {0})
+
+        await meshes[1].publish(room, Frame("hello"))
+        await _eventually(lambda: received[0] == [(room, "hello")])
+        assert received[1] == [] and received[2] == []
+        for mesh in meshes:
+            await mesh.close()
+
+    asyncio.run(scenario())
+
+
+def test_dead_worker_leaves_ring_and_its_rooms_move(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_mesh, "STARTUP_GRACE", 1.0)
+    monkeypatch.setattr(worker_mesh, "PEER_RETRY_INTERVAL", 0.05)
+
+    async def scenario():
+        meshes, received = await _start_mesh(tmp_path, 3)
+        room = _room_owned_by(meshes[0], 2)
+        await meshes[0].subscribe(room)
+        await _eventually(lambda: meshes[2].interest.get(room) == {0})
+
+        await meshes[2].close()
+        await _eventually(lambda: 2 not in meshes[0].live_peers and 2 not in meshes[1].live_peers)
+        new_owner = meshes[1].owner_of(room)
+        assert new_owner != 2
+        await _eventually(lambda: meshes[new_owner].interest.get(room) == {0})
+
+        await meshes[1].publish(room, Frame("after"))
+        await _eventually(lambda: received[0] == [(room, "after")])
+
+        # A restarted worker is put back on the ring and gets its rooms' interest again
+        restarted = LocalMeshBackplane(2, 3, str(tmp_path), "node")
+        await restarted.start(lambda *message: asyncio.sleep(0))
+        await _eventually(lambda: 2 in meshes[0].live_peers and 2 in meshes[1].live_peers)
+        await _eventually(lambda: restarted.interest.get(room) == {0})
+        for mesh in (meshes[0], meshes[1], restarted):
+            await mesh.close()
+
+    asyncio.run(scenario())
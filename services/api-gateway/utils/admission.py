@@ -0,0 +1,112 @@
+from fastapi import WebSocket
+from typing import Optional, Tuple
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Agregar el directorio shared al path para importar el rate limiter
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.metrics import REGISTRY
+from shared.websocket import RateLimit, TokenBucket, negotiate_codec
+
+# Hard ceiling of open WebSockets on this node (0 = unlimited)
+MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", "10000"))
+# New handshakes per second and burst, "<per second>/<burst>" (empty or 0 = unlimited)
+HANDSHAKE_RATE = os.getenv("GATEWAY_HANDSHAKE_RATE", "200/400")
+# Shed new handshakes while the event loop runs this late (seconds, 0 = never)
+MAX_LOOP_LAG = float(os.getenv("GATEWAY_MAX_LOOP_LAG", "0.1"))
+LOOP_LAG_INTERVAL = float(os.getenv("GATEWAY_LOOP_LAG_INTERVAL", "0.05"))
+# Base retry-after hint; clients get base..2*base so they do not come back in lockstep
+RETRY_AFTER = float(os.getenv("GATEWAY_RETRY_AFTER", "2"))
+
+# RFC 6455 "Try Again Later"
+TRY_AGAIN_LATER_CLOSE_CODE = 1013
+
+Rejection = Tuple[str, float]
+
+
+class AdmissionController:
+    """
+    Decides whether a new WebSocket handshake may proceed.
+
+    Checks run cheapest first and before token verification: connection
+    ceiling, event loop lag, then a token bucket on the handshake rate.
+    Sessions that are already open are never touched, so during a
+    reconnect storm they keep their latency while newcomers are told to
+    retry later.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        handshake_limit: Optional[RateLimit] = RateLimit.parse(HANDSHAKE_RATE),
+        max_loop_lag: float = MAX_LOOP_LAG,
+        lag_interval: float = LOOP_LAG_INTERVAL,
+        retry_after: float = RETRY_AFTER
+    ) -> None:
+        self.max_connections = max_connections
+        self.handshake_limit = handshake_limit
+        self.max_loop_lag = max_loop_lag
+        self.lag_interval = lag_interval
+        self.retry_after = retry_after
+        self.loop_lag = 0.0
+        self._bucket = TokenBucket(handshake_limit, time.monotonic()) if handshake_limit else None
+        self._task: Optional[asyncio.Task] = None
+        self.rejected = {
+            reason: REGISTRY.counter(
+                f"socket_hub_gateway_handshakes_shed_{reason}_total",
+                f"WebSocket handshakes rejected by admission control ({reason})."
+            )
+            for reason in ("capacity", "overload", "rate")
+        }
+        REGISTRY.gauge("socket_hub_event_loop_lag_seconds", "Latest measured event loop lag.", lambda: self.loop_lag)
+
+    def start(self) -> None:
+        if self.max_loop_lag > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self) -> None:
+        # A sleep that wakes up late means callbacks are queueing up behind the loop
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, loop.time() - started - self.lag_interval)
+
+    def admit(self, active_connections: int) -> Optional[Rejection]:
+        """None if the handshake may proceed, else (reason, retry-after seconds)"""
+        if self.max_connections and active_connections >= self.max_connections:
+            return self._reject("capacity", self.retry_after * 2)
+        if self.max_loop_lag and self.loop_lag > self.max_loop_lag:
+            return self._reject("overload", self.retry_after)
+        if self._bucket is not None:
+            now = time.monotonic()
+            if not self._bucket.allow(self.handshake_limit, now):
+                return self._reject("rate", max(self._bucket.retry_after(self.handshake_limit), self.retry_after / 2))
+        return None
+
+    def _reject(self, reason: str, retry_after: float) -> Rejection:
+        self.rejected[reason].inc()
+        return reason, retry_after * (1 + random.random())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def reject_handshake(websocket: WebSocket, reason: str, retry_after: float) -> None:
+    """
+    Accept and immediately close with 1013. Refusing before accept would
+    only give the client an opaque HTTP 403 instead of a close reason.
+    """
+    await websocket.accept(subprotocol=negotiate_codec(websocket).subprotocol)
+    await websocket.close(code=TRY_AGAIN_LATER_CLOSE_CODE, reason=f"{reason}; retry-after={retry_after:.1f}")
+
+
+admission = AdmissionController()
@@ -0,0 +1,184 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import os
+import socket
+import sys
+
+import redis.asyncio as redis
+
+# Agregar el directorio shared al path para importar el logger
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.logging import SocketHubLogger
+from shared.websocket import Frame
+
+REDIS_URL = os.getenv("REDIS_URL")
+NODE_ID = os.getenv("GATEWAY_NODE_ID", f"{socket.gethostname()}-{os.getpid()}")
+CHANNEL_PREFIX = os.getenv("BACKPLANE_CHANNEL_PREFIX", "socket-hub:room:")
+
+# Called for every frame published by another node: (room_id, frame, exclude_user)
+DeliverCallback = Callable[[str, Frame, Optional[str]], Awaitable[None]]
+
+_SEPARATOR = "\x1f"
+
+
+def encode_envelope(node_id: str, frame: Frame, exclude_user: Optional[str]) -> str:
+    # A flat header keeps the payload text as-is instead of escaping it into JSON
+    return _SEPARATOR.join((node_id, exclude_user or "", "1" if frame.droppable else "0", frame.text))
+
+
+def decode_envelope(envelope: str):
+    node_id, exclude_user, droppable, text = envelope.split(_SEPARATOR, 3)
+    return node_id, Frame(text, droppable == "1"), exclude_user or None
+
+
+class Backplane(ABC):
+    """
+    Carries room traffic between gateway nodes.
+
+    A node only subscribes to rooms it has local members in, so each
+    published message reaches only the nodes that have someone to deliver to.
+    """
+
+    def __init__(self, node_id: str = NODE_ID) -> None:
+        self.node_id = node_id
+        self.on_message: Optional[DeliverCallback] = None
+        self.logger = SocketHubLogger("api-gateway").get_logger()
+
+    async def start(self, on_message: DeliverCallback) -> None:
+        self.on_message = on_message
+
+    @abstractmethod
+    async def subscribe(self, room_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, room_id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, room_id: str, frame: Frame, exclude_user: Optional[str] = None) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.on_message = None
+
+    async def _deliver(self, room_id: str, envelope: str) -> None:
+        node_id, frame, exclude_user = decode_envelope(envelope)
+        if node_id == self.node_id or self.on_message is None:
+            # Local members were already served when the frame was published
+            return
+        await self.on_message(room_id, frame, exclude_user)
+
+
+class InMemoryBroker:
+    """Stand-in for Redis: routes envelopes between backplanes in one process"""
+
+    def __init__(self) -> None:
+        self.subscribers: Dict[str, Set["InMemoryBackplane"]] = {}
+        self.published = 0
+
+
+class InMemoryBackplane(Backplane):
+    """Backplane for tests and single-process setups; nodes share a broker"""
+
+    def __init__(self, broker: InMemoryBroker = None, node_id: str = NODE_ID) -> None:
+        super().__init__(node_id)
+        self.broker = broker or InMemoryBroker()
+        self.rooms: Set[str] = set()
+
+    async def subscribe(self, room_id: str) -> None:
+        self.rooms.add(room_id)
+        self.broker.subscribers.setdefault(room_id, set()).add(self)
+
+    async def unsubscribe(self, room_id: str) -> None:
+        self.rooms.discard(room_id)
+        nodes = self.broker.subscribers.get(room_id)
+        if nodes is not None:
+            nodes.discard(self)
+            if not nodes:
+                del self.broker.subscribers[room_id]
+
+    async def publish(self, room_id: str, frame: Frame, exclude_user: Optional[str] = None) -> None:
+        self.broker.published += 1
+        envelope = encode_envelope(self.node_id, frame, exclude_user)
+        for node in list(self.broker.subscribers.get(room_id, ())):
+            if node is not self:
+                await node._deliver(room_id, envelope)
+
+    async def close(self) -> None:
+        for room_id in list(self.rooms):
+            await self.unsubscribe(room_id)
+        await super().close()
+
+
+class RedisBackplane(Backplane):
+    """Backplane over Redis pub/sub with one channel per room"""
+
+    def __init__(self, url: str = REDIS_URL, node_id: str = NODE_ID, channel_prefix: str = CHANNEL_PREFIX) -> None:
+        super().__init__(node_id)
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.channel_prefix = channel_prefix
+        self._subscribed = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, on_message: DeliverCallback) -> None:
+        await super().start(on_message)
+        self._reader = asyncio.create_task(self._read_loop())
+        self.logger.info(f"📡 Redis backplane started for node {self.node_id}")
+
+    async def subscribe(self, room_id: str) -> None:
+        await self.pubsub.subscribe(self.channel_prefix + room_id)
+        self._subscribed.set()
+
+    async def unsubscribe(self, room_id: str) -> None:
+        await self.pubsub.unsubscribe(self.channel_prefix + room_id)
+
+    async def publish(self, room_id: str, frame: Frame, exclude_user: Optional[str] = None) -> None:
+        await self.redis.publish(
+            self.channel_prefix + room_id,
+            encode_envelope(self.node_id, frame, exclude_user)
+        )
+
+    async def _read_loop(self) -> None:
+        prefix_length = len(self.channel_prefix)
+        while True:
+            if not self.pubsub.subscribed:
+                # The pubsub connection only exists after the first subscribe
+                self._subscribed.clear()
+                await self._subscribed.wait()
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                await self._deliver(message["channel"][prefix_length:], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"❌ Redis backplane read error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        await self.pubsub.close()
+        await self.redis.close()
+        await super().close()
+
+
+def create_backplane() -> Optional[Backplane]:
+    """
+    Worker mesh when running under cluster.py with several workers, Redis
+    backplane when REDIS_URL is set; None keeps the node standalone.
+    """
+    if int(os.getenv("GATEWAY_WORKERS", "1")) > 1:
+        from utils.worker_mesh import LocalMeshBackplane
+        return LocalMeshBackplane()
+    if REDIS_URL:
+        return RedisBackplane(REDIS_URL)
+    return None
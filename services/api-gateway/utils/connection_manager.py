@@ -1,68 +1,164 @@
 from fastapi import WebSocket
+from typing import Optional
 import sys
 import os
+import time
 
 # Agregar el directorio shared al path para importar el logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 from shared.logging import SocketHubLogger
+from shared.websocket import (
+    FANOUT_SECONDS,
+    JSON_CODEC,
+    Codec,
+    ConnectionWriter,
+    Frame,
+    Heartbeat,
+    RoomRegistry,
+    register_connection_metrics
+)
 
+from utils.backplane import Backplane
+
+# Close code sent to a socket taken over by a newer connection of the same user
+SESSION_REPLACED_CLOSE_CODE = 4001
 
 
 class ConnectionManager:
-    _instance = None
+    def __init__(self) -> None:
+        self.active_connections = {}
+        self.writers = {}
+        self.rooms = RoomRegistry()
+        # room_id -> set of user_ids, kept in step with rooms.user_rooms
+        self.room_connections = self.rooms.rooms
+        self.backplane = None
+        # Pings silent connections and reaps the ones that never answer
+        self.heartbeat = Heartbeat()
+        register_connection_metrics(self.writers, self.rooms)
+        hub_logger = SocketHubLogger("api-gateway")
+        self.logger = hub_logger.get_logger()
+        # Logs del hot path: limitados por punto de log y resumidos cada ventana
+        sampler = hub_logger.get_sampler()
+        self._log_connect = sampler.site("connect")
+        self._log_disconnect = sampler.site("disconnect")
+        self._log_room_created = sampler.site("room_created")
+        self._log_join = sampler.site("join")
+        self._log_leave = sampler.site("leave")
+        self._log_broadcast = sampler.site("broadcast", timing="fanout")
+
+    async def attach_backplane(self, backplane: Backplane) -> None:
+        """Share rooms with other gateway nodes through the given backplane"""
+        self.backplane = backplane
+        await backplane.start(self._fan_out)
+        for room_id in self.room_connections:
+            await backplane.subscribe(room_id)
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.active_connections = {}
-            cls._instance.room_connections = {}
-            cls._instance.logger = SocketHubLogger("api-gateway").get_logger()
-        return cls._instance
+    async def detach_backplane(self) -> None:
+        if self.backplane is not None:
+            backplane, self.backplane = self.backplane, None
+            await backplane.close()
 
 
-    async def connect (self, websocket: WebSocket, user_id: str) -> None:
-        await websocket.accept()
+    async def connect (self, websocket: WebSocket, user_id: str, codec: Codec = JSON_CODEC) -> ConnectionWriter:
+        await websocket.accept(subprotocol=codec.subprotocol)
+        if user_id in self.writers:
+            # Same user reconnected: the old socket is closed so its handler stops reading as this user
+            await self._close_writer(self.writers.pop(user_id))
+            previous = self.active_connections.get(user_id)
+            if previous is not None and previous is not websocket:
+                try:
+                    await previous.close(code=SESSION_REPLACED_CLOSE_CODE)
+                except Exception:
+                    pass
         self.active_connections[user_id] = websocket
-        self.logger.info(f"🔌 User {user_id} connected to ConnectionManager")
-    
-    async def disconnect (self, user_id: str) -> None:
+        writer = ConnectionWriter(websocket, user_id, codec=codec, on_close=self._on_writer_closed)
+        writer.start()
+        self.writers[user_id] = writer
+        self.heartbeat.add(writer)
+        self._log_connect.log("🔌 User %s connected to ConnectionManager", user_id)
+        return writer
+
+    async def disconnect (self, user_id: str, writer: Optional[ConnectionWriter] = None) -> None:
+        if writer is not None and self.writers.get(user_id) is not writer:
+            # A newer connection for this user already took over
+            return
         if user_id in self.active_connections:
             del self.active_connections[user_id]
-        
-        for room_id in list(self.room_connections.keys()):
-            if user_id in self.room_connections[room_id]:
-                self.room_connections[room_id].remove(user_id)
-        self.logger.info(f"🔌 User {user_id} disconnected from ConnectionManager")
+        if user_id in self.writers:
+            await self._close_writer(self.writers.pop(user_id))
+
+        for room_id in self.rooms.remove_user(user_id):
+            if room_id not in self.rooms:
+                await self._room_closed(room_id)
+        self._log_disconnect.log("🔌 User %s disconnected from ConnectionManager", user_id)
+
+    async def _close_writer(self, writer: ConnectionWriter) -> None:
+        self.heartbeat.remove(writer)
+        await writer.close()
+
+    async def _on_writer_closed(self, writer: ConnectionWriter) -> None:
+        # Only tear down the session the writer belongs to, not a newer one
+        if self.writers.get(writer.user_id) is writer:
+            self.logger.warning("⚠️ Dropping slow or broken connection for %s (%d messages dropped)", writer.user_id, writer.dropped)
+            await self.disconnect(writer.user_id, writer)
 
     async def join_room (self, room_id: str, user_id: str) -> None:
-        if room_id not in self.room_connections:
-            self.room_connections[room_id] = set()
-            self.logger.info(f"🏠 New room created: {room_id}")
-        
-        self.room_connections[room_id].add(user_id)
-        self.logger.info(f"🚪 User {user_id} joined room {room_id}")
-            
-        
+        if self.rooms.join(room_id, user_id):
+            self._log_room_created.log("🏠 New room created: %s", room_id)
+            if self.backplane is not None:
+                await self.backplane.subscribe(room_id)
+        self._log_join.log("🚪 User %s joined room %s", user_id, room_id)
+
+
     async def leave_room (self, room_id: str, user_id: str) -> None:
-        if room_id in self.room_connections and user_id in self.room_connections[room_id]:
-            self.room_connections[room_id].remove(user_id)
-            self.logger.info(f"🚪 User {user_id} left room {room_id}")
+        if self.rooms.leave(room_id, user_id):
+            self._log_leave.log("🚪 User %s left room %s", user_id, room_id)
+            if room_id not in self.rooms:
+                await self._room_closed(room_id)
         else:
-            self.logger.warning(f"⚠️ User {user_id} tried to leave room {room_id} but was not in it")
+            self.logger.warning("⚠️ User %s tried to leave room %s but was not in it", user_id, room_id)
 
-    async def send_personal_message(self, message:str, user_id:str) -> None:
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
-            self.logger.debug(f"📤 Personal message sent to {user_id}")
+    async def _room_closed(self, room_id: str) -> None:
+        # No local members left, so this node no longer needs the room's traffic
+        if self.backplane is not None:
+            await self.backplane.unsubscribe(room_id)
+
+    async def send_personal_message(self, message:str, user_id:str, droppable: bool = False) -> None:
+        await self.send_frame(Frame(message, droppable), user_id)
+
+    async def send_frame(self, frame: Frame, user_id: str) -> None:
+        writer = self.writers.get(user_id)
+        if writer is not None:
+            writer.enqueue(frame)
+            self.logger.debug("📤 Personal message queued for %s", user_id)
         else:
-            self.logger.warning(f"⚠️ Could not send message to {user_id} - not connected")
+            self.logger.warning("⚠️ Could not send message to %s - not connected", user_id)
 
-    async def broadcast_to_room(self, message: str, room_id: str, exclude_user: str):
+    async def broadcast_to_room(self, message: str, room_id: str, exclude_user: str = None, droppable: bool = False):
+        await self.broadcast_frame(Frame(message, droppable), room_id, exclude_user)
+
+    async def broadcast_frame(self, frame: Frame, room_id: str, exclude_user: str = None):
         if room_id in self.room_connections:
             users_in_room = len(self.room_connections[room_id])
-            self.logger.info(f"📢 Broadcasting to room {room_id} ({users_in_room} users)")
-            for user_id in self.room_connections[room_id]:
-                if user_id != exclude_user:
-                    await self.send_personal_message(message, user_id)
-        else:
-            self.logger.warning(f"⚠️ Could not broadcast to room {room_id} - room does not exist")
\ No newline at end of file
+            started = time.perf_counter()
+            await self._fan_out(room_id, frame, exclude_user)
+            elapsed = time.perf_counter() - started
+            FANOUT_SECONDS.observe(elapsed)
+            self._log_broadcast.log("📢 Broadcasting to room %s (%d users)", room_id, users_in_room, elapsed=elapsed)
+        elif self.backplane is None:
+            self.logger.warning("⚠️ Could not broadcast to room %s - room does not exist", room_id)
+        if self.backplane is not None:
+            await self.backplane.publish(room_id, frame, exclude_user)
+
+    async def _fan_out(self, room_id: str, frame: Frame, exclude_user: Optional[str]) -> None:
+        """Deliver to members connected to this node"""
+        members = self.room_connections.get(room_id)
+        if not members:
+            return
+        # The same encoded frame goes to every queue; writer tasks do the sends
+        writers = self.writers
+        for user_id in members:
+            if user_id != exclude_user:
+                writer = writers.get(user_id)
+                if writer is not None:
+                    writer.enqueue(frame)
@@ -0,0 +1,37 @@
+from bisect import bisect
+from hashlib import blake2b
+from typing import Dict, Iterable, List
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """
+    Maps keys (room ids) to nodes with virtual replicas, so adding or
+    removing a node only moves about 1/N of the keys.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64) -> None:
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            self._owners[point] = node
+        self._points = sorted(self._owners)
+
+    def remove(self, node: str) -> None:
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+        self._points = sorted(self._owners)
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("hash ring has no nodes")
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from hashlib import sha256
+from itertools import islice
+from typing import Optional, Tuple
+import os
+import sys
+import time
+
+# Agregar el directorio shared al path para usar las mismas reglas que auth-service
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.auth import validate_jwt_key
+from shared.auth import verify_token as shared_verify_token
+
+JWT_KEY = os.getenv("JWT_KEY", "")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+CLAIMS_CACHE_SIZE = int(os.getenv("CLAIMS_CACHE_SIZE", "10000"))
+# Upper bound for tokens without an exp claim, and for how stale a cached entry may get
+CLAIMS_CACHE_TTL = float(os.getenv("CLAIMS_CACHE_TTL", "300"))
+
+
+def jwt_key_error() -> Optional[str]:
+    """Why JWT_KEY cannot verify tokens, or None if it is usable"""
+    try:
+        validate_jwt_key(JWT_KEY)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def verify_token(token: str) -> dict | None:
+    """
+    Verifies and decodes a JWT token with auth-service's rules, so the
+    gateway can accept a token without a round trip to auth-service.
+
+    Every token is rejected while JWT_KEY is missing or too short: an
+    empty key would accept tokens anyone can sign.
+
+    Returns:
+        dict: The decoded token payload if valid, None otherwise
+    """
+    if _JWT_KEY_ERROR is not None:
+        return None
+    return shared_verify_token(token, JWT_KEY, JWT_ALGORITHM)
+
+
+class VerifiedClaimsCache:
+    """
+    Bounded LRU of already verified claims, keyed by the token's SHA-256.
+
+    Entries expire with the token itself, so a reconnect storm with the same
+    tokens costs one hash and one dict lookup per handshake.
+    """
+
+    def __init__(self, max_size: int = CLAIMS_CACHE_SIZE, ttl: float = CLAIMS_CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = sha256(token.encode("utf-8")).digest()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        if expires_at <= now:
+            return
+
+        key = sha256(token.encode("utf-8")).digest()
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # Expired entries go first; if none are found near the LRU end, drop the LRU one
+        for key in list(islice(self._entries, 16)):
+            if self._entries[key][1] <= now:
+                del self._entries[key]
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_JWT_KEY_ERROR = jwt_key_error()
+claims_cache = VerifiedClaimsCache()
+
+
+def authenticate(token: str) -> Optional[dict]:
+    """Claims for a token, verified locally and cached until it expires"""
+    claims = claims_cache.get(token)
+    if claims is None:
+        claims = verify_token(token)
+        if claims is not None:
+            claims_cache.put(token, claims)
+    return claims
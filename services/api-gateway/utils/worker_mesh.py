@@ -0,0 +1,258 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import struct
+import sys
+import time
+
+# Agregar el directorio shared al path para importar el logger
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.websocket import Frame
+
+from utils.backplane import NODE_ID, Backplane, encode_envelope
+from utils.hash_ring import ConsistentHashRing
+
+WORKER_ID = int(os.getenv("GATEWAY_WORKER_ID", "0"))
+WORKER_COUNT = int(os.getenv("GATEWAY_WORKERS", "1"))
+IPC_DIR = os.getenv("GATEWAY_IPC_DIR", "/tmp/socket-hub")
+# Sibling workers boot concurrently; connecting to them is retried this long on start only
+STARTUP_GRACE = float(os.getenv("MESH_STARTUP_GRACE", "5"))
+# A worker that went away is probed this often until it is back
+PEER_RETRY_INTERVAL = float(os.getenv("MESH_PEER_RETRY_INTERVAL", "1"))
+
+# Frame header on the worker sockets: payload length + opcode
+_HEADER = struct.Struct("!Ic")
+_SUBSCRIBE = b"S"
+_UNSUBSCRIBE = b"U"
+_PUBLISH = b"P"
+_DELIVER = b"D"
+_SEPARATOR = "\x1f"
+
+
+def socket_path(ipc_dir: str, worker_id: int) -> str:
+    return os.path.join(ipc_dir, f"worker-{worker_id}.sock")
+
+
+class LocalMeshBackplane(Backplane):
+    """
+    Backplane between the gateway workers of one host over Unix sockets.
+
+    Every room has an owner worker picked by consistent hashing of its id.
+    Workers tell the owner when they gain or lose local members of a room,
+    publish room traffic to the owner, and the owner forwards it only to the
+    workers that registered interest. No external broker is involved.
+
+    Each worker keeps one outgoing connection per sibling, opened on start
+    and watched for EOF. A worker that goes away is taken off the ring, so
+    its rooms move to the others and members re-register there; it is
+    probed in the background and put back once it answers again. Sends
+    never wait for a peer: one that is down fails at once and the message
+    goes to the room's new owner.
+    """
+
+    def __init__(
+        self,
+        worker_id: int = WORKER_ID,
+        worker_count: int = WORKER_COUNT,
+        ipc_dir: str = IPC_DIR,
+        node_id: str = NODE_ID
+    ) -> None:
+        super().__init__(f"{node_id}-w{worker_id}")
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        self.ipc_dir = ipc_dir
+        self.ring = ConsistentHashRing(str(worker) for worker in range(worker_count))
+        self.owner_of = lru_cache(maxsize=65536)(self._owner_of)
+        # Rooms with local members on this worker
+        self.local_rooms: Set[str] = set()
+        # For rooms this worker owns: which workers have members in them
+        self.interest: Dict[str, Set[int]] = {}
+        # Siblings currently on the ring
+        self.live_peers: Set[int] = set(range(worker_count)) - {worker_id}
+        self._peers: Dict[int, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._readers: Set[asyncio.Task] = set()
+        self._links: List[asyncio.Task] = []
+
+    def _owner_of(self, room_id: str) -> int:
+        return int(self.ring.node_for(room_id))
+
+    async def start(self, on_message) -> None:
+        await super().start(on_message)
+        os.makedirs(self.ipc_dir, exist_ok=True)
+        path = socket_path(self.ipc_dir, self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._handle_peer, path=path)
+        self.logger.info(f"📡 Worker mesh listening on {path} ({self.worker_count} workers)")
+
+        # Wait for the siblings once, so the first publishes find their rooms' owners
+        siblings = sorted(self.live_peers)
+        connections = await asyncio.gather(*(self._connect(worker, STARTUP_GRACE) for worker in siblings))
+        for worker, connection in zip(siblings, connections):
+            self._links.append(asyncio.create_task(self._link(worker, connection)))
+
+    async def subscribe(self, room_id: str) -> None:
+        self.local_rooms.add(room_id)
+        await self._send_to_owner(room_id, _SUBSCRIBE, f"{room_id}{_SEPARATOR}{self.worker_id}")
+
+    async def unsubscribe(self, room_id: str) -> None:
+        self.local_rooms.discard(room_id)
+        await self._send_to_owner(room_id, _UNSUBSCRIBE, f"{room_id}{_SEPARATOR}{self.worker_id}")
+
+    async def publish(self, room_id: str, frame: Frame, exclude_user: Optional[str] = None) -> None:
+        envelope = encode_envelope(self.node_id, frame, exclude_user)
+        await self._send_to_owner(
+            room_id, _PUBLISH, f"{room_id}{_SEPARATOR}{self.worker_id}{_SEPARATOR}{envelope}"
+        )
+
+    async def _send_to_owner(self, room_id: str, opcode: bytes, payload: str) -> None:
+        owner = self.owner_of(room_id)
+        if owner == self.worker_id:
+            await self._handle(opcode, payload)
+        elif not await self._send(owner, opcode, payload):
+            # The owner just left the ring; this worker is always on it, so this ends
+            await self._send_to_owner(room_id, opcode, payload)
+
+    async def _handle(self, opcode: bytes, payload: str) -> None:
+        if opcode == _DELIVER:
+            room_id, envelope = payload.split(_SEPARATOR, 1)
+            await self._deliver(room_id, envelope)
+        elif opcode == _PUBLISH:
+            room_id, origin, envelope = payload.split(_SEPARATOR, 2)
+            origin = int(origin)
+            for worker in list(self.interest.get(room_id, ())):
+                if worker == origin:
+                    continue
+                if worker == self.worker_id:
+                    await self._deliver(room_id, envelope)
+                else:
+                    await self._send(worker, _DELIVER, f"{room_id}{_SEPARATOR}{envelope}")
+        elif opcode == _SUBSCRIBE:
+            room_id, worker = payload.split(_SEPARATOR, 1)
+            self.interest.setdefault(room_id, set()).add(int(worker))
+        elif opcode == _UNSUBSCRIBE:
+            room_id, worker = payload.split(_SEPARATOR, 1)
+            self._drop_interest(room_id, int(worker))
+
+    def _drop_interest(self, room_id: str, worker: int) -> None:
+        workers = self.interest.get(room_id)
+        if workers is not None:
+            workers.discard(worker)
+            if not workers:
+                del self.interest[room_id]
+
+    async def _send(self, worker: int, opcode: bytes, payload: str) -> bool:
+        """Send to a sibling. Returns False, after taking it off the ring, if it is down."""
+        writer = self._peers.get(worker)
+        if writer is None or writer.is_closing():
+            await self._peer_down(worker)
+            return False
+        data = payload.encode("utf-8")
+        try:
+            writer.write(_HEADER.pack(len(data), opcode) + data)
+            await writer.drain()
+        except (ConnectionError, OSError) as e:
+            self.logger.error(f"❌ Worker mesh could not reach worker {worker}: {e}")
+            await self._peer_down(worker)
+            return False
+        return True
+
+    async def _connect(self, worker: int, grace: float = 0) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+        """Connection to a sibling, retried for `grace` seconds; None if it is not there"""
+        path = socket_path(self.ipc_dir, worker)
+        deadline = time.monotonic() + grace
+        while True:
+            try:
+                return await asyncio.open_unix_connection(path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    return None
+                await asyncio.sleep(0.1)
+
+    async def _link(self, worker: int, connection: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]) -> None:
+        """Keep the outgoing connection to a sibling, and its place on the ring, in step with whether it is up"""
+        while True:
+            if connection is None:
+                await self._peer_down(worker)
+                await asyncio.sleep(PEER_RETRY_INTERVAL)
+                connection = await self._connect(worker)
+                continue
+            reader, writer = connection
+            connection = None
+            try:
+                self._peers[worker] = writer
+                await self._peer_up(worker, writer)
+                # Siblings never write on this connection, so the read only returns at EOF
+                await reader.read()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _peer_up(self, worker: int, writer: asyncio.StreamWriter) -> None:
+        if worker not in self.live_peers:
+            self.live_peers.add(worker)
+            self.ring.add(str(worker))
+            self.owner_of.cache_clear()
+            self.logger.info(f"✅ Worker {worker} is back on the mesh")
+        await self._resubscribe(worker, writer)
+
+    async def _peer_down(self, worker: int) -> None:
+        writer = self._peers.pop(worker, None)
+        if writer is not None:
+            writer.close()
+        if worker not in self.live_peers:
+            return
+
+        moved = [room_id for room_id in self.local_rooms if self.owner_of(room_id) == worker]
+        self.live_peers.discard(worker)
+        self.ring.remove(str(worker))
+        self.owner_of.cache_clear()
+        for workers in list(self.interest.values()):
+            workers.discard(worker)
+        self.interest = {room_id: workers for room_id, workers in self.interest.items() if workers}
+        self.logger.warning(f"⚠️ Worker {worker} left the mesh; {len(moved)} local rooms move to other owners")
+        # Register our members with the rooms' new owners
+        for room_id in moved:
+            await self._send_to_owner(room_id, _SUBSCRIBE, f"{room_id}{_SEPARATOR}{self.worker_id}")
+
+    async def _resubscribe(self, worker: int, writer: asyncio.StreamWriter) -> None:
+        # A (re)started owner has lost its interest table; restore our part of it
+        for room_id in self.local_rooms:
+            if self.owner_of(room_id) == worker:
+                data = f"{room_id}{_SEPARATOR}{self.worker_id}".encode("utf-8")
+                writer.write(_HEADER.pack(len(data), _SUBSCRIBE) + data)
+        await writer.drain()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._readers.add(task)
+        try:
+            while True:
+                length, opcode = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                payload = (await reader.readexactly(length)).decode("utf-8")
+                await self._handle(opcode, payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._readers.discard(task)
+            writer.close()
+
+    async def close(self) -> None:
+        for task in self._links:
+            task.cancel()
+        await asyncio.gather(*self._links, return_exceptions=True)
+        self._links.clear()
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._readers):
+            task.cancel()
+        if self._server is not None:
+            await self._server.wait_closed()
+        for writer in self._peers.values():
+            writer.close()
+        self._peers.clear()
+        path = socket_path(self.ipc_dir, self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        await super().close()
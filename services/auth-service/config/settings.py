@@ -1,7 +1,12 @@
 from pydantic_settings import BaseSettings
 from pydantic import  validator
+import sys
 import os
 
+# Agregar el directorio shared al path para importar la validación de JWT_KEY
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.auth import validate_jwt_key
+
 class Settings(BaseSettings):
     SECRET_KEY: str
     JWT_KEY: str
@@ -12,9 +17,7 @@ class Settings(BaseSettings):
 
     @validator('JWT_KEY')
     def validate_secret_key (cls, v):
-        if len(v) < 32:
-            raise ValueError('JWT_KEY must be at least 32 characters')
-        return v
+        return validate_jwt_key(v)
 
     class Config:
         env_file = ".env"
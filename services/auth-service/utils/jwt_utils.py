@@ -1,7 +1,13 @@
-from jose import JWTError, jwt
+from jose import jwt
 from datetime import datetime, timedelta
 from passlib.context import CryptoContext 
 from config.settings import settings
+import sys
+import os
+
+# Agregar el directorio shared al path para compartir las reglas de verificación con el gateway
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+import shared.auth as shared_tokens
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
@@ -28,19 +34,6 @@ def verify_token(token: str) -> dict | None:
         token (str): The JWT token to verify
         
     Returns:
-        dict: The decoded token payload if valid
-        
-    Raises:
-        JWTError: If token is invalid or has expired
+        dict: The decoded token payload if valid, None otherwise
     """
-    try:
-        decoded = jwt.decode(token, settings.JWT_KEY, algorithms=[settings.JWT_ALGORITHM])
-        
-        if "sub" not in decoded:
-            return None
-        
-        return decoded
-    
-    except JWTError:
-        return None
-
+    return shared_tokens.verify_token(token, settings.JWT_KEY, settings.JWT_ALGORITHM)
@@ -1,21 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import sys
 import os
 
 # Add shared directory to path for logger import
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from shared.logging import SocketHubLogger
+from shared.metrics import REGISTRY
 
 # Import routers
 from routes import (
     health_router,
     rooms_router,
     messages_router,
-    websocket_router
+    websocket_router,
+    metrics_router
 )
 
+from routes.messages import recent_cache_collector
+from routes.websocket import manager, typing_coalescer
+from services import open_message_log
+
 # Create logger for chat-service
 logger = SocketHubLogger("chat-service").get_logger()
 
@@ -23,7 +30,11 @@ logger = SocketHubLogger("chat-service").get_logger()
 async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Chat Service...")
     try:
-        # Initialize any required services here
+        # Loading scans every room's log; a worker thread keeps the loop responsive meanwhile
+        message_log = app.state.message_log = await asyncio.to_thread(open_message_log)
+        message_log.start()
+        cache_metrics = recent_cache_collector(message_log)
+        REGISTRY.add_collector(cache_metrics)
         logger.info("✅ Chat Service initialized successfully")
     except Exception as e:
         logger.error(f"❌ Error initializing Chat Service: {e}")
@@ -33,6 +44,10 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("🛑 Chat Service shutting down...")
+    REGISTRY.remove_collector(cache_metrics)
+    await typing_coalescer.close()
+    await manager.heartbeat.close()
+    await message_log.close()
 
 app = FastAPI(
     title="Chat Service",
@@ -54,6 +69,7 @@ app.include_router(health_router)
 app.include_router(rooms_router)
 app.include_router(messages_router)
 app.include_router(websocket_router)
+app.include_router(metrics_router)
 
 @app.get("/")
 async def root():
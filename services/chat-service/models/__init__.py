@@ -14,6 +14,7 @@ from .message_models import (
     MessageCreate,
     MessageResponse,
     MessageListResponse,
+    MessageSearchResponse,
     WebSocketMessage,
     TypingIndicator
 )
@@ -41,6 +42,7 @@ __all__ = [
     "MessageCreate",
     "MessageResponse", 
     "MessageListResponse",
+    "MessageSearchResponse",
     "WebSocketMessage",
     "TypingIndicator",
     
@@ -31,10 +31,17 @@ class MessageResponse(MessageBase):
         from_attributes = True
 
 class MessageListResponse(BaseModel):
-    """Model for listing messages"""
+    """Model for listing messages, oldest first, with cursors to the neighbouring pages"""
     messages: List[MessageResponse]
-    total: int
+    total: Optional[int] = None  # only when requested with include_total
     has_more: bool = False
+    next_cursor: Optional[str] = None  # pass as `after` for newer messages
+    prev_cursor: Optional[str] = None  # pass as `before` for older messages
+
+class MessageSearchResponse(BaseModel):
+    """Model for search results, newest first"""
+    messages: List[MessageResponse]
+    has_more: bool = False  # more matches than the limit
 
 class WebSocketMessage(BaseModel):
     """Model for WebSocket communication"""
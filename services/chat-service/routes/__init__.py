@@ -3,10 +3,12 @@ from .health import router as health_router
 from .rooms import router as rooms_router
 from .messages import router as messages_router
 from .websocket import router as websocket_router
+from .metrics import router as metrics_router
 
 __all__ = [
     "health_router",
     "rooms_router", 
     "messages_router",
-    "websocket_router"
+    "websocket_router",
+    "metrics_router"
 ]
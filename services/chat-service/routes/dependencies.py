@@ -0,0 +1,8 @@
+from starlette.requests import HTTPConnection
+
+from services import MessageLog
+
+
+def get_message_log(connection: HTTPConnection) -> MessageLog:
+    """The message log opened by the app lifespan, for HTTP and WebSocket routes"""
+    return connection.app.state.message_log
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional, Tuple
 import sys
 import os
+import time
 
 # Add shared directory to path for logger import
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 from shared.logging import SocketHubLogger
+from shared.metrics import REGISTRY, REQUEST_BUCKETS, Collector, Counter, Gauge
 
 # Import models
 from models import (
     MessageCreate,
     MessageResponse,
     MessageListResponse,
+    MessageSearchResponse,
     MessageType
 )
+from services import MessageLog, WriteBehindFull
+from utils.cursors import decode_cursor, encode_cursor
+from .dependencies import get_message_log
 
 # Create logger for message routes
 logger = SocketHubLogger("chat-service").get_logger()
@@ -23,87 +29,131 @@ router = APIRouter(
     tags=["messages"]
 )
 
-# Mock data for now - will be replaced with real service later
-mock_messages = [
-    {
-        "id": "msg-1",
-        "content": "Hello everyone!",
-        "message_type": "text",
-        "room_id": "room-1",
-        "user_id": "user-1",
-        "timestamp": "2024-01-01T00:00:00Z",
-        "username": "john_doe"
-    },
-    {
-        "id": "msg-2",
-        "content": "How is everyone doing?",
-        "message_type": "text", 
-        "room_id": "room-1",
-        "user_id": "user-2",
-        "timestamp": "2024-01-01T00:01:00Z",
-        "username": "jane_smith"
-    }
-]
+def recent_cache_collector(message_log: MessageLog) -> Collector:
+    """Metrics of the log's hot-room cache; registered by the app lifespan"""
+    def collect():
+        return _collect_recent_cache(message_log.recent)
+    return collect
+
+def _collect_recent_cache(recent):
+    hits = Counter("socket_hub_chat_recent_cache_hits_total", "Latest-page reads served from the hot-room cache.")
+    hits.value = recent.hits
+    misses = Counter("socket_hub_chat_recent_cache_misses_total", "Latest-page reads that loaded a room from the message log.")
+    misses.value = recent.misses
+    return [
+        hits,
+        misses,
+        Gauge("socket_hub_chat_recent_cache_messages", "Messages held by the hot-room cache.", lambda: recent.size),
+        Gauge("socket_hub_chat_recent_cache_rooms", "Rooms held by the hot-room cache.", lambda: len(recent)),
+    ]
+
+SEARCH_SECONDS = REGISTRY.histogram("socket_hub_chat_search_seconds", "Time to answer a message search.", REQUEST_BUCKETS)
+
+def _decode_cursors(before: Optional[str], after: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Message ids behind the before/after cursors; 400 for bad or conflicting cursors"""
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    try:
+        return (
+            decode_cursor(before) if before is not None else None,
+            decode_cursor(after) if after is not None else None
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page_response(
+    messages: List[dict],
+    older: bool,
+    newer: bool,
+    forward: bool,
+    total: Optional[int]
+) -> MessageListResponse:
+    return MessageListResponse(
+        messages=[MessageResponse(**msg) for msg in messages],
+        total=total,
+        # More pages in the direction being read
+        has_more=newer if forward else older,
+        # Always set on a non-empty page so clients can poll for newer messages
+        next_cursor=encode_cursor(messages[-1]["id"]) if messages else None,
+        prev_cursor=encode_cursor(messages[0]["id"]) if messages and older else None
+    )
 
 @router.get("/room/{room_id}", response_model=MessageListResponse)
 async def get_room_messages(
     room_id: str,
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    before: Optional[str] = Query(None, description="Cursor: messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: messages newer than this"),
+    include_total: bool = Query(False, description="Also count the room's messages"),
+    message_log: MessageLog = Depends(get_message_log)
 ):
-    """Get messages from a specific room"""
-    logger.info(f"Getting messages for room {room_id} (limit: {limit}, offset: {offset})")
+    """Get messages from a specific room, latest page unless a cursor is given"""
+    logger.info(f"Getting messages for room {room_id} (limit: {limit}, before: {before}, after: {after})")
+    before_id, after_id = _decode_cursors(before, after)
     try:
-        # Filter messages by room_id
-        room_messages = [msg for msg in mock_messages if msg["room_id"] == room_id]
+        # Seeks straight to the cursor in the room's log
+        messages, older, newer = message_log.room_page(room_id, limit, before=before_id, after=after_id)
+        total = message_log.count(room_id) if include_total else None
         
-        # Apply pagination
-        total = len(room_messages)
-        messages = room_messages[offset:offset + limit]
-        has_more = offset + limit < total
-        
-        # Convert to response models
-        message_responses = [MessageResponse(**msg) for msg in messages]
-        
-        logger.info(f"Retrieved {len(message_responses)} messages for room {room_id}")
-        return MessageListResponse(
-            messages=message_responses,
-            total=total,
+        logger.info(f"Retrieved {len(messages)} messages for room {room_id}")
+        return _page_response(messages, older, newer, after_id is not None, total)
+    except Exception as e:
+        logger.error(f"Error getting messages for room {room_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    room_id: str = Query(..., description="Room to search"),
+    q: str = Query(..., min_length=1, max_length=256, description="Words that must all appear"),
+    user_id: Optional[str] = Query(None, description="Only messages sent by this user"),
+    limit: int = Query(20, ge=1, le=100),
+    message_log: MessageLog = Depends(get_message_log)
+):
+    """Full-text search of a room's messages, newest first"""
+    logger.info(f"Searching room {room_id} for {q!r} (user: {user_id}, limit: {limit})")
+    try:
+        started = time.perf_counter()
+        # Answered from the room's inverted index; only the matches returned are read
+        messages, has_more = message_log.search(room_id, q, user_id=user_id, limit=limit)
+        SEARCH_SECONDS.observe(time.perf_counter() - started)
+
+        logger.info(f"Found {len(messages)} messages in room {room_id}")
+        return MessageSearchResponse(
+            messages=[MessageResponse(**msg) for msg in messages],
             has_more=has_more
         )
     except Exception as e:
-        logger.error(f"Error getting messages for room {room_id}: {e}")
+        logger.error(f"Error searching room {room_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/", response_model=MessageResponse)
-async def create_message(message_data: MessageCreate):
+async def create_message(message_data: MessageCreate, message_log: MessageLog = Depends(get_message_log)):
     """Create a new message"""
     logger.info(f"Creating new message in room {message_data.room_id} by user {message_data.user_id}")
     try:
-        # Mock message creation - will be replaced with real service
-        new_message = {
-            "id": f"msg-{len(mock_messages) + 1}",
-            "content": message_data.content,
-            "message_type": message_data.message_type.value,
-            "room_id": message_data.room_id,
-            "user_id": message_data.user_id,
-            "timestamp": "2024-01-01T00:00:00Z",
-            "username": "current_user"  # Will be replaced with real username
-        }
-        mock_messages.append(new_message)
+        new_message = message_log.append(
+            message_data.room_id,
+            message_data.user_id,
+            message_data.content,
+            message_type=message_data.message_type.value,
+            username="current_user"  # Will be replaced with real username
+        )
         
         logger.info(f"Message created successfully: {new_message['id']}")
         return MessageResponse(**new_message)
+    except WriteBehindFull as e:
+        logger.warning(f"Message refused: {e}")
+        raise HTTPException(status_code=503, detail="Message store is overloaded, retry later")
     except Exception as e:
         logger.error(f"Error creating message: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/{message_id}", response_model=MessageResponse)
-async def get_message(message_id: str):
+async def get_message(message_id: str, message_log: MessageLog = Depends(get_message_log)):
     """Get a specific message by ID"""
     logger.info(f"Getting message: {message_id}")
     try:
-        message = next((msg for msg in mock_messages if msg["id"] == message_id), None)
+        message = message_log.get(message_id)
         if not message:
             logger.warning(f"Message not found: {message_id}")
             raise HTTPException(status_code=404, detail="Message not found")
@@ -116,19 +166,15 @@ async def get_message(message_id: str):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.delete("/{message_id}")
-async def delete_message(message_id: str):
+async def delete_message(message_id: str, message_log: MessageLog = Depends(get_message_log)):
     """Delete a message (soft delete)"""
     logger.info(f"Deleting message: {message_id}")
     try:
-        message = next((msg for msg in mock_messages if msg["id"] == message_id), None)
-        if not message:
+        # Soft delete: the log is append-only, so the message is tombstoned
+        if not message_log.delete(message_id):
             logger.warning(f"Message not found: {message_id}")
             raise HTTPException(status_code=404, detail="Message not found")
         
-        # Mock deletion - will be replaced with real service
-        # In real implementation, you would mark as deleted or remove from database
-        mock_messages.remove(message)
-        
         logger.info(f"Message deleted successfully: {message_id}")
         return {"message": "Message deleted successfully", "message_id": message_id}
     except HTTPException:
@@ -141,28 +187,20 @@ async def delete_message(message_id: str):
 async def get_user_messages(
     user_id: str,
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    before: Optional[str] = Query(None, description="Cursor: messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: messages newer than this"),
+    include_total: bool = Query(False, description="Also count the user's messages"),
+    message_log: MessageLog = Depends(get_message_log)
 ):
-    """Get messages from a specific user"""
-    logger.info(f"Getting messages from user {user_id} (limit: {limit}, offset: {offset})")
+    """Get messages from a specific user, latest page unless a cursor is given"""
+    logger.info(f"Getting messages from user {user_id} (limit: {limit}, before: {before}, after: {after})")
+    before_id, after_id = _decode_cursors(before, after)
     try:
-        # Filter messages by user_id
-        user_messages = [msg for msg in mock_messages if msg["user_id"] == user_id]
-        
-        # Apply pagination
-        total = len(user_messages)
-        messages = user_messages[offset:offset + limit]
-        has_more = offset + limit < total
-        
-        # Convert to response models
-        message_responses = [MessageResponse(**msg) for msg in messages]
+        messages, older, newer = message_log.user_page(user_id, limit, before=before_id, after=after_id)
+        total = message_log.user_count(user_id) if include_total else None
         
-        logger.info(f"Retrieved {len(message_responses)} messages from user {user_id}")
-        return MessageListResponse(
-            messages=message_responses,
-            total=total,
-            has_more=has_more
-        )
+        logger.info(f"Retrieved {len(messages)} messages from user {user_id}")
+        return _page_response(messages, older, newer, after_id is not None, total)
     except Exception as e:
         logger.error(f"Error getting messages from user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
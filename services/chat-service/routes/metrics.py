@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+import sys
+import os
+
+# Add shared directory to path for metrics import
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.metrics import CONTENT_TYPE, REGISTRY
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+@router.get("/metrics")
+async def metrics() -> Response:
+    """Runtime metrics in Prometheus text format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
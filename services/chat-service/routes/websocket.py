@@ -1,18 +1,54 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict
-import json
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from typing import Collection, Dict, Optional
 import sys
 import os
+import time
 
 # Add shared directory to path for logger import
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 from shared.logging import SocketHubLogger
+from shared.metrics import REGISTRY
+from shared.websocket import (
+    JSON_CODEC,
+    Codec,
+    FANOUT_SECONDS,
+    ConnectionWriter,
+    Frame,
+    FrameDecodeError,
+    Heartbeat,
+    RateLimiter,
+    RoomRegistry,
+    encode_frame,
+    negotiate_codec,
+    register_connection_metrics
+)
 
 # Import models
 from models import WebSocketMessage, TypingIndicator
+from services import MessageLog, ReplayBuffer, SessionStore, TypingCoalescer, WriteBehindFull
+from utils.cursors import encode_cursor
+from .dependencies import get_message_log
 
 # Create logger for websocket routes
-logger = SocketHubLogger("chat-service").get_logger()
+hub_logger = SocketHubLogger("chat-service")
+logger = hub_logger.get_logger()
+
+# Hot-path log sites: a few lines per window each, the rest folded into a summary
+sampler = hub_logger.get_sampler()
+log_connect = sampler.site("connect")
+log_disconnect = sampler.site("disconnect")
+log_room_created = sampler.site("room_created")
+log_join = sampler.site("join")
+log_leave = sampler.site("leave")
+log_broadcast = sampler.site("broadcast", timing="fanout")
+log_message = sampler.site("message")
+
+SESSIONS_RESUMED = REGISTRY.counter("socket_hub_chat_sessions_resumed_total", "Sessions resumed with a session token.")
+RESUME_GAPS = REGISTRY.counter("socket_hub_chat_resume_gaps_total", "Rooms whose missed messages were no longer buffered on resume.")
+MESSAGES_REPLAYED = REGISTRY.counter("socket_hub_chat_messages_replayed_total", "Messages replayed to resumed sessions.")
+
+# Latest messages sent along with room_joined (0 = none; clients use the REST history instead)
+JOIN_HISTORY_LIMIT = int(os.getenv("JOIN_HISTORY_LIMIT", "50"))
 
 router = APIRouter(
     prefix="/ws",
@@ -23,76 +59,256 @@ router = APIRouter(
 class MockConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.room_connections: Dict[str, set] = {}
+        self.writers: Dict[str, ConnectionWriter] = {}
+        self.rooms = RoomRegistry()
+        # room_id -> set of user_ids, kept in step with rooms.user_rooms
+        self.room_connections: Dict[str, set] = self.rooms.rooms
+        register_connection_metrics(self.writers, self.rooms)
+        # Pings silent connections and reaps the ones that never answer
+        self.heartbeat = Heartbeat()
+        # Recent room messages and the sessions of dropped connections, for resume
+        self.replay = ReplayBuffer()
+        self.sessions = SessionStore()
+        self.session_tokens: Dict[str, str] = {}
     
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, user_id: str, codec: Codec = JSON_CODEC) -> ConnectionWriter:
+        await websocket.accept(subprotocol=codec.subprotocol)
+        writer = ConnectionWriter(websocket, user_id, codec=codec, on_close=self._on_writer_closed)
+        if user_id in self.writers:
+            # The user keeps their rooms; the old session stays resumable for what it missed
+            previous = self.writers.pop(user_id)
+            self._park_session(user_id, previous)
+            await self._close_writer(previous)
+            writer.cursors = {room_id: self.replay.head(room_id) for room_id in self.rooms.rooms_of(user_id)}
         self.active_connections[user_id] = websocket
-        logger.info(f"User {user_id} connected to chat service")
+        writer.start()
+        self.writers[user_id] = writer
+        self.heartbeat.add(writer)
+        log_connect.log("User %s connected to chat service", user_id)
+        return writer
     
-    async def disconnect(self, user_id: str):
+    async def open_session(self, user_id: str, writer: ConnectionWriter, resume_token: Optional[str] = None):
+        """
+        Issue a fresh session token and, if `resume_token` names a parked
+        session of this user, rejoin its rooms and replay what was missed:
+        one "replay" frame per room, or a "resume_gap" when the messages are
+        no longer buffered and the client has to refetch history.
+        """
+        session = self.sessions.resume(resume_token, user_id) if resume_token else None
+        token = self.session_tokens[user_id] = self.sessions.issue()
+        rooms = list(session.cursors) if session is not None else []
+        await self.send_frame(encode_frame({
+            "type": "session",
+            "session_token": token,
+            "resume_window": self.sessions.grace,
+            "resumed": session is not None,
+            "rooms": rooms
+        }), user_id)
+        if session is None:
+            return
+
+        SESSIONS_RESUMED.inc()
+        for room_id, cursor in session.cursors.items():
+            await self.join_room(room_id, user_id, cursor)
+            missed = self.replay.since(room_id, cursor)
+            head = self.replay.head(room_id)
+            if missed is None:
+                RESUME_GAPS.inc()
+                # The client refetches history; live delivery continues from the head
+                writer.cursors[room_id] = head
+                await self.send_frame(encode_frame({
+                    "type": "resume_gap",
+                    "room_id": room_id,
+                    "cursor": cursor,
+                    "head": head
+                }), user_id)
+            elif missed:
+                MESSAGES_REPLAYED.inc(len(missed))
+                await self.send_frame(encode_frame({
+                    "type": "replay",
+                    "room_id": room_id,
+                    "messages": missed,
+                    "cursor": head
+                }, room_id=room_id, seq=head), user_id)
+        log_join.log("User %s resumed session in %d rooms", user_id, len(rooms))
+
+    def _park_session(self, user_id: str, writer: ConnectionWriter):
+        token = self.session_tokens.pop(user_id, None)
+        if token is None:
+            return
+        head = self.replay.head
+        cursors = {room_id: writer.cursors.get(room_id, head(room_id)) for room_id in self.rooms.rooms_of(user_id)}
+        if cursors:
+            self.sessions.park(token, user_id, cursors)
+    
+    async def disconnect(self, user_id: str, writer: Optional[ConnectionWriter] = None):
+        current = self.writers.get(user_id)
+        if writer is not None and current is not writer:
+            # A newer connection for this user already took over
+            return
         if user_id in self.active_connections:
             del self.active_connections[user_id]
+        if current is not None:
+            self._park_session(user_id, current)
+            await self._close_writer(self.writers.pop(user_id))
         
-        # Remove from all rooms
-        for room_id in list(self.room_connections.keys()):
-            if user_id in self.room_connections[room_id]:
-                self.room_connections[room_id].remove(user_id)
+        # Remove from all of the user's rooms; they are not typing in any of them anymore
+        for room_id in self.rooms.remove_user(user_id):
+            typing_coalescer.stopped(room_id, user_id)
         
-        logger.info(f"User {user_id} disconnected from chat service")
+        log_disconnect.log("User %s disconnected from chat service", user_id)
+
+    async def _close_writer(self, writer: ConnectionWriter):
+        self.heartbeat.remove(writer)
+        await writer.close()
+
+    async def _on_writer_closed(self, writer: ConnectionWriter):
+        if self.writers.get(writer.user_id) is writer:
+            logger.warning("Dropping slow or broken connection for %s (%d messages dropped)", writer.user_id, writer.dropped)
+            await self.disconnect(writer.user_id, writer)
     
-    async def join_room(self, room_id: str, user_id: str):
-        if room_id not in self.room_connections:
-            self.room_connections[room_id] = set()
-            logger.info(f"New room created: {room_id}")
-        
-        self.room_connections[room_id].add(user_id)
-        logger.info(f"User {user_id} joined room {room_id}")
+    async def join_room(self, room_id: str, user_id: str, cursor: Optional[int] = None):
+        if self.rooms.join(room_id, user_id):
+            log_room_created.log("New room created: %s", room_id)
+        writer = self.writers.get(user_id)
+        if writer is not None:
+            # Delivery is counted from the join unless resuming from an earlier cursor
+            if cursor is not None:
+                writer.cursors[room_id] = cursor
+            else:
+                writer.cursors.setdefault(room_id, self.replay.head(room_id))
+        log_join.log("User %s joined room %s", user_id, room_id)
     
     async def leave_room(self, room_id: str, user_id: str):
-        if room_id in self.room_connections and user_id in self.room_connections[room_id]:
-            self.room_connections[room_id].remove(user_id)
-            logger.info(f"User {user_id} left room {room_id}")
+        if self.rooms.leave(room_id, user_id):
+            writer = self.writers.get(user_id)
+            if writer is not None:
+                writer.cursors.pop(room_id, None)
+            log_leave.log("User %s left room %s", user_id, room_id)
     
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
-            logger.debug(f"Personal message sent to {user_id}")
+    async def send_personal_message(self, message: str, user_id: str, droppable: bool = False):
+        await self.send_frame(Frame(message, droppable), user_id)
+
+    async def send_frame(self, frame: Frame, user_id: str):
+        writer = self.writers.get(user_id)
+        if writer is not None:
+            writer.enqueue(frame)
+            logger.debug("Personal message queued for %s", user_id)
     
-    async def broadcast_to_room(self, message: str, room_id: str, exclude_user: str = None):
+    async def broadcast_to_room(self, message: str, room_id: str, exclude_user: str = None, droppable: bool = False):
+        await self.broadcast_frame(Frame(message, droppable), room_id, exclude_user)
+
+    async def broadcast_frame(self, frame: Frame, room_id: str, exclude_user: str = None, exclude: Collection[str] = ()):
         if room_id in self.room_connections:
-            users_in_room = len(self.room_connections[room_id])
-            logger.info(f"Broadcasting to room {room_id} ({users_in_room} users)")
+            members = self.room_connections[room_id]
+            started = time.perf_counter()
+            
+            # The same encoded frame goes to every queue; writer tasks do the sends
+            writers = self.writers
+            for user_id in members:
+                if user_id != exclude_user and user_id not in exclude:
+                    writer = writers.get(user_id)
+                    if writer is not None:
+                        writer.enqueue(frame)
             
-            for user_id in self.room_connections[room_id]:
-                if user_id != exclude_user:
-                    await self.send_personal_message(message, user_id)
+            elapsed = time.perf_counter() - started
+            FANOUT_SECONDS.observe(elapsed)
+            log_broadcast.log("Broadcasting to room %s (%d users)", room_id, len(members), elapsed=elapsed)
 
 # Global connection manager instance
 manager = MockConnectionManager()
 
+async def publish_typing(room_id: str, users: list, previous: set):
+    """
+    One coalesced "who is typing" frame per room and window. Typists are
+    never shown themselves: they get the list of the others instead, and
+    nothing at all when that list has not changed for them.
+    """
+    typing_response = {
+        "type": "typing",
+        "room_id": room_id,
+        "users": users
+    }
+    typists = {user["user_id"] for user in users}
+    # Someone who just stopped typing already sees exactly the remaining typists
+    unchanged = {user_id for user_id in previous - typists if previous - {user_id} == typists}
+    await manager.broadcast_frame(encode_frame(typing_response, droppable=True), room_id, exclude=typists | unchanged)
+
+    members = manager.room_connections.get(room_id, ())
+    for user_id in typists:
+        others = [user for user in users if user["user_id"] != user_id]
+        if user_id in members and (others or previous - {user_id}):
+            await manager.send_frame(encode_frame({**typing_response, "users": others}, droppable=True), user_id)
+
+typing_coalescer = TypingCoalescer(publish_typing)
+
+# Token buckets per connection, user and room; the frame type picks the budget
+rate_limiter = RateLimiter()
+RATE_LIMITED_TYPES = {
+    "message": "message",
+    "typing": "typing",
+    "join_room": "join"
+}
+
 @router.websocket("/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """WebSocket endpoint for real-time chat"""
-    logger.info(f"User {user_id} connecting via WebSocket")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: str,
+    resume: Optional[str] = None,
+    message_log: MessageLog = Depends(get_message_log)
+):
+    """
+    WebSocket endpoint for real-time chat.
+
+    The first frame is a "session" frame with a session token. Reconnecting
+    with ?resume=<token> within the grace window restores the previous rooms
+    and replays the messages missed in the meantime.
+    """
+    log_connect.log("User %s connecting via WebSocket", user_id)
+    
+    # JSON unless the client offered a binary subprotocol we speak
+    codec = negotiate_codec(websocket)
+    writer = None
     
     try:
-        await manager.connect(websocket, user_id)
-        logger.info(f"User {user_id} connected successfully")
+        writer = await manager.connect(websocket, user_id, codec)
+        log_connect.log("User %s connected successfully (%s)", user_id, codec.name)
+        await manager.open_session(user_id, writer, resume)
+        heartbeat = manager.heartbeat
+        limits = rate_limiter.connection()
         
         while True:
             # Receive message from client
-            raw_data = await websocket.receive_text()
-            logger.debug(f"Message received from {user_id}: {raw_data}")
+            raw_data = await codec.receive(websocket)
+            heartbeat.seen(writer)
+            # Heartbeat ping/pong never reaches message validation
+            if heartbeat.handle_control(raw_data, writer):
+                continue
+            logger.debug("Message received from %s: %s", user_id, raw_data)
             
             try:
                 # Parse the message
-                data = json.loads(raw_data)
-                ws_message = WebSocketMessage(**data)
+                ws_message = codec.decode(raw_data, WebSocketMessage)
+                
+                budget = RATE_LIMITED_TYPES.get(ws_message.type)
+                if budget is not None:
+                    retry_after = rate_limiter.check(budget, limits, user_id, ws_message.room_id)
+                    if retry_after:
+                        # Typing is dropped silently; others get one error per run of rejections
+                        if budget != "typing" and not limits.notified:
+                            limits.notified = True
+                            error_response = {
+                                "type": "error",
+                                "code": "rate_limited",
+                                "message": f"Rate limit exceeded for {ws_message.type}",
+                                "retry_after": round(retry_after, 3)
+                            }
+                            await manager.send_frame(encode_frame(error_response), user_id)
+                        continue
                 
                 # Handle different message types
                 if ws_message.type == "join_room":
-                    logger.info(f"User {user_id} joining room: {ws_message.room_id}")
+                    log_join.log("User %s joining room: %s", user_id, ws_message.room_id)
                     await manager.join_room(ws_message.room_id, user_id)
                     
                     # Send confirmation
@@ -102,11 +318,18 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                         "user_id": user_id,
                         "message": f"Joined room {ws_message.room_id}"
                     }
-                    await manager.send_personal_message(json.dumps(response), user_id)
+                    if JOIN_HISTORY_LIMIT:
+                        # The first history page, straight from the hot-room cache
+                        history, older, _ = message_log.room_page(ws_message.room_id, JOIN_HISTORY_LIMIT)
+                        response["history"] = history
+                        response["has_more"] = older
+                        response["prev_cursor"] = encode_cursor(history[0]["id"]) if older else None
+                    await manager.send_frame(encode_frame(response), user_id)
                 
                 elif ws_message.type == "leave_room":
-                    logger.info(f"User {user_id} leaving room: {ws_message.room_id}")
+                    log_leave.log("User %s leaving room: %s", user_id, ws_message.room_id)
                     await manager.leave_room(ws_message.room_id, user_id)
+                    typing_coalescer.stopped(ws_message.room_id, user_id)
                     
                     # Send confirmation
                     response = {
@@ -115,23 +338,50 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                         "user_id": user_id,
                         "message": f"Left room {ws_message.room_id}"
                     }
-                    await manager.send_personal_message(json.dumps(response), user_id)
+                    await manager.send_frame(encode_frame(response), user_id)
                 
                 elif ws_message.type == "message":
-                    logger.info(f"User {user_id} sending message to room: {ws_message.room_id}")
+                    log_message.log("User %s sending message to room: %s", user_id, ws_message.room_id)
+                    typing_coalescer.stopped(ws_message.room_id, user_id)
+                    
+                    # Stored before anyone sees it, so the id in every frame is real
+                    try:
+                        stored = message_log.append(
+                            ws_message.room_id,
+                            user_id,
+                            ws_message.content or "",
+                            username="current_user",  # Will be replaced with real username
+                            timestamp=ws_message.timestamp
+                        )
+                    except WriteBehindFull as e:
+                        logger.warning("Message from %s refused: %s", user_id, e)
+                        error_response = {
+                            "type": "error",
+                            "code": "overloaded",
+                            "message": "Message store is overloaded, retry later",
+                            "retry_after": message_log.write_behind.flush_interval
+                        }
+                        await manager.send_frame(encode_frame(error_response), user_id)
+                        continue
                     
-                    # Broadcast message to all users in room
+                    # Broadcast message to all users in room, numbered for delivery cursors and replay
                     message_response = {
                         "type": "message",
+                        "message_id": stored["id"],
                         "content": ws_message.content,
                         "room_id": ws_message.room_id,
                         "user_id": user_id,
                         "username": "current_user",  # Will be replaced with real username
                         "timestamp": ws_message.timestamp
                     }
+                    seq = manager.replay.append(ws_message.room_id, message_response)
+                    # Senders already have their own message; skip it on replay when nothing else is pending
+                    if writer.cursors.get(ws_message.room_id) == seq - 1:
+                        writer.cursors[ws_message.room_id] = seq
                     
-                    await manager.broadcast_to_room(
-                        json.dumps(message_response),
+                    # Serialized once, shared by every member's queue
+                    await manager.broadcast_frame(
+                        encode_frame(message_response, room_id=ws_message.room_id, seq=seq),
                         ws_message.room_id,
                         exclude_user=user_id
                     )
@@ -139,57 +389,46 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                     # Send confirmation to sender
                     confirmation = {
                         "type": "message_sent",
-                        "message_id": f"msg-{len(manager.active_connections)}",  # Mock ID
-                        "room_id": ws_message.room_id
+                        "message_id": stored["id"],
+                        "room_id": ws_message.room_id,
+                        "seq": seq
                     }
-                    await manager.send_personal_message(json.dumps(confirmation), user_id)
+                    await manager.send_frame(encode_frame(confirmation), user_id)
                 
                 elif ws_message.type == "typing":
-                    logger.debug(f"User {user_id} typing in room: {ws_message.room_id}")
+                    logger.debug("User %s typing in room: %s", user_id, ws_message.room_id)
                     
-                    # Broadcast typing indicator to other users in room
-                    typing_response = {
-                        "type": "typing",
-                        "user_id": user_id,
-                        "username": "current_user",  # Will be replaced with real username
-                        "room_id": ws_message.room_id,
-                        "is_typing": True
-                    }
-                    
-                    await manager.broadcast_to_room(
-                        json.dumps(typing_response),
-                        ws_message.room_id,
-                        exclude_user=user_id
-                    )
+                    # Coalesced per room; repeats only extend the user's expiry
+                    typing_coalescer.typing(ws_message.room_id, user_id, "current_user")  # Will be replaced with real username
                 
                 else:
-                    logger.warning(f"Unknown message type from {user_id}: {ws_message.type}")
+                    logger.warning("Unknown message type from %s: %s", user_id, ws_message.type)
                     error_response = {
                         "type": "error",
                         "message": f"Unknown message type: {ws_message.type}"
                     }
-                    await manager.send_personal_message(json.dumps(error_response), user_id)
+                    await manager.send_frame(encode_frame(error_response), user_id)
             
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON from {user_id}: {e}")
+            except FrameDecodeError as e:
+                logger.error("Invalid %s from %s: %s", codec.name, user_id, e)
                 error_response = {
                     "type": "error",
-                    "message": "Invalid JSON format"
+                    "message": f"Invalid {codec.name} format"
                 }
-                await manager.send_personal_message(json.dumps(error_response), user_id)
+                await manager.send_frame(encode_frame(error_response), user_id)
             
             except Exception as e:
-                logger.error(f"Error processing message from {user_id}: {e}")
+                logger.error("Error processing message from %s: %s", user_id, e)
                 error_response = {
                     "type": "error",
                     "message": "Internal server error"
                 }
-                await manager.send_personal_message(json.dumps(error_response), user_id)
+                await manager.send_frame(encode_frame(error_response), user_id)
     
     except WebSocketDisconnect:
-        logger.info(f"User {user_id} disconnected")
-        await manager.disconnect(user_id)
+        log_disconnect.log("User %s disconnected", user_id)
+        await manager.disconnect(user_id, writer)
     except Exception as e:
-        logger.error(f"WebSocket error for user {user_id}: {e}")
-        await manager.disconnect(user_id)
+        logger.error("WebSocket error for user %s: %s", user_id, e)
+        await manager.disconnect(user_id, writer)
         raise
@@ -0,0 +1,20 @@
+# Import all services for easy access
+from .message_log import MessageLog, open_message_log
+from .message_writer import MessageWriter, WriteBehindFull
+from .recent_messages import RecentMessages
+from .search_index import SearchIndex
+from .sessions import ReplayBuffer, Session, SessionStore
+from .typing_coalescer import TypingCoalescer
+
+__all__ = [
+    "MessageLog",
+    "open_message_log",
+    "MessageWriter",
+    "WriteBehindFull",
+    "RecentMessages",
+    "SearchIndex",
+    "ReplayBuffer",
+    "Session",
+    "SessionStore",
+    "TypingCoalescer"
+]
@@ -0,0 +1,11 @@
+from typing import List
+import os
+
+
+def fsync_and_close(fds: List[int]) -> None:
+    """fsync and close each descriptor; blocking, so callers on the event loop run it in a worker thread"""
+    for fd in fds:
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
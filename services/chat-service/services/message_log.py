@@ -0,0 +1,805 @@
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+import asyncio
+import base64
+import bisect
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+
+import orjson
+
+from .fsync import fsync_and_close
+from .message_writer import MessageWriter, create_message_writer
+from .recent_messages import RecentMessages
+from .search_index import SearchIndex
+
+# Where room logs live; one directory per room
+MESSAGE_LOG_DIR = os.getenv(
+    "MESSAGE_LOG_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "messages")
+)
+# A room's active segment is sealed and a new one started past this size
+SEGMENT_BYTES = int(os.getenv("MESSAGE_LOG_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+# One sparse index entry every this many messages; reads scan at most this many records
+INDEX_INTERVAL = int(os.getenv("MESSAGE_LOG_INDEX_INTERVAL", "64"))
+# "batch": fsync dirty segments every MESSAGE_LOG_FSYNC_INTERVAL seconds, in a worker thread,
+# "always": fsync inside every append, blocking the event loop until the disk answers
+# (for tools and tests that need each append durable, not for the live service),
+# "never": leave it to the OS
+FSYNC_MODE = os.getenv("MESSAGE_LOG_FSYNC", "batch")
+FSYNC_INTERVAL = float(os.getenv("MESSAGE_LOG_FSYNC_INTERVAL", "0.05"))
+# Open write descriptors and read maps are capped; the least recently used are closed
+MAX_OPEN_SEGMENTS = int(os.getenv("MESSAGE_LOG_MAX_OPEN_SEGMENTS", "256"))
+
+# Appends to a mapped active segment are kept in memory for reads up to this size,
+# then the segment is mapped again
+TAIL_BYTES = 256 * 1024
+
+# Payload length, CRC32 of the payload, message id
+RECORD_HEADER = struct.Struct("<II20s")
+# Room-wide message position, byte offset in the segment, message id
+INDEX_ENTRY = struct.Struct("<QQ20s")
+
+# Segment bytes are read from a map or, for the latest appends, from memory
+Buffer = Union[mmap.mmap, bytearray, bytes]
+
+
+class MessageIds:
+    """
+    Time-ordered, fixed-width message ids: milliseconds since the epoch,
+    a counter within the millisecond and a per-process node tag, in hex.
+
+    Ids sort in creation order as plain strings, and never go backwards
+    even if the wall clock does.
+    """
+
+    def __init__(self) -> None:
+        self.node = secrets.token_hex(2)
+        self._last_ms = 0
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._counter = 0
+            else:
+                self._counter += 1
+                if self._counter > 0xFFFF:
+                    self._last_ms += 1
+                    self._counter = 0
+            return f"{self._last_ms:012x}{self._counter:04x}{self.node}"
+
+    def advance_past(self, message_id: str) -> None:
+        """Never issue ids at or before `message_id`, e.g. after a restart with the clock behind"""
+        with self._lock:
+            last_ms = int(message_id[:12], 16)
+            if last_ms >= self._last_ms:
+                self._last_ms = last_ms
+                self._counter = max(self._counter, 0xFFFF)
+
+
+def message_timestamp(message_id: str) -> datetime:
+    """Creation time encoded in a message id"""
+    return datetime.fromtimestamp(int(message_id[:12], 16) / 1000, tz=timezone.utc)
+
+
+class Segment:
+    """One append-only file of a room log plus its in-memory sparse index"""
+    __slots__ = ("path", "index_path", "base", "size", "count", "positions", "offsets", "ids", "tail")
+
+    def __init__(self, directory: str, base: int) -> None:
+        self.path = os.path.join(directory, f"{base:020d}.log")
+        self.index_path = os.path.join(directory, f"{base:020d}.idx")
+        self.base = base
+        self.size = 0
+        self.count = 0
+        # Parallel sorted lists, one entry every INDEX_INTERVAL messages
+        self.positions: List[int] = []
+        self.offsets: List[int] = []
+        self.ids: List[str] = []
+        # Records written after the segment's current read map, which ends where this starts
+        self.tail = bytearray()
+
+    def locate(self, position: int) -> Tuple[int, int]:
+        """Nearest indexed (position, offset) at or before `position`"""
+        slot = bisect.bisect_right(self.positions, position) - 1
+        return self.positions[slot], self.offsets[slot]
+
+    def locate_id(self, message_id: str) -> Tuple[int, int]:
+        """Nearest indexed (position, offset) at or before `message_id`"""
+        slot = max(bisect.bisect_right(self.ids, message_id) - 1, 0)
+        return self.positions[slot], self.offsets[slot]
+
+
+class IndexEntry:
+    """Where a message lives, so reading it is a single seek"""
+    __slots__ = ("room", "segment", "offset", "user_id", "deleted")
+
+    def __init__(self, room: "RoomLog", segment: Segment, offset: int, user_id: str) -> None:
+        self.room = room
+        self.segment = segment
+        self.offset = offset
+        self.user_id = user_id
+        self.deleted = False
+
+
+class RoomLog:
+    """The segments of one room, oldest first, and its tombstones"""
+    __slots__ = ("room_id", "directory", "segments", "bases", "count", "last_id", "deleted")
+
+    def __init__(self, room_id: str, directory: str) -> None:
+        self.room_id = room_id
+        self.directory = directory
+        self.segments: List[Segment] = []
+        self.bases: List[int] = []
+        self.count = 0
+        self.last_id: Optional[str] = None
+        self.deleted: Set[str] = set()
+
+    @property
+    def active(self) -> Segment:
+        return self.segments[-1]
+
+    def segment_for_id(self, message_id: str) -> Segment:
+        for segment in reversed(self.segments):
+            if segment.ids and segment.ids[0] <= message_id:
+                return segment
+        return self.segments[0]
+
+
+class MessageLog:
+    """
+    Persistent message store made of per-room append-only segment files.
+
+    Each record is a small header (length, CRC32, message id) followed by
+    the message as JSON. Every INDEX_INTERVAL-th message of a segment is
+    also written to a sparse index file next to it, so finding a position
+    or an id is a bisect plus a scan of at most INDEX_INTERVAL headers.
+    Reads go through read-only memory maps, so only the pages of the
+    messages returned are ever touched, whatever the size of the log.
+    Records appended to a mapped segment are also kept in memory, up to
+    TAIL_BYTES, so the active segment is not remapped after every write.
+
+    Appends are one write() each and fsync is batched: a background task
+    syncs the segments written since its last run, in a worker thread so
+    the event loop never waits on the disk. The "always" fsync mode is the
+    exception: it syncs inside append and blocks the caller.
+
+    On startup every record of every segment is read once, to rebuild the
+    in-memory indexes below, so opening the log takes time proportional to
+    the number of messages stored. The active segment's records are also
+    checked against their CRC and a torn record left by a crash is
+    truncated away; a sparse index file that is missing or does not match
+    its segment is rebuilt.
+
+    Three in-memory indexes are kept up to date on every append and delete:
+    by id (segment and byte offset of the record), by room (the room log
+    itself, addressed by position) and by user (the user's ids in time
+    order). Lookups are O(1) and filtered pages O(k). They are rebuilt
+    from the segments on startup. On top of that, the latest page of hot
+    rooms is served from a RecentMessages cache without reading segments,
+    and contents are added to a SearchIndex for full-text search. With a
+    MessageWriter attached, every append is also handed to it for
+    write-behind to PostgreSQL.
+
+    Deletes are soft: the id is appended to the room's tombstone file, its
+    index entry is marked and the message is skipped on read. One process
+    writes a given directory.
+    """
+
+    def __init__(
+        self,
+        directory: str = MESSAGE_LOG_DIR,
+        segment_bytes: int = SEGMENT_BYTES,
+        index_interval: int = INDEX_INTERVAL,
+        fsync_mode: str = FSYNC_MODE,
+        fsync_interval: float = FSYNC_INTERVAL,
+        max_open: int = MAX_OPEN_SEGMENTS,
+        recent: Optional[RecentMessages] = None,
+        write_behind: Optional[MessageWriter] = None,
+        search_index: Optional[SearchIndex] = None
+    ) -> None:
+        self.directory = os.path.abspath(directory)
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.fsync_mode = fsync_mode
+        self.fsync_interval = fsync_interval
+        self.max_open = max_open
+        self.ids = MessageIds()
+        self.recent = recent if recent is not None else RecentMessages()
+        self.write_behind = write_behind
+        self.search_index = search_index if search_index is not None else SearchIndex()
+        self.rooms: Dict[str, RoomLog] = {}
+        self.by_id: Dict[str, IndexEntry] = {}
+        # user_id -> their message ids, oldest first, and how many are not deleted
+        self.by_user: Dict[str, List[str]] = {}
+        self.user_counts: Dict[str, int] = {}
+        # Segment path -> descriptor / map, least recently used first
+        self._writers: "OrderedDict[str, int]" = OrderedDict()
+        self._maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        # Writers closed with unsynced appends, waiting for the sync task
+        self._retired: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    # Writing
+
+    def append(
+        self,
+        room_id: str,
+        user_id: str,
+        content: str,
+        message_type: str = "text",
+        username: Optional[str] = None,
+        timestamp: Optional[datetime] = None
+    ) -> dict:
+        """
+        Store a new message and return it as a dict with its id.
+        Raises WriteBehindFull, before storing anything, if PostgreSQL is too far behind.
+        """
+        if self.write_behind is not None:
+            self.write_behind.check_capacity()
+        message_id = self.ids.next()
+        message = {
+            "id": message_id,
+            "content": content,
+            "message_type": message_type,
+            "room_id": room_id,
+            "user_id": user_id,
+            "timestamp": timestamp or message_timestamp(message_id),
+            "username": username
+        }
+        payload = orjson.dumps(message)
+
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self._create_room(room_id)
+        segment = room.active
+        if segment.size >= self.segment_bytes and segment.count:
+            segment = self._roll(room)
+
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload), message_id.encode("ascii")) + payload
+        # Index entry first: it may evict a writer, and one past the end of the segment is ignored on load
+        if segment.count % self.index_interval == 0:
+            self._add_index_entry(segment, room.count, segment.size, message_id, persist=True)
+        fd = self._writer(segment.path)
+        os.write(fd, record)
+        self._extend_map(segment, record)
+        self._index_message(room, segment, segment.size, message_id, user_id)
+        segment.size += len(record)
+        segment.count += 1
+        room.count += 1
+        room.last_id = message_id
+        self.search_index.add(room_id, room.directory, room.count - 1, message)
+
+        if self.fsync_mode == "always":
+            # Blocking by choice; see FSYNC_MODE
+            os.fsync(fd)
+        elif self.fsync_mode == "batch":
+            self._dirty.add(segment.path)
+        self.recent.append(room_id, message)
+        if self.write_behind is not None:
+            self.write_behind.submit(message)
+        return message
+
+    def delete(self, message_id: str) -> bool:
+        """Tombstone a message. Returns False if it does not exist or is already deleted."""
+        entry = self.by_id.get(message_id)
+        if entry is None or entry.deleted:
+            return False
+        entry.deleted = True
+        room = entry.room
+        room.deleted.add(message_id)
+        self.recent.invalidate(room.room_id)
+        self.user_counts[entry.user_id] -= 1
+        with open(os.path.join(room.directory, "tombstones"), "a") as tombstones:
+            tombstones.write(message_id + "\n")
+        return True
+
+    def _index_message(self, room: RoomLog, segment: Segment, offset: int, message_id: str, user_id: str) -> None:
+        self.by_id[message_id] = IndexEntry(room, segment, offset, user_id)
+        user_ids = self.by_user.get(user_id)
+        if user_ids is None:
+            user_ids = self.by_user[user_id] = []
+            self.user_counts[user_id] = 0
+        user_ids.append(message_id)
+        self.user_counts[user_id] += 1
+
+    # Reading
+
+    def get(self, message_id: str) -> Optional[dict]:
+        """Look a live message up by id"""
+        entry = self.by_id.get(message_id)
+        if entry is None or entry.deleted:
+            return None
+        return orjson.loads(self._read(entry))
+
+    def _read(self, entry: IndexEntry) -> bytes:
+        view = self._map(entry.segment)
+        if entry.offset < len(view):
+            buffer, offset = view, entry.offset
+        else:
+            buffer, offset = entry.segment.tail, entry.offset - len(view)
+        length, _, _ = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        return buffer[start:start + length]
+
+    def count(self, room_id: str) -> int:
+        """Messages in a room, not counting deleted ones"""
+        room = self.rooms.get(room_id)
+        return room.count - len(room.deleted) if room is not None else 0
+
+    def room_page(
+        self,
+        room_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[dict], bool, bool]:
+        """
+        One page of a room's history, oldest first: the `limit` messages
+        just after `after`, just before `before`, or the latest ones.
+        Returns (messages, older ones exist, newer ones exist).
+
+        The cursor id is found with a bisect on the sparse index, so a page
+        deep in the history costs the same as the latest one. Latest pages
+        of up to `recent.per_room` messages come from memory.
+        """
+        room = self.rooms.get(room_id)
+        if room is None:
+            return [], False, False
+
+        if before is None and after is None and limit <= self.recent.per_room:
+            latest = self.recent.get(room_id)
+            if latest is None:
+                latest = self.recent.fill(room_id, self._read_back(room, room.count, self.recent.per_room)[0])
+            messages = list(islice(latest, max(len(latest) - limit, 0), None))
+            return messages, room.count - len(room.deleted) > len(messages), False
+
+        if after is not None:
+            start = self._position(room, after, strict=True)
+            messages = []
+            newer = False
+            for message_id, payload in self._iter_room(room, start):
+                if message_id in room.deleted:
+                    continue
+                if len(messages) == limit:
+                    newer = True
+                    break
+                messages.append(orjson.loads(payload))
+            return messages, start > 0, newer
+
+        end = self._position(room, before) if before is not None else room.count
+        messages, older = self._read_back(room, end, limit)
+        return messages, older, end < room.count
+
+    def _read_back(self, room: RoomLog, end: int, limit: int) -> Tuple[List[dict], bool]:
+        """The last `limit` live messages before position `end`, oldest first, and whether older ones exist"""
+        # Records only run forwards, so walk back in chunks just big enough for what is still missing
+        collected: List[dict] = []
+        older = False
+        while end > 0 and not older:
+            start = max(0, end - (limit + 1 - len(collected)))
+            chunk = [
+                payload for message_id, payload in islice(self._iter_room(room, start), end - start)
+                if message_id not in room.deleted
+            ]
+            for payload in reversed(chunk):
+                if len(collected) == limit:
+                    older = True
+                    break
+                collected.append(orjson.loads(payload))
+            end = start
+        collected.reverse()
+        return collected, older
+
+    def _position(self, room: RoomLog, message_id: str, strict: bool = False) -> int:
+        """Position of the first message whose id is >= `message_id` (> if `strict`)"""
+        if room.count == 0 or message_id > room.last_id:
+            return room.count
+        segment = room.segment_for_id(message_id)
+        position, offset = segment.locate_id(message_id)
+        target = message_id.encode("ascii")
+        for record_id, _, _, _ in self._records(segment, offset):
+            if record_id > target or (record_id == target and not strict):
+                return position
+            position += 1
+        return position
+
+    def _iter_room(self, room: RoomLog, position: int) -> Iterator[Tuple[str, bytes]]:
+        """(id, JSON payload) from `position` to the end of the room"""
+        if position >= room.count:
+            return
+        segment_index = bisect.bisect_right(room.bases, position) - 1
+        for segment in room.segments[segment_index:]:
+            if not segment.count:
+                break
+            indexed, offset = segment.locate(max(position, segment.base))
+            skip = max(position - indexed, 0)
+            for record_id, buffer, start, length in self._records(segment, offset):
+                if skip:
+                    skip -= 1
+                    continue
+                yield record_id.decode("ascii"), buffer[start:start + length]
+
+    def user_page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[dict], bool, bool]:
+        """Like `room_page`, across every room the user wrote in, through the per-user index"""
+        ids = self.by_user.get(user_id)
+        if not ids:
+            return [], False, False
+        by_id = self.by_id
+
+        if after is not None:
+            start = bisect.bisect_right(ids, after)
+            messages = []
+            newer = False
+            for message_id in islice(ids, start, None):
+                entry = by_id[message_id]
+                if entry.deleted:
+                    continue
+                if len(messages) == limit:
+                    newer = True
+                    break
+                messages.append(orjson.loads(self._read(entry)))
+            return messages, start > 0, newer
+
+        end = bisect.bisect_left(ids, before) if before is not None else len(ids)
+        messages = []
+        older = False
+        for index in range(end - 1, -1, -1):
+            entry = by_id[ids[index]]
+            if entry.deleted:
+                continue
+            if len(messages) == limit:
+                older = True
+                break
+            messages.append(orjson.loads(self._read(entry)))
+        messages.reverse()
+        return messages, older, end < len(ids)
+
+    def search(
+        self,
+        room_id: str,
+        query: str,
+        user_id: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[List[dict], bool]:
+        """
+        Live messages of a room containing every word of `query`, newest
+        first, optionally only those sent by `user_id`. Returns (messages,
+        more matches exist). Only the matches returned are read.
+        """
+        room = self.rooms.get(room_id)
+        if room is None:
+            return [], False
+        messages = []
+        for position in self.search_index.search(room_id, query, user_id):
+            message_id, payload = next(self._iter_room(room, position))
+            if message_id in room.deleted:
+                continue
+            if len(messages) == limit:
+                return messages, True
+            messages.append(orjson.loads(payload))
+        return messages, False
+
+    def user_count(self, user_id: str) -> int:
+        """Messages sent by a user, not counting deleted ones"""
+        return self.user_counts.get(user_id, 0)
+
+    def _records(self, segment: Segment, offset: int) -> Iterator[Tuple[bytes, Buffer, int, int]]:
+        """(id, buffer, payload start in the buffer, payload length) of each record from `offset`"""
+        view = self._map(segment)
+        mapped = len(view)
+        if offset < mapped:
+            for record_id, start, length in self._headers(view, offset, mapped):
+                yield record_id, view, start, length
+            offset = mapped
+        tail = segment.tail
+        for record_id, start, length in self._headers(tail, offset - mapped, len(tail)):
+            yield record_id, tail, start, length
+
+    @staticmethod
+    def _headers(view: Buffer, offset: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+        """(id, payload start, payload length) of each record from `offset`"""
+        header_size = RECORD_HEADER.size
+        while offset + header_size <= end:
+            length, _, record_id = RECORD_HEADER.unpack_from(view, offset)
+            start = offset + header_size
+            yield record_id, start, length
+            offset = start + length
+
+    # Durability
+
+    def start(self) -> None:
+        """Start the batched fsync task, search index maintenance and the write-behind stage"""
+        if self.fsync_mode == "batch" and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+        self.search_index.start()
+        if self.write_behind is not None:
+            self.write_behind.start()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            fds = self._take_dirty()
+            if fds:
+                # A disk flush can take milliseconds; no connection should wait for it
+                await asyncio.to_thread(fsync_and_close, fds)
+
+    def sync(self) -> None:
+        """fsync every segment written since the last sync, blocking"""
+        fsync_and_close(self._take_dirty())
+
+    def _take_dirty(self) -> List[int]:
+        """
+        Descriptors to fsync for the segments written since the last sync:
+        duplicates of the open writers, so they stay valid if a writer is
+        closed meanwhile, plus writers closed while still dirty.
+        """
+        dirty, self._dirty = self._dirty, set()
+        fds = [os.dup(self._writers[path]) for path in dirty if path in self._writers]
+        fds.extend(self._retired)
+        self._retired = []
+        return fds
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.write_behind is not None:
+            await self.write_behind.close()
+        await self.search_index.close()
+        await asyncio.to_thread(self.sync)
+        for fd in self._writers.values():
+            os.close(fd)
+        self._writers.clear()
+        for view in self._maps.values():
+            view.close()
+        self._maps.clear()
+
+    # Files
+
+    def _writer(self, path: str) -> int:
+        """Append descriptor for a segment or index file"""
+        fd = self._writers.get(path)
+        if fd is not None:
+            self._writers.move_to_end(path)
+            return fd
+        if len(self._writers) >= self.max_open:
+            self._close_writer(*self._writers.popitem(last=False))
+        fd = self._writers[path] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return fd
+
+    def _close_writer(self, path: str, fd: int) -> None:
+        if path in self._dirty:
+            # Still owed an fsync; the sync task does it and closes the descriptor
+            self._dirty.discard(path)
+            self._retired.append(fd)
+        else:
+            os.close(fd)
+
+    def _map(self, segment: Segment) -> Buffer:
+        """
+        Read-only map of the segment. Together with `segment.tail` it covers
+        everything written so far.
+        """
+        view = self._maps.get(segment.path)
+        if view is not None:
+            self._maps.move_to_end(segment.path)
+            return view
+        if len(self._maps) >= self.max_open:
+            self._maps.popitem(last=False)[1].close()
+        segment.tail = bytearray()
+        if segment.size == 0:
+            return b""
+        with open(segment.path, "rb") as source:
+            view = self._maps[segment.path] = mmap.mmap(source.fileno(), segment.size, access=mmap.ACCESS_READ)
+        return view
+
+    def _extend_map(self, segment: Segment, record: bytes) -> None:
+        """Make a record just appended readable without mapping the segment again"""
+        view = self._maps.get(segment.path)
+        if view is None:
+            # The next map is made at the new size
+            return
+        if len(segment.tail) + len(record) > TAIL_BYTES:
+            del self._maps[segment.path]
+            view.close()
+            segment.tail = bytearray()
+            return
+        segment.tail += record
+
+    def _add_index_entry(self, segment: Segment, position: int, offset: int, message_id: str, persist: bool) -> None:
+        segment.positions.append(position)
+        segment.offsets.append(offset)
+        segment.ids.append(message_id)
+        if persist:
+            os.write(self._writer(segment.index_path), INDEX_ENTRY.pack(position, offset, message_id.encode("ascii")))
+
+    def _create_room(self, room_id: str) -> RoomLog:
+        directory = os.path.join(self.directory, _room_directory(room_id))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "room_id"), "w") as name:
+            name.write(room_id)
+        room = self.rooms[room_id] = RoomLog(room_id, directory)
+        self._new_segment(room, 0)
+        return room
+
+    def _roll(self, room: RoomLog) -> Segment:
+        sealed = room.active
+        for path in (sealed.path, sealed.index_path):
+            fd = self._writers.pop(path, None)
+            if fd is not None:
+                self._close_writer(path, fd)
+        return self._new_segment(room, room.count)
+
+    def _new_segment(self, room: RoomLog, base: int) -> Segment:
+        segment = Segment(room.directory, base)
+        open(segment.path, "ab").close()
+        room.segments.append(segment)
+        room.bases.append(base)
+        return segment
+
+    # Recovery
+
+    def _load(self) -> None:
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            name_path = os.path.join(entry.path, "room_id")
+            if not os.path.exists(name_path):
+                continue
+            with open(name_path) as name:
+                room_id = name.read()
+            room = self.rooms[room_id] = RoomLog(room_id, entry.path)
+            bases = sorted(int(file[:-4]) for file in os.listdir(entry.path) if file.endswith(".log"))
+            for position, base in enumerate(bases):
+                segment = Segment(entry.path, base)
+                segment.size = os.path.getsize(segment.path)
+                self._load_index(segment)
+                room.segments.append(segment)
+                room.bases.append(base)
+                if position + 1 < len(bases):
+                    segment.count = bases[position + 1] - base
+            if not room.segments:
+                self._new_segment(room, 0)
+            self._recover_tail(room)
+            room.count = room.active.base + room.active.count
+            self._index_room(room)
+
+            tombstones = os.path.join(entry.path, "tombstones")
+            if os.path.exists(tombstones):
+                with open(tombstones) as source:
+                    for line in source:
+                        message_id = line.strip()
+                        indexed = self.by_id.get(message_id)
+                        if indexed is not None and not indexed.deleted:
+                            indexed.deleted = True
+                            room.deleted.add(message_id)
+                            self.user_counts[indexed.user_id] -= 1
+            self.search_index.load_room(
+                room_id, entry.path, room.count,
+                lambda start, room=room: self._room_messages(room, start)
+            )
+
+        # Rooms interleave in time, so each user's ids are put back in order once
+        for user_ids in self.by_user.values():
+            user_ids.sort()
+        if self.by_id:
+            self.ids.advance_past(max(room.last_id for room in self.rooms.values() if room.last_id))
+
+    def _load_index(self, segment: Segment) -> None:
+        if not os.path.exists(segment.index_path):
+            return
+        with open(segment.index_path, "rb") as source:
+            data = source.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for position, offset, message_id in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if offset >= segment.size:
+                break
+            self._add_index_entry(segment, position, offset, message_id.decode("ascii"), persist=False)
+
+    def _index_room(self, room: RoomLog) -> None:
+        """
+        Add every message of a recovered room to the indexes. The scan also
+        checks each segment's sparse index and rebuilds one whose file was
+        missing, short or corrupt.
+        """
+        for segment in room.segments:
+            if not segment.count:
+                continue
+            view = self._map(segment)
+            entries = []
+            for local, (record_id, start, length) in enumerate(self._headers(view, 0, segment.size)):
+                message_id = record_id.decode("ascii")
+                offset = start - RECORD_HEADER.size
+                if local % self.index_interval == 0:
+                    entries.append((segment.base + local, offset, message_id))
+                user_id = orjson.loads(view[start:start + length])["user_id"]
+                self._index_message(room, segment, offset, message_id, user_id)
+                room.last_id = message_id
+            if entries != list(zip(segment.positions, segment.offsets, segment.ids)):
+                self._rebuild_index(segment, entries)
+
+    def _rebuild_index(self, segment: Segment, entries: List[Tuple[int, int, str]]) -> None:
+        segment.positions = [position for position, _, _ in entries]
+        segment.offsets = [offset for _, offset, _ in entries]
+        segment.ids = [message_id for _, _, message_id in entries]
+        with open(segment.index_path, "wb") as index:
+            for position, offset, message_id in entries:
+                index.write(INDEX_ENTRY.pack(position, offset, message_id.encode("ascii")))
+
+    def _room_messages(self, room: RoomLog, start: int) -> Iterator[Tuple[int, dict]]:
+        """(position, message) from `start`, for catching the search index up"""
+        for position, (_, payload) in enumerate(self._iter_room(room, start), start):
+            yield position, orjson.loads(payload)
+
+    def _recover_tail(self, room: RoomLog) -> None:
+        """
+        Scan the whole active segment, checking every record's CRC, and drop
+        a torn tail. The scan starts at offset 0 rather than at the last
+        sparse index entry: a wrong offset in the .idx would otherwise make
+        valid records look torn and truncate them away. The active segment's
+        sparse index is rebuilt from the scan.
+        """
+        segment = room.active
+        with open(segment.path, "rb") as source:
+            data = source.read()
+
+        segment.positions, segment.offsets, segment.ids = [], [], []
+        position = segment.base
+        cursor = 0
+        header_size = RECORD_HEADER.size
+        while cursor + header_size <= len(data):
+            length, crc, record_id = RECORD_HEADER.unpack_from(data, cursor)
+            payload = data[cursor + header_size:cursor + header_size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            if (position - segment.base) % self.index_interval == 0:
+                self._add_index_entry(segment, position, cursor, record_id.decode("ascii"), persist=False)
+            cursor += header_size + length
+            position += 1
+
+        # Only now that every record before it checked out
+        if cursor < segment.size:
+            os.truncate(segment.path, cursor)
+        segment.size = cursor
+        segment.count = position - segment.base
+        # Rewrite the index so it matches what survived
+        with open(segment.index_path, "wb") as index:
+            for entry in zip(segment.positions, segment.offsets, segment.ids):
+                index.write(INDEX_ENTRY.pack(entry[0], entry[1], entry[2].encode("ascii")))
+
+
+def _room_directory(room_id: str) -> str:
+    # Room ids are arbitrary strings; keep them out of path syntax
+    return base64.urlsafe_b64encode(room_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def open_message_log() -> MessageLog:
+    """
+    The service's message log. Opening it scans every room, so the app
+    lifespan does it once at startup rather than at import.
+    """
+    return MessageLog(write_behind=create_message_writer())
@@ -0,0 +1,318 @@
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Deque, List, Optional, Tuple
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+import orjson
+
+from .fsync import fsync_and_close
+
+# Add shared directory to path for logger and metrics import
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+from shared.logging import SocketHubLogger
+from shared.metrics import REGISTRY, REQUEST_BUCKETS
+
+# Write-behind to PostgreSQL is enabled by setting this
+CHAT_DATABASE_URL = os.getenv("CHAT_DATABASE_URL")
+# Messages accepted but not yet in PostgreSQL; senders get an error beyond this
+QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+# A batch is flushed when it is this big or this old, whichever comes first
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.2"))
+# Wait before retrying after the database failed a flush
+RETRY_INTERVAL = float(os.getenv("WRITE_BEHIND_RETRY_INTERVAL", "1"))
+# Accepted messages are spilled here until flushed, so a restart does not lose them
+SPILL_DIR = os.getenv(
+    "WRITE_BEHIND_SPILL_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "write_behind")
+)
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    username TEXT,
+    created_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_messages_room_id_idx ON chat_messages (room_id, id);
+CREATE INDEX IF NOT EXISTS chat_messages_user_id_idx ON chat_messages (user_id, id);
+"""
+
+# One statement for the whole batch; replaying a batch after a crash is a no-op
+INSERT_BATCH = """
+INSERT INTO chat_messages (id, room_id, user_id, content, message_type, username, created_at)
+SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::timestamptz[])
+ON CONFLICT (id) DO NOTHING
+"""
+
+# Connection problems and server-side errors; both leave the batch queued for a retry
+DATABASE_ERRORS = (OSError, asyncpg.PostgresError, asyncpg.InterfaceError)
+
+FLUSH_SECONDS = REGISTRY.histogram("socket_hub_chat_write_behind_flush_seconds", "Time to write one batch to PostgreSQL.", REQUEST_BUCKETS)
+FLUSHED = REGISTRY.counter("socket_hub_chat_write_behind_flushed_total", "Messages written to PostgreSQL.")
+FLUSH_ERRORS = REGISTRY.counter("socket_hub_chat_write_behind_flush_errors_total", "Batches PostgreSQL failed to take.")
+REJECTED = REGISTRY.counter("socket_hub_chat_write_behind_rejected_total", "Messages refused because the write-behind queue was full.")
+
+
+class WriteBehindFull(Exception):
+    """The write-behind queue is at capacity; the sender should retry later"""
+
+
+class SpillFile:
+    """One append-only JSON-lines file of accepted messages and how many are still unflushed"""
+    __slots__ = ("path", "fd", "pending")
+
+    def __init__(self, path: str, fd: Optional[int], pending: int = 0) -> None:
+        self.path = path
+        self.fd = fd
+        self.pending = pending
+
+
+class MessageWriter:
+    """
+    Write-behind stage between the WebSocket loop and PostgreSQL.
+
+    `submit` only appends to a bounded in-memory queue and to a local spill
+    file, so the sender is acknowledged without waiting for the database.
+    A background task flushes the queue in batches of up to `batch_size`
+    messages, or whatever is there every `flush_interval`, with a single
+    multi-row INSERT per batch.
+
+    Spill files are rotated every `batch_size` messages and deleted once
+    all of their messages are in PostgreSQL. On startup the remaining ones
+    are read back into the queue. Inserts ignore ids that already exist,
+    so a batch written just before a crash can safely be written again.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        max_queue: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        retry_interval: float = RETRY_INTERVAL,
+        spill_dir: str = SPILL_DIR
+    ) -> None:
+        self.database_url = database_url
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.spill_dir = os.path.abspath(spill_dir)
+        self.logger = SocketHubLogger("chat-service").get_logger()
+        self._queue: Deque[dict] = deque()
+        self._spills: Deque[SpillFile] = deque()
+        self._next_spill = 0
+        # Descriptors of rotated spill files, closed once the flush task has synced them
+        self._retired: List[int] = []
+        self._full = asyncio.Event()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._task: Optional[asyncio.Task] = None
+        REGISTRY.gauge("socket_hub_chat_write_behind_queue_depth", "Messages waiting to be written to PostgreSQL.", lambda: len(self._queue))
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._recover()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def connected(self) -> bool:
+        return self._pool is not None
+
+    def check_capacity(self) -> None:
+        """Raise WriteBehindFull if another message cannot be accepted"""
+        if len(self._queue) >= self.max_queue:
+            REJECTED.inc()
+            raise WriteBehindFull(f"{len(self._queue)} messages waiting for the database")
+
+    def submit(self, message: dict) -> None:
+        """
+        Accept a message for writing. Once this returns it is in the spill
+        file and survives a process crash; it survives a power loss only
+        once the flush task has synced the spill, normally within
+        `flush_interval`.
+        """
+        spill = self._spills[-1] if self._spills else None
+        if spill is None or spill.fd is None or spill.pending >= self.batch_size:
+            spill = self._rotate()
+        os.write(spill.fd, orjson.dumps(message) + b"\n")
+        spill.pending += 1
+        self._queue.append(message)
+        if len(self._queue) >= self.batch_size:
+            self._full.set()
+
+    # Flushing
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pool is None:
+            pool = None
+            try:
+                pool = await asyncpg.create_pool(self.database_url, min_size=1, max_size=2)
+                async with pool.acquire() as connection:
+                    await connection.execute(CREATE_TABLE)
+                self._pool = pool
+            except DATABASE_ERRORS as e:
+                self.logger.warning("Write-behind cannot reach PostgreSQL, retrying: %s", e)
+                if pool is not None:
+                    await pool.close()
+                # Messages are still accepted while the database is away; keep their spill durable
+                await self._sync_spill()
+                await asyncio.sleep(self.retry_interval)
+
+        while True:
+            if len(self._queue) < self.batch_size:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            # Group commit: what was accepted during the wait hits the disk once
+            await self._sync_spill()
+            if not self._queue:
+                continue
+            if not await self.flush():
+                await asyncio.sleep(self.retry_interval)
+
+    async def flush(self) -> bool:
+        """Write the oldest batch. Returns False if PostgreSQL did not take it."""
+        batch = list(islice(self._queue, self.batch_size))
+        started = time.perf_counter()
+        try:
+            async with self._pool.acquire() as connection:
+                await connection.execute(INSERT_BATCH, *_columns(batch))
+        except DATABASE_ERRORS as e:
+            FLUSH_ERRORS.inc()
+            self.logger.warning("Write-behind flush of %d messages failed: %s", len(batch), e)
+            return False
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        FLUSHED.inc(len(batch))
+        for _ in batch:
+            self._queue.popleft()
+        self._release(len(batch))
+        return True
+
+    async def close(self) -> None:
+        """Stop flushing; anything unflushed stays in the spill files for the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pool is not None:
+            while self._queue and await self.flush():
+                pass
+            await self._pool.close()
+        fds, self._retired = self._retired, []
+        for spill in self._spills:
+            if spill.fd is not None:
+                fds.append(spill.fd)
+                spill.fd = None
+        await asyncio.to_thread(fsync_and_close, fds)
+
+    # Spill files
+
+    async def _sync_spill(self) -> None:
+        fds = self._take_unsynced()
+        if fds:
+            # fsync can take milliseconds; senders must not wait for it
+            await asyncio.to_thread(fsync_and_close, fds)
+
+    def _take_unsynced(self) -> List[int]:
+        """Descriptors to fsync: rotated spill files plus a duplicate of the current one"""
+        fds, self._retired = self._retired, []
+        if self._spills and self._spills[-1].fd is not None:
+            fds.append(os.dup(self._spills[-1].fd))
+        return fds
+
+    def _rotate(self) -> SpillFile:
+        current = self._spills[-1] if self._spills else None
+        if current is not None and current.fd is not None:
+            # Synced and closed by the flush task; submit never waits for the disk
+            self._retired.append(current.fd)
+            current.fd = None
+        path = os.path.join(self.spill_dir, f"{self._next_spill:020d}.jsonl")
+        self._next_spill += 1
+        spill = SpillFile(path, os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644))
+        self._spills.append(spill)
+        return spill
+
+    def _release(self, flushed: int) -> None:
+        # The queue and the spill files are in the same order, so the flushed batch is at the front
+        while flushed and self._spills:
+            spill = self._spills[0]
+            taken = min(flushed, spill.pending)
+            spill.pending -= taken
+            flushed -= taken
+            if spill.pending:
+                break
+            if spill.fd is not None:
+                if len(self._spills) == 1:
+                    # Empty and still current: keep appending to it
+                    os.ftruncate(spill.fd, 0)
+                    break
+                os.close(spill.fd)
+            os.remove(spill.path)
+            self._spills.popleft()
+
+    def _recover(self) -> None:
+        names = sorted(name for name in os.listdir(self.spill_dir) if name.endswith(".jsonl"))
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            messages = _read_spill(path)
+            if not messages:
+                os.remove(path)
+                continue
+            self._queue.extend(messages)
+            self._spills.append(SpillFile(path, None, len(messages)))
+        if names:
+            self._next_spill = int(names[-1][:-6]) + 1
+        if self._queue:
+            self.logger.info("Write-behind recovered %d unflushed messages", len(self._queue))
+
+
+def _read_spill(path: str) -> List[dict]:
+    messages = []
+    with open(path, "rb") as source:
+        for line in source:
+            # A torn last line was never acknowledged
+            if not line.endswith(b"\n"):
+                break
+            messages.append(orjson.loads(line))
+    return messages
+
+
+def _columns(batch: List[dict]) -> Tuple[list, ...]:
+    created_at = []
+    for message in batch:
+        timestamp = message["timestamp"]
+        created_at.append(timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp))
+    return (
+        [message["id"] for message in batch],
+        [message["room_id"] for message in batch],
+        [message["user_id"] for message in batch],
+        [message["content"] for message in batch],
+        [message["message_type"] for message in batch],
+        [message["username"] for message in batch],
+        created_at
+    )
+
+
+def create_message_writer() -> Optional[MessageWriter]:
+    """Write-behind to PostgreSQL when CHAT_DATABASE_URL is set, otherwise None"""
+    if CHAT_DATABASE_URL:
+        return MessageWriter(CHAT_DATABASE_URL)
+    return None
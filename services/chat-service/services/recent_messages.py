@@ -0,0 +1,71 @@
+from collections import OrderedDict, deque
+from typing import Deque, Iterable, Optional
+import os
+
+# Latest messages kept per cached room; matches the default history page
+RECENT_PER_ROOM = int(os.getenv("RECENT_MESSAGES_PER_ROOM", "50"))
+# Messages cached across all rooms; the least recently read rooms go first
+RECENT_MAX_MESSAGES = int(os.getenv("RECENT_MESSAGES_MAX", "100000"))
+
+
+class RecentMessages:
+    """
+    Ring buffer of the latest messages of each hot room, with a global bound.
+
+    A room is loaded from the durable store the first time its latest page
+    is read, then kept current by appends, so "the last 50 messages" right
+    after a join is served from memory. Rooms are kept in read order and
+    the coldest are evicted whenever the total goes over `max_messages`.
+    A delete simply drops the room; it is reloaded on the next read.
+    """
+
+    def __init__(self, per_room: int = RECENT_PER_ROOM, max_messages: int = RECENT_MAX_MESSAGES) -> None:
+        self.per_room = per_room
+        self.max_messages = max_messages
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._rooms: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def get(self, room_id: str) -> Optional[Deque[dict]]:
+        """The room's latest messages, oldest first, or None if it is not cached"""
+        messages = self._rooms.get(room_id)
+        if messages is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._rooms.move_to_end(room_id)
+        return messages
+
+    def fill(self, room_id: str, latest: Iterable[dict]) -> Deque[dict]:
+        """Cache a room from the store; `latest` must be its last messages, oldest first"""
+        self.invalidate(room_id)
+        messages = self._rooms[room_id] = deque(latest, maxlen=self.per_room)
+        self.size += len(messages)
+        self._evict()
+        return messages
+
+    def append(self, room_id: str, message: dict) -> None:
+        """Keep a cached room current; rooms nobody has read are not cached on write"""
+        messages = self._rooms.get(room_id)
+        if messages is None:
+            return
+        if len(messages) < self.per_room:
+            self.size += 1
+            messages.append(message)
+            self._evict()
+        else:
+            messages.append(message)
+
+    def invalidate(self, room_id: str) -> None:
+        messages = self._rooms.pop(room_id, None)
+        if messages is not None:
+            self.size -= len(messages)
+
+    def _evict(self) -> None:
+        while self.size > self.max_messages and len(self._rooms) > 1:
+            _, messages = self._rooms.popitem(last=False)
+            self.size -= len(messages)
@@ -0,0 +1,491 @@
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import asyncio
+import os
+import re
+
+# Messages a room's in-memory index takes before it is written out as a segment
+MEMTABLE_DOCS = int(os.getenv("SEARCH_MEMTABLE_DOCS", "4096"))
+# This many adjacent segments of the same size class are merged into one
+MERGE_FACTOR = int(os.getenv("SEARCH_MERGE_FACTOR", "4"))
+# Merging stops at segments this big
+MAX_SEGMENT_DOCS = int(os.getenv("SEARCH_MAX_SEGMENT_DOCS", str(1 << 20)))
+
+# Documents per independently decodable block of a posting list
+BLOCK_SIZE = 128
+# Longest token indexed; longer words are cut to this
+MAX_TOKEN_LENGTH = 40
+SEGMENT_MAGIC = b"SHIX1"
+
+_TOKEN = re.compile(r"\w+")
+# Authors are indexed as a term no tokenized word can be equal to
+_USER_TERM = "\x00"
+
+# Yields (room position, message dict) from a position to the end of the room
+MessageSource = Callable[[int], Iterable[Tuple[int, dict]]]
+
+
+def tokenize(text: str) -> Set[str]:
+    """Distinct lowercase words of `text`"""
+    return {token[:MAX_TOKEN_LENGTH] for token in _TOKEN.findall(text.lower())}
+
+
+def _put_varint(buffer: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _get_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _remove_segments(paths: List[str]) -> None:
+    for path in paths:
+        os.remove(path)
+
+
+class OpenPostings:
+    """Posting list of the in-memory index: an ascending array of room positions"""
+    __slots__ = ("docs",)
+
+    def __init__(self) -> None:
+        self.docs = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def descending(self, cache: dict) -> Iterator[int]:
+        return reversed(self.docs)
+
+    def contains(self, doc: int, cache: dict) -> bool:
+        index = bisect_left(self.docs, doc)
+        return index < len(self.docs) and self.docs[index] == doc
+
+
+class PostingList:
+    """
+    Immutable posting list: ascending positions as varint-encoded deltas.
+
+    Positions are cut into blocks of BLOCK_SIZE, each starting from an
+    absolute value, with the last position and byte offset of every block
+    kept aside. Reading newest first or checking one position therefore
+    only decodes the blocks involved, never the whole list.
+    """
+    __slots__ = ("count", "data", "block_last", "block_offsets")
+
+    def __init__(self, count: int, data: bytes, block_last: array, block_offsets: array) -> None:
+        self.count = count
+        self.data = data
+        self.block_last = block_last
+        self.block_offsets = block_offsets
+
+    @classmethod
+    def encode(cls, docs: Sequence[int]) -> "PostingList":
+        data = bytearray()
+        block_last = array("Q")
+        block_offsets = array("Q")
+        for start in range(0, len(docs), BLOCK_SIZE):
+            block_offsets.append(len(data))
+            previous = 0
+            for doc in docs[start:start + BLOCK_SIZE]:
+                _put_varint(data, doc - previous)
+                previous = doc
+            block_last.append(previous)
+        return cls(len(docs), bytes(data), block_last, block_offsets)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def block(self, index: int, cache: dict) -> List[int]:
+        key = (id(self), index)
+        docs = cache.get(key)
+        if docs is None:
+            docs = cache[key] = []
+            data = self.data
+            position = self.block_offsets[index]
+            doc = 0
+            for _ in range(min(BLOCK_SIZE, self.count - index * BLOCK_SIZE)):
+                delta, position = _get_varint(data, position)
+                doc += delta
+                docs.append(doc)
+        return docs
+
+    def docs(self) -> List[int]:
+        cache: dict = {}
+        return [doc for index in range(len(self.block_offsets)) for doc in self.block(index, cache)]
+
+    def descending(self, cache: dict) -> Iterator[int]:
+        for index in range(len(self.block_offsets) - 1, -1, -1):
+            yield from reversed(self.block(index, cache))
+
+    def contains(self, doc: int, cache: dict) -> bool:
+        index = bisect_left(self.block_last, doc)
+        if index == len(self.block_last):
+            return False
+        docs = self.block(index, cache)
+        slot = bisect_left(docs, doc)
+        return slot < len(docs) and docs[slot] == doc
+
+
+class MemTable:
+    """Index of a room's newest messages, open for appends"""
+    __slots__ = ("base", "end", "terms")
+
+    def __init__(self, base: int) -> None:
+        self.base = base
+        self.end = base
+        self.terms: Dict[str, OpenPostings] = {}
+
+    @property
+    def docs(self) -> int:
+        return self.end - self.base
+
+    def add(self, position: int, terms: Iterable[str]) -> None:
+        index = self.terms
+        for term in terms:
+            postings = index.get(term)
+            if postings is None:
+                postings = index[term] = OpenPostings()
+            postings.docs.append(position)
+        self.end = position + 1
+
+
+class IndexSegment:
+    """Immutable index of the room positions [base, end), persisted as one file"""
+    __slots__ = ("base", "end", "terms", "path")
+
+    def __init__(self, base: int, end: int, terms: Dict[str, PostingList], path: Optional[str] = None) -> None:
+        self.base = base
+        self.end = end
+        self.terms = terms
+        self.path = path
+
+    @property
+    def docs(self) -> int:
+        return self.end - self.base
+
+    def write(self, directory: str) -> None:
+        buffer = bytearray(SEGMENT_MAGIC)
+        _put_varint(buffer, self.base)
+        _put_varint(buffer, self.end)
+        _put_varint(buffer, len(self.terms))
+        for term, postings in self.terms.items():
+            encoded = term.encode("utf-8")
+            _put_varint(buffer, len(encoded))
+            buffer += encoded
+            _put_varint(buffer, postings.count)
+            _put_varint(buffer, len(postings.block_last))
+            for last, offset in zip(postings.block_last, postings.block_offsets):
+                _put_varint(buffer, last)
+                _put_varint(buffer, offset)
+            _put_varint(buffer, len(postings.data))
+            buffer += postings.data
+
+        self.path = os.path.join(directory, f"{self.base:020d}-{self.end:020d}.seg")
+        # Written aside and renamed, so a crash never leaves half a segment behind
+        partial = self.path + ".tmp"
+        with open(partial, "wb") as target:
+            target.write(buffer)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(partial, self.path)
+
+    @classmethod
+    def read(cls, path: str) -> "IndexSegment":
+        with open(path, "rb") as source:
+            data = source.read()
+        if not data.startswith(SEGMENT_MAGIC):
+            raise ValueError(f"Not a search index segment: {path}")
+        position = len(SEGMENT_MAGIC)
+        base, position = _get_varint(data, position)
+        end, position = _get_varint(data, position)
+        term_count, position = _get_varint(data, position)
+        terms = {}
+        for _ in range(term_count):
+            length, position = _get_varint(data, position)
+            term = data[position:position + length].decode("utf-8")
+            position += length
+            count, position = _get_varint(data, position)
+            blocks, position = _get_varint(data, position)
+            block_last = array("Q")
+            block_offsets = array("Q")
+            for _ in range(blocks):
+                last, position = _get_varint(data, position)
+                offset, position = _get_varint(data, position)
+                block_last.append(last)
+                block_offsets.append(offset)
+            length, position = _get_varint(data, position)
+            terms[term] = PostingList(count, data[position:position + length], block_last, block_offsets)
+            position += length
+        return cls(base, end, terms, path)
+
+    @classmethod
+    def from_memtable(cls, memtable: MemTable) -> "IndexSegment":
+        return cls(
+            memtable.base,
+            memtable.end,
+            {term: PostingList.encode(postings.docs) for term, postings in memtable.terms.items()}
+        )
+
+    @classmethod
+    def merge(cls, segments: Sequence["IndexSegment"]) -> "IndexSegment":
+        """One segment out of adjacent ones; their ranges follow each other, so lists just concatenate"""
+        docs: Dict[str, List[int]] = {}
+        for segment in segments:
+            for term, postings in segment.terms.items():
+                merged = docs.get(term)
+                if merged is None:
+                    docs[term] = postings.docs()
+                else:
+                    merged.extend(postings.docs())
+        return cls(
+            segments[0].base,
+            segments[-1].end,
+            {term: PostingList.encode(term_docs) for term, term_docs in docs.items()}
+        )
+
+
+class RoomIndex:
+    """Segments of one room, oldest first, the memtables being written out and the open one"""
+    __slots__ = ("directory", "segments", "frozen", "memtable")
+
+    def __init__(self, directory: str, indexed_until: int = 0) -> None:
+        self.directory = directory
+        self.segments: List[IndexSegment] = []
+        self.frozen: List[MemTable] = []
+        self.memtable = MemTable(indexed_until)
+
+    def newest_first(self) -> Iterator:
+        yield self.memtable
+        yield from reversed(self.frozen)
+        yield from reversed(self.segments)
+
+
+class SearchIndex:
+    """
+    Incremental inverted index over message contents, one per room.
+
+    New messages go into the room's in-memory table. Every `memtable_docs`
+    messages it is frozen and written out as an immutable segment with
+    block-compressed posting lists, and runs of `merge_factor` segments of
+    the same size class are merged. Both happen in a background task, off
+    the event loop thread, while the frozen data stays searchable. Only
+    callers without a running event loop, such as the startup load on the
+    loader thread, build and merge segments inline.
+
+    Documents are room positions in the message log, so results come back
+    newest first and a query stops as soon as it has enough of them: the
+    rarest term drives, the others are only probed block by block.
+    Authors are indexed as a term of their own, so filtering by user is
+    one more intersection. On startup persisted segments are loaded and
+    only messages after the last one are indexed again.
+    """
+
+    def __init__(
+        self,
+        memtable_docs: int = MEMTABLE_DOCS,
+        merge_factor: int = MERGE_FACTOR,
+        max_segment_docs: int = MAX_SEGMENT_DOCS
+    ) -> None:
+        self.memtable_docs = memtable_docs
+        self.merge_factor = merge_factor
+        self.max_segment_docs = max_segment_docs
+        self.rooms: Dict[str, RoomIndex] = {}
+        self._pending: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    # Indexing
+
+    def load_room(self, room_id: str, directory: str, count: int, messages: MessageSource) -> None:
+        """
+        Load the persisted segments of a room with `count` messages and index
+        whatever the log has beyond them. Blocking; called while the message
+        log loads, which runs on a worker thread.
+        """
+        room = self.rooms[room_id] = RoomIndex(os.path.join(directory, "search"))
+        os.makedirs(room.directory, exist_ok=True)
+        segments = []
+        for name in os.listdir(room.directory):
+            path = os.path.join(room.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.endswith(".seg"):
+                segments.append(IndexSegment.read(path))
+
+        # A crash during a merge can leave both the merged segment and its inputs; keep the merged one.
+        # Segments past the end of the log cover records lost with a torn tail.
+        segments.sort(key=lambda segment: (segment.base, -segment.end))
+        for segment in segments:
+            if segment.end > count or (room.segments and segment.end <= room.segments[-1].end):
+                os.remove(segment.path)
+                continue
+            room.segments.append(segment)
+        room.memtable = MemTable(room.segments[-1].end if room.segments else 0)
+
+        for position, message in messages(room.memtable.base):
+            self.add(room_id, directory, position, message, background=False)
+
+    def add(self, room_id: str, directory: str, position: int, message: dict, background: bool = True) -> None:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = RoomIndex(os.path.join(directory, "search"))
+            os.makedirs(room.directory, exist_ok=True)
+        terms = tokenize(message["content"])
+        terms.add(_USER_TERM + message["user_id"])
+        room.memtable.add(position, terms)
+        if room.memtable.docs >= self.memtable_docs:
+            self._freeze(room_id, room, background)
+
+    def _freeze(self, room_id: str, room: RoomIndex, background: bool) -> None:
+        frozen = room.memtable
+        if not frozen.docs:
+            return
+        room.frozen.append(frozen)
+        room.memtable = MemTable(frozen.end)
+        if background and _on_event_loop():
+            if self._closing:
+                # close() writes out whatever is frozen once the task is done
+                return
+            self.start()
+            self._pending.put_nowait(room_id)
+        else:
+            self._write_frozen(room)
+            self._merge(room)
+
+    # Background work
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._pending = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            room_id = await self._pending.get()
+            if room_id is None:
+                return
+            room = self.rooms[room_id]
+            await self._write_frozen_async(room)
+            while not self._closing:
+                run = self._merge_candidates(room)
+                if run is None:
+                    break
+                merged = await asyncio.to_thread(self._build_merge, run, room.directory)
+                await asyncio.to_thread(_remove_segments, self._replace(room, run, merged))
+
+    async def _write_frozen_async(self, room: RoomIndex) -> None:
+        while room.frozen:
+            # Searches keep seeing the memtable until its segment is in place
+            segment = await asyncio.to_thread(self._build, room.frozen[0], room.directory)
+            room.segments.append(segment)
+            room.frozen.pop(0)
+
+    @staticmethod
+    def _build(frozen: MemTable, directory: str) -> IndexSegment:
+        segment = IndexSegment.from_memtable(frozen)
+        segment.write(directory)
+        return segment
+
+    @staticmethod
+    def _build_merge(run: List[IndexSegment], directory: str) -> IndexSegment:
+        merged = IndexSegment.merge(run)
+        merged.write(directory)
+        return merged
+
+    def _write_frozen(self, room: RoomIndex) -> None:
+        while room.frozen:
+            room.segments.append(self._build(room.frozen.pop(0), room.directory))
+
+    def _merge(self, room: RoomIndex) -> None:
+        while True:
+            run = self._merge_candidates(room)
+            if run is None:
+                return
+            _remove_segments(self._replace(room, run, self._build_merge(run, room.directory)))
+
+    def _merge_candidates(self, room: RoomIndex) -> Optional[List[IndexSegment]]:
+        """The oldest run of `merge_factor` adjacent segments in the same size class"""
+        segments = room.segments
+        for start in range(len(segments) - self.merge_factor + 1):
+            run = segments[start:start + self.merge_factor]
+            size_class = self._size_class(run[0])
+            if all(self._size_class(segment) == size_class for segment in run) and \
+                    sum(segment.docs for segment in run) <= self.max_segment_docs:
+                return run
+        return None
+
+    def _size_class(self, segment: IndexSegment) -> int:
+        size_class = 0
+        docs = segment.docs // self.memtable_docs
+        while docs >= self.merge_factor:
+            docs //= self.merge_factor
+            size_class += 1
+        return size_class
+
+    @staticmethod
+    def _replace(room: RoomIndex, run: List[IndexSegment], merged: IndexSegment) -> List[str]:
+        """Put `merged` in place of `run` and return the files it made obsolete"""
+        start = room.segments.index(run[0])
+        room.segments[start:start + len(run)] = [merged]
+        return [segment.path for segment in run if segment.path is not None and segment.path != merged.path]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # Let segments being written finish, but leave merges for the next start
+            self._closing = True
+            self._pending.put_nowait(None)
+            await self._task
+            self._task = None
+        # Persist what is still in memory so the next start does not re-index it
+        for room in list(self.rooms.values()):
+            if room.memtable.docs:
+                room.frozen.append(room.memtable)
+                room.memtable = MemTable(room.memtable.end)
+            await self._write_frozen_async(room)
+        self._closing = False
+
+    # Querying
+
+    def search(self, room_id: str, query: str, user_id: Optional[str] = None) -> Iterator[int]:
+        """Room positions of messages containing every word of `query`, newest first"""
+        room = self.rooms.get(room_id)
+        terms = tokenize(query)
+        if room is None or not terms:
+            return
+        if user_id is not None:
+            terms.add(_USER_TERM + user_id)
+
+        cache: dict = {}
+        for part in room.newest_first():
+            postings = []
+            for term in terms:
+                found = part.terms.get(term)
+                if found is None:
+                    break
+                postings.append(found)
+            else:
+                postings.sort(key=len)
+                driver, others = postings[0], postings[1:]
+                for doc in driver.descending(cache):
+                    if all(other.contains(doc, cache) for other in others):
+                        yield doc
@@ -0,0 +1,123 @@
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+import os
+import secrets
+import time
+
+# How long a dropped connection can be resumed with its session token
+SESSION_RESUME_GRACE = float(os.getenv("SESSION_RESUME_GRACE", "120"))
+# Recent messages kept per room for replay; clients further behind get a resume_gap
+REPLAY_BUFFER_SIZE = int(os.getenv("REPLAY_BUFFER_SIZE", "500"))
+
+
+class ReplayBuffer:
+    """
+    The last few messages of every room, numbered with a per-room sequence.
+
+    Delivery cursors are sequence numbers: a client that has seen up to N in
+    a room is owed everything after N. Only the last `size` messages are
+    kept, and a room that has been quiet for longer than the resume grace
+    window gives its messages up, since nobody can still be owed them.
+    Sequence heads are kept either way so numbering never restarts.
+    """
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE, idle: float = SESSION_RESUME_GRACE) -> None:
+        self.size = size
+        self.idle = idle
+        self._messages: Dict[str, Deque[dict]] = {}
+        self._heads: Dict[str, int] = {}
+        self._touched: Dict[str, float] = {}
+        self._next_sweep = time.monotonic() + idle
+
+    def head(self, room_id: str) -> int:
+        """Sequence number of the latest message in the room (0 if none)"""
+        return self._heads.get(room_id, 0)
+
+    def append(self, room_id: str, payload: dict) -> int:
+        """Number a message payload (stored as its "seq" field) and keep it for replay"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        seq = self._heads.get(room_id, 0) + 1
+        self._heads[room_id] = seq
+        payload["seq"] = seq
+        messages = self._messages.get(room_id)
+        if messages is None:
+            messages = self._messages[room_id] = deque(maxlen=self.size)
+        messages.append(payload)
+        self._touched[room_id] = now
+        return seq
+
+    def since(self, room_id: str, cursor: int) -> Optional[List[dict]]:
+        """Messages after `cursor`, oldest first, or None if some were already evicted"""
+        missed = self._heads.get(room_id, 0) - cursor
+        if missed <= 0:
+            return []
+        messages = self._messages.get(room_id)
+        if messages is None or missed > len(messages):
+            return None
+        # Walk from the tail so the cost follows the gap, not the buffer size
+        replay = list(islice(reversed(messages), missed))
+        replay.reverse()
+        return replay
+
+    def _sweep(self, now: float) -> None:
+        for room_id in [room_id for room_id, touched in self._touched.items() if now - touched > self.idle]:
+            del self._touched[room_id]
+            del self._messages[room_id]
+        self._next_sweep = now + self.idle
+
+
+class Session:
+    """A dropped connection waiting to be resumed: its rooms and how far it got in each"""
+    __slots__ = ("user_id", "cursors", "expires_at")
+
+    def __init__(self, user_id: str, cursors: Dict[str, int], expires_at: float) -> None:
+        self.user_id = user_id
+        self.cursors = cursors
+        self.expires_at = expires_at
+
+
+class SessionStore:
+    """
+    Resumable sessions keyed by opaque, single-use tokens.
+
+    A session is parked when its connection drops and can be claimed once,
+    by the same user, within the grace window. The grace window is the same
+    for every session, so parking order is expiry order and expired sessions
+    are dropped from the front without scanning the rest.
+    """
+
+    def __init__(self, grace: float = SESSION_RESUME_GRACE) -> None:
+        self.grace = grace
+        self._parked: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._parked)
+
+    def issue(self) -> str:
+        return secrets.token_urlsafe(18)
+
+    def park(self, token: str, user_id: str, cursors: Dict[str, int]) -> None:
+        now = time.monotonic()
+        self._expire(now)
+        self._parked[token] = Session(user_id, cursors, now + self.grace)
+
+    def resume(self, token: str, user_id: str) -> Optional[Session]:
+        """Claim a parked session; None if unknown, expired or owned by someone else"""
+        self._expire(time.monotonic())
+        session = self._parked.get(token)
+        if session is None or session.user_id != user_id:
+            return None
+        del self._parked[token]
+        return session
+
+    def _expire(self, now: float) -> None:
+        parked = self._parked
+        while parked:
+            token = next(iter(parked))
+            if parked[token].expires_at > now:
+                break
+            del parked[token]
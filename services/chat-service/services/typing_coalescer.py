@@ -0,0 +1,99 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+
+# How often pending typing changes are flushed, and how long a typist stays listed
+TYPING_WINDOW_SECONDS = float(os.getenv("TYPING_WINDOW_SECONDS", "0.5"))
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "5"))
+
+# Receives (room_id, [{"user_id": ..., "username": ...}, ...], user ids in the
+# room's previous update) once per flush
+PublishCallback = Callable[[str, List[dict], Set[str]], Awaitable[None]]
+
+
+class TypingCoalescer:
+    """
+    Merges typing events into one "who is typing" update per room and window.
+
+    Repeated events from someone already typing only extend their expiry, so
+    outbound typing traffic depends on how many rooms change state, not on
+    how many keystrokes arrive.
+    """
+
+    def __init__(
+        self,
+        publish: PublishCallback,
+        window: float = TYPING_WINDOW_SECONDS,
+        ttl: float = TYPING_TTL_SECONDS
+    ) -> None:
+        self.publish = publish
+        self.window = window
+        self.ttl = ttl
+        # room_id -> user_id -> (username, expires_at)
+        self._typists: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        self._dirty: Set[str] = set()
+        # room_id -> user ids in the last update published for it
+        self._published: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def typing(self, room_id: str, user_id: str, username: str) -> None:
+        room = self._typists.get(room_id)
+        if room is None:
+            room = self._typists[room_id] = {}
+        if user_id not in room:
+            self._dirty.add(room_id)
+        room[user_id] = (username, time.monotonic() + self.ttl)
+        self._ensure_running()
+
+    def stopped(self, room_id: str, user_id: str) -> None:
+        """The user sent their message or left, so they are no longer typing"""
+        room = self._typists.get(room_id)
+        if room is not None and room.pop(user_id, None) is not None:
+            self._dirty.add(room_id)
+            if not room:
+                del self._typists[room_id]
+            self._ensure_running()
+
+    def typists(self, room_id: str) -> List[dict]:
+        return [
+            {"user_id": user_id, "username": username}
+            for user_id, (username, _) in self._typists.get(room_id, {}).items()
+        ]
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Runs only while someone is typing somewhere; idle rooms cost nothing
+        while self._typists or self._dirty:
+            await asyncio.sleep(self.window)
+            await self.flush()
+
+    async def flush(self) -> None:
+        now = time.monotonic()
+        for room_id, room in list(self._typists.items()):
+            expired = [user_id for user_id, (_, expires_at) in room.items() if expires_at <= now]
+            if expired:
+                for user_id in expired:
+                    del room[user_id]
+                self._dirty.add(room_id)
+                if not room:
+                    del self._typists[room_id]
+
+        dirty, self._dirty = self._dirty, set()
+        for room_id in dirty:
+            users = self.typists(room_id)
+            previous = self._published.pop(room_id, set())
+            if users:
+                self._published[room_id] = {user["user_id"] for user in users}
+            await self.publish(room_id, users, previous)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
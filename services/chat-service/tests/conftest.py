@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the service the way uvicorn runs it, from the service directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Add the repository root to the path to import shared
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+import warnings
+
+import msgpack
+import pytest
+from pydantic import ValidationError
+
+from models.message_models import WebSocketMessage
+from shared.websocket import MSGPACK_CODEC
+from shared.websocket.codec import _positional_validator
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_array_frame_matches_map_frame():
+    array = MSGPACK_CODEC.decode(msgpack.packb(["message", "hi", "r", "u", NOW, "bob"], datetime=True), WebSocketMessage)
+    mapped = MSGPACK_CODEC.decode(msgpack.packb(
+        {"type": "message", "content": "hi", "room_id": "r", "user_id": "u", "timestamp": NOW, "username": "bob"},
+        datetime=True
+    ), WebSocketMessage)
+    assert array == mapped
+    assert array.timestamp == NOW
+
+
+def test_array_frame_may_leave_out_trailing_defaults():
+    message = MSGPACK_CODEC.decode(msgpack.packb(["typing", None, "r", "u", NOW], datetime=True), WebSocketMessage)
+    assert message.username is None
+    assert message.model_fields_set == {"type", "content", "room_id", "user_id", "timestamp"}
+
+
+def test_array_frame_is_validated():
+    with pytest.raises(ValidationError):
+        MSGPACK_CODEC.decode(msgpack.packb(["message", "hi", "r", 1, NOW], datetime=True), WebSocketMessage)
+    with pytest.raises(ValidationError):
+        MSGPACK_CODEC.decode(msgpack.packb(["message", "hi", "r"]), WebSocketMessage)
+
+
+def test_positional_validator_uses_no_deprecated_schema():
+    # Fails on a pydantic-core upgrade that deprecates the tuple schema in use
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        validator = _positional_validator(WebSocketMessage, 6)
+    assert validator is not None
+    message = validator.validate_python(["message", "hi", "r", "u", NOW, "bob"])
+    assert message.username == "bob"
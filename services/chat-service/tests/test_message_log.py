@@ -0,0 +1,169 @@
+import asyncio
+import os
+
+import pytest
+
+from services.message_log import INDEX_ENTRY, MessageLog
+from services.search_index import SearchIndex
+from utils.cursors import decode_cursor, encode_cursor
+
+
+def _open(directory) -> MessageLog:
+    return MessageLog(
+        str(directory),
+        segment_bytes=1024,
+        index_interval=4,
+        fsync_mode="never",
+        search_index=SearchIndex(memtable_docs=16)
+    )
+
+
+def _fill(directory, count: int) -> list:
+    log = _open(directory)
+    ids = [log.append("room", f"u{number % 3}", f"m{number}")["id"] for number in range(count)]
+    asyncio.run(log.close())
+    return ids
+
+
+def _room_files(directory, suffix: str) -> list:
+    [room] = [entry.path for entry in os.scandir(directory) if entry.is_dir()]
+    return sorted(os.path.join(room, name) for name in os.listdir(room) if name.endswith(suffix))
+
+
+def _contents(log: MessageLog) -> list:
+    messages, _, _ = log.room_page("room", limit=1000, after="0")
+    return [message["content"] for message in messages]
+
+
+def test_torn_tail_is_truncated_and_appends_continue(tmp_path):
+    ids = _fill(tmp_path, 40)
+    active = _room_files(tmp_path, ".log")[-1]
+    size = os.path.getsize(active)
+    # A crash in the middle of the last record's payload
+    os.truncate(active, size - 5)
+
+    log = _open(tmp_path)
+    assert log.rooms["room"].count == 39
+    assert _contents(log) == [f"m{number}" for number in range(39)]
+    assert log.get(ids[39]) is None
+    assert log.get(ids[38])["content"] == "m38"
+    assert os.path.getsize(active) < size - 5
+
+    log.append("room", "u0", "after crash")
+    assert _contents(log)[-2:] == ["m38", "after crash"]
+    asyncio.run(log.close())
+    assert _contents(_open(tmp_path))[-1] == "after crash"
+
+
+def test_garbage_after_the_last_record_is_dropped(tmp_path):
+    _fill(tmp_path, 10)
+    active = _room_files(tmp_path, ".log")[-1]
+    with open(active, "ab") as target:
+        target.write(b"\x10\x00\x00\x00 not a record")
+
+    log = _open(tmp_path)
+    assert _contents(log) == [f"m{number}" for number in range(10)]
+
+
+def test_missing_or_short_sparse_index_of_a_sealed_segment_is_rebuilt(tmp_path):
+    ids = _fill(tmp_path, 60)
+    indexes = _room_files(tmp_path, ".idx")
+    assert len(indexes) >= 3
+    first, second = indexes[0], indexes[1]
+    expected = open(first, "rb").read()
+    os.remove(first)
+    os.truncate(second, os.path.getsize(second) // 2 + 3)
+
+    log = _open(tmp_path)
+    room = log.rooms["room"]
+    assert all(len(segment.positions) == -(-segment.count // 4) for segment in room.segments)
+    assert open(first, "rb").read() == expected
+    assert _contents(log) == [f"m{number}" for number in range(60)]
+    # Paging from a cursor in each segment goes through locate and locate_id
+    for position in (1, room.segments[1].base + 2, 59):
+        messages, _, _ = log.room_page("room", limit=2, after=ids[position - 1])
+        assert messages[0]["id"] == ids[position]
+
+
+def test_wrong_offset_in_active_index_does_not_truncate_valid_records(tmp_path):
+    _fill(tmp_path, 20)
+    index = _room_files(tmp_path, ".idx")[-1]
+    with open(index, "rb") as source:
+        data = bytearray(source.read())
+    # Shift the last entry's offset so it points into the middle of a record
+    last = len(data) - INDEX_ENTRY.size
+    position, offset, message_id = INDEX_ENTRY.unpack_from(data, last)
+    INDEX_ENTRY.pack_into(data, last, position, offset + 3, message_id)
+    with open(index, "wb") as target:
+        target.write(data)
+    active = _room_files(tmp_path, ".log")[-1]
+    size = os.path.getsize(active)
+
+    log = _open(tmp_path)
+    assert _contents(log) == [f"m{number}" for number in range(20)]
+    assert os.path.getsize(active) == size
+    segment = log.rooms["room"].active
+    assert segment.offsets[-1] == offset
+
+
+def test_pages_walk_the_history_both_ways_across_segments(tmp_path):
+    ids = _fill(tmp_path, 40)
+    log = _open(tmp_path)
+    assert len(log.rooms["room"].segments) > 2
+    log.delete(ids[20])
+    expected = [f"m{number}" for number in range(40) if number != 20]
+
+    pages = []
+    messages, older, newer = log.room_page("room", limit=7)
+    assert not newer
+    while True:
+        pages[:0] = [message["content"] for message in messages]
+        if not older:
+            break
+        messages, older, newer = log.room_page("room", limit=7, before=messages[0]["id"])
+        assert newer
+    assert pages == expected
+
+    forward = []
+    messages, older, newer = log.room_page("room", limit=7, after="0")
+    assert not older
+    while True:
+        forward += [message["content"] for message in messages]
+        if not newer:
+            break
+        messages, older, newer = log.room_page("room", limit=7, after=messages[-1]["id"])
+        assert older
+    assert forward == expected
+    asyncio.run(log.close())
+
+
+def test_cursors_round_trip_and_reject_anything_else(tmp_path):
+    [message_id] = _fill(tmp_path, 1)
+    cursor = encode_cursor(message_id)
+    assert decode_cursor(cursor) == message_id
+    for bad in ("", "not a cursor", cursor[:-2], cursor + "AA"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_id_and_user_indexes_survive_deletes_and_reloads(tmp_path):
+    log = _open(tmp_path)
+    sent = [log.append(f"room{number % 2}", f"u{number % 3}", f"m{number}") for number in range(30)]
+    assert log.delete(sent[3]["id"])
+    assert not log.delete(sent[3]["id"])
+    asyncio.run(log.close())
+
+    for log in (log, _open(tmp_path)):
+        assert log.get(sent[4]["id"])["content"] == "m4"
+        assert log.get(sent[3]["id"]) is None
+        assert log.get("0" * 20) is None
+        # u0 wrote m0, m3, ..., m27 across both rooms; m3 is gone
+        assert log.user_count("u0") == 9
+        messages, older, newer = log.user_page("u0", limit=4)
+        assert [message["content"] for message in messages] == ["m18", "m21", "m24", "m27"]
+        assert older and not newer
+        messages, older, newer = log.user_page("u0", limit=4, before=messages[0]["id"])
+        assert [message["content"] for message in messages] == ["m6", "m9", "m12", "m15"]
+        messages, older, newer = log.user_page("u0", limit=4, after=sent[0]["id"])
+        assert [message["content"] for message in messages] == ["m6", "m9", "m12", "m15"]
+        assert log.user_page("nobody") == ([], False, False)
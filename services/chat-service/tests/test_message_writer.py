@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+from services.message_writer import MessageWriter
+
+
+def _writer(spill_dir) -> MessageWriter:
+    return MessageWriter("postgresql://unused", batch_size=3, spill_dir=str(spill_dir))
+
+
+def _message(number: int) -> dict:
+    return {
+        "id": f"{number:020d}",
+        "room_id": "room",
+        "user_id": "user",
+        "content": f"m{number}",
+        "message_type": "text",
+        "username": None,
+        "timestamp": "2024-01-01T00:00:00+00:00"
+    }
+
+
+def _flushed(writer: MessageWriter, count: int) -> None:
+    # What flush() does once PostgreSQL has taken a batch
+    for _ in range(count):
+        writer._queue.popleft()
+    writer._release(count)
+
+
+def _spill_files(spill_dir) -> list:
+    return sorted(name for name in os.listdir(spill_dir) if name.endswith(".jsonl"))
+
+
+def test_spill_files_rotate_every_batch(tmp_path):
+    writer = _writer(tmp_path)
+    for number in range(7):
+        writer.submit(_message(number))
+
+    assert _spill_files(tmp_path) == [f"{index:020d}.jsonl" for index in range(3)]
+    assert [spill.pending for spill in writer._spills] == [3, 3, 1]
+    asyncio.run(writer.close())
+
+
+def test_release_deletes_only_fully_flushed_files(tmp_path):
+    writer = _writer(tmp_path)
+    for number in range(7):
+        writer.submit(_message(number))
+
+    _flushed(writer, 4)
+
+    assert _spill_files(tmp_path) == [f"{index:020d}.jsonl" for index in (1, 2)]
+    assert [spill.pending for spill in writer._spills] == [2, 1]
+    asyncio.run(writer.close())
+
+
+def test_release_of_everything_keeps_the_current_file_empty(tmp_path):
+    writer = _writer(tmp_path)
+    for number in range(5):
+        writer.submit(_message(number))
+
+    _flushed(writer, 5)
+
+    assert _spill_files(tmp_path) == [f"{1:020d}.jsonl"]
+    assert os.path.getsize(tmp_path / f"{1:020d}.jsonl") == 0
+    writer.submit(_message(5))
+    assert [spill.pending for spill in writer._spills] == [1]
+    asyncio.run(writer.close())
+
+
+def test_recover_requeues_unflushed_messages_in_order(tmp_path):
+    writer = _writer(tmp_path)
+    for number in range(7):
+        writer.submit(_message(number))
+    _flushed(writer, 4)
+    asyncio.run(writer.close())
+
+    recovered = _writer(tmp_path)
+
+    # Message 3 shares a file with unflushed ones and is written again; inserts ignore known ids
+    assert [message["content"] for message in recovered._queue] == ["m3", "m4", "m5", "m6"]
+    assert [spill.pending for spill in recovered._spills] == [3, 1]
+    # New spill files sort after the recovered ones
+    recovered.submit(_message(7))
+    assert _spill_files(tmp_path)[-1] == f"{3:020d}.jsonl"
+    asyncio.run(recovered.close())
+
+
+def test_recover_ignores_a_torn_last_line(tmp_path):
+    writer = _writer(tmp_path)
+    for number in range(2):
+        writer.submit(_message(number))
+    asyncio.run(writer.close())
+    with open(tmp_path / f"{0:020d}.jsonl", "ab") as spill:
+        spill.write(b'{"id": "torn')
+
+    recovered = _writer(tmp_path)
+
+    assert [message["content"] for message in recovered._queue] == ["m0", "m1"]
+    asyncio.run(recovered.close())
@@ -0,0 +1,89 @@
+import pytest
+
+from shared.websocket import RateLimit, RateLimiter
+from shared.websocket import rate_limit
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def _limiter(**specs) -> RateLimiter:
+    # e.g. user_message="1/2" -> {("user", "message"): RateLimit(1, 2)}
+    return RateLimiter({tuple(key.split("_")): RateLimit.parse(spec) for key, spec in specs.items()})
+
+
+def test_parse():
+    limit = RateLimit.parse("10/20")
+    assert (limit.rate, limit.burst) == (10.0, 20.0)
+    assert RateLimit.parse("5").burst == 5.0
+    assert RateLimit.parse("") is None
+    assert RateLimit.parse("0") is None
+    assert RateLimit.parse("0/5") is None
+    with pytest.raises(ValueError):
+        RateLimit.parse("-1/5")
+    with pytest.raises(ValueError):
+        RateLimit.parse("5/0")
+
+
+def test_user_budget_is_shared_across_connections(clock):
+    limiter = _limiter(connection_message="10/10", user_message="1/2")
+    first, second = limiter.connection(), limiter.connection()
+    assert limiter.check("message", first, "alice", "r1") == 0.0
+    assert limiter.check("message", second, "alice", "r2") == 0.0
+    assert limiter.check("message", first, "alice", "r1") == pytest.approx(1.0)
+    # Another user has a budget of their own
+    assert limiter.check("message", second, "bob", "r1") == 0.0
+
+    clock.now += 1.0
+    assert limiter.check("message", first, "alice", "r1") == 0.0
+
+
+def test_rejection_by_one_scope_takes_no_tokens_from_the_others(clock):
+    limiter = _limiter(connection_message="1/3", user_message="1/3", room_message="1/1")
+    connection = limiter.connection()
+    assert limiter.check("message", connection, "alice", "busy") == 0.0
+    for _ in range(5):
+        assert limiter.check("message", connection, "alice", "busy") > 0.0
+    # Only the one allowed frame was charged, so two more fit elsewhere
+    assert limiter.check("message", connection, "alice", "quiet") == 0.0
+    assert limiter.check("message", connection, "alice", "other") == 0.0
+    assert limiter.check("message", connection, "alice", "third") > 0.0
+
+
+def test_retry_after_is_the_longest_wait_and_kinds_are_separate(clock):
+    limiter = _limiter(user_message="2/1", room_message="0.5/1", user_typing="1/1")
+    connection = limiter.connection()
+    assert limiter.check("message", connection, "alice", "r") == 0.0
+    assert limiter.check("message", connection, "alice", "r") == pytest.approx(2.0)
+    assert limiter.check("typing", connection, "alice", "r") == 0.0
+    # Kinds without a limit are never rejected
+    assert limiter.check("join", connection, "alice", "r") == 0.0
+
+
+def test_sweep_drops_idle_buckets_and_those_without_a_limit(clock):
+    limiter = _limiter(user_message="1/2", room_message="1/2")
+    connection = limiter.connection()
+    limiter.check("message", connection, "alice", "r")
+    limiter.check("message", connection, "bob", "r")
+    del limiter.limits[("room", "message")]
+
+    clock.now += 0.5
+    limiter._sweep(clock.now)
+    assert set(limiter._users) == {("message", "alice"), ("message", "bob")}
+    assert limiter._rooms == {}
+
+    clock.now += 1.0
+    limiter._sweep(clock.now)
+    assert limiter._users == {}
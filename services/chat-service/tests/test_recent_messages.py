@@ -0,0 +1,65 @@
+import asyncio
+
+from services.message_log import MessageLog
+from services.recent_messages import RecentMessages
+from services.search_index import SearchIndex
+
+
+def _contents(messages) -> list:
+    return [message["content"] for message in messages]
+
+
+def test_ring_buffer_keeps_the_latest_per_room():
+    recent = RecentMessages(per_room=3, max_messages=100)
+    # Rooms nobody has read are not cached on write
+    recent.append("a", {"content": "m0"})
+    assert recent.get("a") is None
+
+    recent.fill("a", [{"content": "m0"}, {"content": "m1"}])
+    for number in range(2, 5):
+        recent.append("a", {"content": f"m{number}"})
+    assert _contents(recent.get("a")) == ["m2", "m3", "m4"]
+    assert recent.size == 3
+    assert (recent.hits, recent.misses) == (1, 1)
+
+    recent.invalidate("a")
+    assert recent.get("a") is None
+    assert recent.size == 0
+
+
+def test_coldest_rooms_go_first_over_the_global_bound():
+    recent = RecentMessages(per_room=2, max_messages=4)
+    for room_id in ("a", "b"):
+        recent.fill(room_id, [{"content": room_id}] * 2)
+    recent.get("a")
+    recent.fill("c", [{"content": "c"}])
+    assert recent.get("b") is None
+    assert len(recent) == 2
+    assert recent.size == 3
+
+
+def test_latest_page_is_served_from_memory_and_kept_current(tmp_path):
+    log = MessageLog(
+        str(tmp_path),
+        fsync_mode="never",
+        recent=RecentMessages(per_room=5, max_messages=100),
+        search_index=SearchIndex(memtable_docs=16)
+    )
+    sent = [log.append("room", "u0", f"m{number}") for number in range(8)]
+
+    messages, older, newer = log.room_page("room", limit=3)
+    assert _contents(messages) == ["m5", "m6", "m7"]
+    assert older and not newer
+    assert log.recent.misses == 1
+
+    log.append("room", "u0", "m8")
+    messages, _, _ = log.room_page("room", limit=5)
+    assert _contents(messages) == ["m4", "m5", "m6", "m7", "m8"]
+    assert log.recent.hits == 1
+
+    # A delete drops the cached room; the next read reloads it from the log
+    log.delete(sent[7]["id"])
+    messages, _, _ = log.room_page("room", limit=3)
+    assert _contents(messages) == ["m5", "m6", "m8"]
+    assert log.recent.misses == 2
+    asyncio.run(log.close())
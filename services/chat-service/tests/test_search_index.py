@@ -0,0 +1,90 @@
+import asyncio
+import os
+
+from services.search_index import IndexSegment, PostingList, SearchIndex, _get_varint, _put_varint
+
+
+def _message(content: str, user_id: str = "alice") -> dict:
+    return {"content": content, "user_id": user_id}
+
+
+def test_varint_round_trip():
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 32, 2 ** 63 - 1]
+    buffer = bytearray()
+    for value in values:
+        _put_varint(buffer, value)
+    decoded, position = [], 0
+    while position < len(buffer):
+        value, position = _get_varint(buffer, position)
+        decoded.append(value)
+    assert decoded == values
+    assert len(buffer) == 1 + 1 + 1 + 2 + 2 + 2 + 3 + 5 + 9
+
+
+def test_posting_list_blocks_decode_and_probe():
+    docs = list(range(3, 3 + 3 * 300, 3))
+    postings = PostingList.encode(docs)
+    assert postings.docs() == docs
+    assert list(postings.descending({})) == docs[::-1]
+    assert postings.contains(docs[200], {})
+    assert not postings.contains(docs[200] + 1, {})
+    assert not postings.contains(docs[-1] + 3, {})
+
+
+def test_search_spans_memtable_segments_and_merges(tmp_path):
+    index = SearchIndex(memtable_docs=4, merge_factor=2)
+    for position in range(19):
+        word = "apple" if position % 3 == 0 else "pear"
+        author = "bob" if position % 2 else "alice"
+        index.add("room", str(tmp_path), position, _message(f"{word} pie", author), background=False)
+
+    room = index.rooms["room"]
+    # 16 documents written out, merged down to one segment; 3 still in memory
+    assert [(segment.base, segment.end) for segment in room.segments] == [(0, 16)]
+    assert room.memtable.docs == 3
+    assert list(index.search("room", "Apple PIE")) == [18, 15, 12, 9, 6, 3, 0]
+    assert list(index.search("room", "apple", user_id="bob")) == [15, 9, 3]
+    assert list(index.search("room", "apple banana")) == []
+    assert list(index.search("room", "")) == []
+    assert list(index.search("other", "apple")) == []
+
+    # The segment on disk reads back the same
+    [path] = [os.path.join(room.directory, name) for name in os.listdir(room.directory)]
+    assert IndexSegment.read(path).terms["apple"].docs() == [0, 3, 6, 9, 12, 15]
+
+
+def test_freezing_on_the_event_loop_is_written_in_the_background(tmp_path):
+    async def scenario():
+        index = SearchIndex(memtable_docs=2, merge_factor=8)
+        index.start()
+        for position in range(4):
+            index.add("room", str(tmp_path), position, _message("hello"))
+        room = index.rooms["room"]
+        # Nothing was built inline; frozen tables stay searchable meanwhile
+        assert room.segments == [] and len(room.frozen) == 2
+        assert list(index.search("room", "hello")) == [3, 2, 1, 0]
+        await index.close()
+        assert [(segment.base, segment.end) for segment in room.segments] == [(0, 2), (2, 4)]
+        assert room.frozen == []
+
+    asyncio.run(scenario())
+
+
+def test_load_room_keeps_segments_and_indexes_the_rest(tmp_path):
+    messages = [_message(f"word{position % 5}") for position in range(10)]
+    index = SearchIndex(memtable_docs=4, merge_factor=8)
+    for position in range(8):
+        index.add("room", str(tmp_path), position, messages[position], background=False)
+
+    reloaded = SearchIndex(memtable_docs=4, merge_factor=8)
+    reloaded.load_room("room", str(tmp_path), 10, lambda start: ((p, messages[p]) for p in range(start, 10)))
+    room = reloaded.rooms["room"]
+    assert [(segment.base, segment.end) for segment in room.segments] == [(0, 4), (4, 8)]
+    assert room.memtable.base == 8 and room.memtable.docs == 2
+    assert list(reloaded.search("room", "word3")) == [8, 3]
+
+    # A log that lost its tail drops the segments past its end
+    shorter = SearchIndex(memtable_docs=4, merge_factor=8)
+    shorter.load_room("room", str(tmp_path), 6, lambda start: ((p, messages[p]) for p in range(start, 6)))
+    assert [(segment.base, segment.end) for segment in shorter.rooms["room"].segments] == [(0, 4)]
+    assert list(shorter.search("room", "word0")) == [5, 0]
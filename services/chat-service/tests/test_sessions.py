@@ -0,0 +1,75 @@
+import pytest
+
+from services import sessions
+from services.sessions import ReplayBuffer, SessionStore
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", clock)
+    return clock
+
+
+def test_replay_since_returns_what_was_missed(clock):
+    replay = ReplayBuffer(size=5, idle=60)
+    for number in range(3):
+        assert replay.append("room", {"n": number}) == number + 1
+    assert replay.head("room") == 3
+    assert [message["n"] for message in replay.since("room", 1)] == [1, 2]
+    assert [message["seq"] for message in replay.since("room", 0)] == [1, 2, 3]
+    assert replay.since("room", 3) == []
+    assert replay.since("quiet", 0) == []
+
+
+def test_replay_gap_once_messages_were_evicted(clock):
+    replay = ReplayBuffer(size=3, idle=60)
+    for number in range(5):
+        replay.append("room", {"n": number})
+    # Seqs 3..5 are kept: a client at 2 gets them all, one at 1 has a gap
+    assert [message["seq"] for message in replay.since("room", 2)] == [3, 4, 5]
+    assert replay.since("room", 1) is None
+
+
+def test_idle_room_gives_up_its_messages_but_keeps_numbering(clock):
+    replay = ReplayBuffer(size=5, idle=60)
+    replay.append("idle", {})
+    replay.append("idle", {})
+    clock.now += 61
+    replay.append("busy", {})
+    assert replay.since("idle", 0) is None
+    assert replay.since("idle", 2) == []
+    assert replay.append("idle", {}) == 3
+
+
+def test_session_is_resumed_once_by_its_own_user(clock):
+    store = SessionStore(grace=30)
+    token = store.issue()
+    store.park(token, "alice", {"room": 4})
+    assert store.resume(token, "mallory") is None
+    session = store.resume(token, "alice")
+    assert session.user_id == "alice" and session.cursors == {"room": 4}
+    assert store.resume(token, "alice") is None
+    assert store.resume("unknown", "alice") is None
+
+
+def test_sessions_expire_after_the_grace_window(clock):
+    store = SessionStore(grace=30)
+    store.park("old", "alice", {"room": 1})
+    clock.now += 20
+    store.park("new", "bob", {"room": 2})
+    clock.now += 11
+    assert store.resume("old", "alice") is None
+    assert len(store) == 1
+    assert store.resume("new", "bob").cursors == {"room": 2}
+    clock.now += 30
+    store.park("later", "carol", {})
+    assert len(store) == 1
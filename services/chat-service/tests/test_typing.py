@@ -0,0 +1,54 @@
+import asyncio
+
+from routes import websocket as ws_routes
+from services.typing_coalescer import TypingCoalescer
+
+
+class RecordingManager:
+    """Delivers frames to an inbox per member, the way broadcast_frame does"""
+
+    def __init__(self, members) -> None:
+        self.room_connections = {"r": set(members)}
+        self.inbox = {user_id: [] for user_id in members}
+
+    async def broadcast_frame(self, frame, room_id, exclude_user=None, exclude=()):
+        for user_id in self.room_connections[room_id]:
+            if user_id != exclude_user and user_id not in exclude:
+                await self.send_frame(frame, user_id)
+
+    async def send_frame(self, frame, user_id):
+        self.inbox[user_id].append([user["user_id"] for user in frame.payload["users"]])
+
+    def take(self):
+        inbox = {user_id: frames for user_id, frames in self.inbox.items() if frames}
+        self.inbox = {user_id: [] for user_id in self.inbox}
+        return inbox
+
+
+def test_typists_never_see_themselves(monkeypatch):
+    manager = RecordingManager(["alice", "bob", "carol"])
+    monkeypatch.setattr(ws_routes, "manager", manager)
+
+    async def scenario():
+        coalescer = TypingCoalescer(ws_routes.publish_typing, window=60)
+
+        coalescer.typing("r", "alice", "alice")
+        await coalescer.flush()
+        # The only typist is not told about their own typing
+        assert manager.take() == {"bob": [["alice"]], "carol": [["alice"]]}
+
+        coalescer.typing("r", "bob", "bob")
+        await coalescer.flush()
+        assert manager.take() == {"alice": [["bob"]], "bob": [["alice"]], "carol": [["alice", "bob"]]}
+
+        coalescer.stopped("r", "bob")
+        await coalescer.flush()
+        # Alice still types but has to learn that bob stopped; bob already sees just alice
+        assert manager.take() == {"alice": [[]], "carol": [["alice"]]}
+
+        coalescer.stopped("r", "alice")
+        await coalescer.flush()
+        assert manager.take() == {"bob": [[]], "carol": [[]]}
+        await coalescer.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,21 @@
+import base64
+import binascii
+
+# Message ids are 20 hex characters; cursors carry their 10 raw bytes
+ID_BYTES = 10
+
+
+def encode_cursor(message_id: str) -> str:
+    """Opaque pagination cursor pointing at a message id"""
+    return base64.urlsafe_b64encode(bytes.fromhex(message_id)).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Message id behind a cursor; raises ValueError for anything we did not issue"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if len(raw) != ID_BYTES:
+        raise ValueError("Invalid cursor")
+    return raw.hex()
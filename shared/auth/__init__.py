@@ -0,0 +1,3 @@
+from .tokens import MIN_JWT_KEY_LENGTH, validate_jwt_key, verify_token
+
+__all__ = ['MIN_JWT_KEY_LENGTH', 'validate_jwt_key', 'verify_token']
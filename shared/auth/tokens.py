@@ -0,0 +1,38 @@
+from jose import JWTError, jwt
+
+# HS256 keys shorter than this are brute-forceable; an empty key verifies anything signed with ''
+MIN_JWT_KEY_LENGTH = 32
+
+
+def validate_jwt_key(key: str | None) -> str:
+    """
+    Checks that a JWT signing key is usable.
+
+    Raises:
+        ValueError: If the key is missing or shorter than MIN_JWT_KEY_LENGTH
+    """
+    if not key or len(key) < MIN_JWT_KEY_LENGTH:
+        raise ValueError(f'JWT_KEY must be at least {MIN_JWT_KEY_LENGTH} characters')
+    return key
+
+
+def verify_token(token: str, key: str, algorithm: str) -> dict | None:
+    """
+    Verifies and decodes a JWT token.
+
+    Shared by auth-service, which issues the tokens, and the gateway, which
+    accepts them on the WebSocket handshake without a round trip.
+
+    Returns:
+        dict: The decoded token payload if valid, None otherwise
+    """
+    try:
+        decoded = jwt.decode(token, key, algorithms=[algorithm])
+
+        if "sub" not in decoded:
+            return None
+
+        return decoded
+
+    except JWTError:
+        return None
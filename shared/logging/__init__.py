@@ -1,3 +1,4 @@
 from .logger import SocketHubLogger
+from .sampling import LogSampler, SampledLogSite
 
-__all__ = ['SocketHubLogger']
+__all__ = ['SocketHubLogger', 'LogSampler', 'SampledLogSite']
@@ -1,10 +1,56 @@
+import atexit
 import logging
 import logging.handlers
+import queue
 import yaml
 import os
 
+from .sampling import LogSampler
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que nunca bloquea: si la cola está llena descarta el
+    registro y lo cuenta, para que loguear no agregue latencia al event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Un registro que se va a descartar no se prepara
+        if self.queue.full():
+            self.dropped += 1
+            return
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # msg % args se resuelve aquí, mientras los argumentos todavía tienen el valor
+        # del momento del log; el formatter (fecha, nivel, traceback) corre en el listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
 class SocketHubLogger:
+    # Un listener (hilo de escritura) por servicio, compartido por todas las instancias
+    _listeners = {}
+    _queue_handlers = {}
+    # Un LogSampler por servicio, para que los contadores por punto de log sean únicos
+    _samplers = {}
+    # Configuración de cada servicio ya inicializado; las demás instancias la reutilizan
+    _configs = {}
+
     def __init__(self, service_name: str, config_path: str = None) -> None:
         """
         Constructor del logger.
@@ -26,6 +72,23 @@ class SocketHubLogger:
         return self.logger
 
 
+    def get_sampler(self) -> LogSampler:
+        """
+        Retorna el LogSampler del servicio, para logs del hot path
+        (join, leave, broadcast, ...) con límite por punto de log y resúmenes.
+        """
+        sampler = SocketHubLogger._samplers.get(self.service_name)
+        if sampler is None:
+            sampling_config = self.config['logging'].get('sampling', {})
+            sampler = SocketHubLogger._samplers[self.service_name] = LogSampler(
+                self.logger,
+                interval=sampling_config.get('interval', 10),
+                burst=sampling_config.get('burst', 5),
+                sample_rate=sampling_config.get('sample_rate', 0)
+            )
+        return sampler
+
+
     def _load_config(self, config_path: str) -> dict:
         """
         Carga la configuración desde el archivo YAML.
@@ -49,6 +112,15 @@ class SocketHubLogger:
                             'level': 'INFO'
                         }
                     },
+                    'queue': {
+                        'enabled': True,
+                        'max_size': 10000
+                    },
+                    'sampling': {
+                        'interval': 10,
+                        'burst': 5,
+                        'sample_rate': 0
+                    },
                     'format': {
                         'console': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                         'file': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -113,12 +185,20 @@ class SocketHubLogger:
     def _setup_logger(self) -> None:
         """
         Configura el logger completo: carga config, crea handlers y formatters.
+        Solo la primera instancia de cada servicio lo hace; las siguientes
+        comparten el logger y su listener.
         """
+        self.logger = logging.getLogger(self.service_name)
+        config = SocketHubLogger._configs.get(self.service_name)
+        if config is not None:
+            self.config = config
+            return
+
         # Cargar configuración
         config = self._load_config(self.config_path)
+        self.config = config
         
-        # Crear el logger
-        self.logger = logging.getLogger(self.service_name)
+        # Configurar el logger
         self.logger.setLevel(getattr(logging, config['logging']['level']))
         
         # Limpiar handlers existentes (evitar duplicados)
@@ -138,6 +218,60 @@ class SocketHubLogger:
             else:
                 # Es un file handler
                 handler.setFormatter(formatters['file'])
-            
-            # Agregar handler al logger
-            self.logger.addHandler(handler)
+
+        # Detener el listener anterior de este servicio (si lo hay)
+        self._stop_listener(self.service_name)
+
+        queue_config = config['logging'].get('queue', {})
+        if queue_config.get('enabled', False):
+            self._setup_queue(handlers, queue_config.get('max_size', 10000))
+        else:
+            for handler in handlers:
+                # Agregar handler al logger
+                self.logger.addHandler(handler)
+        SocketHubLogger._configs[self.service_name] = config
+
+    def _setup_queue(self, handlers: list, max_size: int) -> None:
+        """
+        Modo cola: el logger solo encola registros (sin bloquear) y un hilo
+        en segundo plano formatea, escribe y rota los archivos.
+        """
+        log_queue = queue.Queue(maxsize=max_size)
+        queue_handler = DroppingQueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+
+        self.logger.addHandler(queue_handler)
+        SocketHubLogger._listeners[self.service_name] = listener
+        SocketHubLogger._queue_handlers[self.service_name] = queue_handler
+
+    def get_dropped_count(self) -> int:
+        """
+        Cantidad de registros descartados porque la cola estaba llena.
+        """
+        queue_handler = SocketHubLogger._queue_handlers.get(self.service_name)
+        return queue_handler.dropped if queue_handler else 0
+
+    @classmethod
+    def _stop_listener(cls, service_name: str) -> None:
+        listener = cls._listeners.pop(service_name, None)
+        cls._queue_handlers.pop(service_name, None)
+        if listener is not None:
+            # stop() vacía la cola antes de terminar el hilo
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Detiene todos los listeners, escribiendo los registros pendientes.
+        """
+        for sampler in cls._samplers.values():
+            sampler.close()
+        for service_name in list(cls._listeners):
+            cls._stop_listener(service_name)
+        cls._configs.clear()
+
+
+atexit.register(SocketHubLogger.shutdown)
@@ -0,0 +1,181 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class SampledLogSite:
+    """
+    Un punto de log del hot path (ej: "broadcast") con su propio límite.
+
+    En cada ventana se escriben los primeros `burst` eventos y, si
+    `sample_rate` es N > 0, uno de cada N de los siguientes. El resto solo
+    se cuenta y al cerrar la ventana se escribe un resumen, por ejemplo:
+    "broadcast x 48,211 in last 10s, p99 fanout 3.0ms".
+
+    El mensaje se pasa con argumentos estilo % y nunca se formatea si el
+    evento se descarta. Las ventanas las cierra también el hilo del
+    LogSampler, así que el resumen sale aunque no lleguen más eventos.
+    """
+    __slots__ = (
+        "logger", "name", "level", "timing", "interval", "burst", "sample_rate",
+        "reservoir_size", "_window_start", "_window_end", "_count", "_logged",
+        "_durations", "_seen_durations", "_lock"
+    )
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        name: str,
+        level: int = logging.INFO,
+        timing: Optional[str] = None,
+        interval: float = 10.0,
+        burst: int = 5,
+        sample_rate: int = 0,
+        reservoir_size: int = 1024
+    ) -> None:
+        self.logger = logger
+        self.name = name
+        self.level = level
+        # Nombre de la duración en el resumen (ej: "fanout"); None si no se mide
+        self.timing = timing
+        self.interval = interval
+        self.burst = burst
+        self.sample_rate = sample_rate
+        self.reservoir_size = reservoir_size
+        now = time.monotonic()
+        self._window_start = now
+        self._window_end = now + interval
+        self._count = 0
+        self._logged = 0
+        self._durations: List[float] = []
+        self._seen_durations = 0
+        # Los contadores se tocan desde el event loop y desde el hilo del sampler
+        self._lock = threading.Lock()
+
+    def log(self, msg: str, *args, elapsed: Optional[float] = None) -> None:
+        """Registra un evento; elapsed (segundos) alimenta el percentil del resumen"""
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._window_end:
+                self._roll(now)
+
+            self._count += 1
+            if elapsed is not None:
+                self._record(elapsed)
+
+            write = self._logged < self.burst or (self.sample_rate and self._count % self.sample_rate == 0)
+            if write:
+                self._logged += 1
+        if write:
+            self.logger.log(self.level, msg, *args)
+
+    def _record(self, elapsed: float) -> None:
+        # Reservoir sampling: memoria acotada sin importar cuántos eventos haya
+        self._seen_durations += 1
+        if len(self._durations) < self.reservoir_size:
+            self._durations.append(elapsed)
+        else:
+            slot = random.randrange(self._seen_durations)
+            if slot < self.reservoir_size:
+                self._durations[slot] = elapsed
+
+    def roll_if_due(self, now: float) -> None:
+        """Cierra la ventana si ya terminó, escribiendo su resumen"""
+        with self._lock:
+            if now >= self._window_end:
+                self._roll(now)
+
+    def _roll(self, now: float) -> None:
+        self._flush(now)
+        self._window_start = now
+        self._window_end = now + self.interval
+
+    def flush(self, now: Optional[float] = None) -> None:
+        """Escribe el resumen de la ventana actual si hubo eventos suprimidos"""
+        with self._lock:
+            self._flush(time.monotonic() if now is None else now)
+
+    def _flush(self, now: float) -> None:
+        if self._count > self._logged:
+            summary = "%s x %s in last %ds"
+            args = [self.name, f"{self._count:,}", round(now - self._window_start)]
+            if self.timing and self._durations:
+                durations = sorted(self._durations)
+                p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+                summary += ", p99 %s %.1fms"
+                args += [self.timing, p99 * 1000]
+            self.logger.log(self.level, summary, *args)
+
+        self._count = 0
+        self._logged = 0
+        self._durations = []
+        self._seen_durations = 0
+
+
+class LogSampler:
+    """
+    Crea y agrupa los SampledLogSite de un servicio con la misma configuración.
+
+    Un hilo en segundo plano revisa los puntos de log cada `tick` segundos y
+    cierra las ventanas vencidas, para que el resumen de una ráfaga se
+    escriba al terminar su ventana y no con el próximo evento.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        interval: float = 10.0,
+        burst: int = 5,
+        sample_rate: int = 0,
+        tick: Optional[float] = None
+    ) -> None:
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.sample_rate = sample_rate
+        self.tick = min(1.0, interval) if tick is None else tick
+        self.sites: Dict[str, SampledLogSite] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def site(self, name: str, level: int = logging.INFO, timing: Optional[str] = None) -> SampledLogSite:
+        """Retorna el punto de log `name`, creándolo la primera vez"""
+        site = self.sites.get(name)
+        if site is None:
+            site = self.sites[name] = SampledLogSite(
+                self.logger,
+                name,
+                level=level,
+                timing=timing,
+                interval=self.interval,
+                burst=self.burst,
+                sample_rate=self.sample_rate
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"log-sampler-{self.logger.name}", daemon=True)
+                self._thread.start()
+        return site
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.tick):
+            now = time.monotonic()
+            for site in list(self.sites.values()):
+                site.roll_if_due(now)
+
+    def flush(self) -> None:
+        """Escribe los resúmenes pendientes (ej: al apagar el servicio)"""
+        for site in list(self.sites.values()):
+            site.flush()
+
+    def close(self) -> None:
+        """Detiene el hilo y escribe los resúmenes pendientes"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,25 @@
+from .registry import (
+    CONTENT_TYPE,
+    LATENCY_BUCKETS,
+    REGISTRY,
+    REQUEST_BUCKETS,
+    Collector,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    resident_memory_bytes
+)
+
+__all__ = [
+    'CONTENT_TYPE',
+    'LATENCY_BUCKETS',
+    'REGISTRY',
+    'REQUEST_BUCKETS',
+    'Collector',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'Registry',
+    'resident_memory_bytes'
+]
@@ -0,0 +1,164 @@
+import os
+import resource
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, List, Optional, Sequence, Union
+
+# Prometheus text exposition format; Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; tuned for in-process work (fan-out, parsing) rather than network calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Seconds; for upstream HTTP round trips
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """
+    Monotonic counter.
+
+    Metrics are only touched from the event loop thread, so `inc` is a plain
+    attribute add: no lock and no per-call objects beyond the int itself.
+    """
+    __slots__ = ("name", "help", "value")
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """
+    Value that goes up and down. With `function` set, it is read at scrape
+    time instead, which keeps things like connection counts off the hot path.
+    """
+    __slots__ = ("name", "help", "value", "function")
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def samples(self) -> List[str]:
+        value = self.function() if self.function is not None else self.value
+        return [f"{self.name} {value}"]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Bucket counts live in one preallocated list and
+    are only made cumulative when rendered.
+    """
+    __slots__ = ("name", "help", "bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+        # One slot per bound plus +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_many(self, values: Iterable[float]) -> "Histogram":
+        for value in values:
+            self.observe(value)
+        return self
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+Metric = Union[Counter, Gauge, Histogram]
+# Builds metrics from live state at scrape time, e.g. a histogram of current room sizes
+Collector = Callable[[], Iterable[Metric]]
+
+
+class Registry:
+    """Set of metrics rendered together by a /metrics endpoint"""
+
+    def __init__(self) -> None:
+        self._metrics: dict = {}
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering a name returns the existing metric, so modules can be re-imported
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        # For collectors of state that is torn down with the app, e.g. in a lifespan
+        self._collectors.remove(collector)
+
+    def render(self) -> str:
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            metrics.extend(collector())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> int:
+    """Current RSS of this process; peak RSS where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+PROCESS_START_TIME = time.time()
+
+REGISTRY = Registry()
+REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", resident_memory_bytes)
+REGISTRY.gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.", lambda: PROCESS_START_TIME)
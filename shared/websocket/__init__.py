@@ -0,0 +1,28 @@
+from .codec import Codec, FrameDecodeError, JSON_CODEC, MSGPACK_CODEC, negotiate_codec
+from .frames import Frame, encode_frame
+from .heartbeat import Heartbeat
+from .metrics import FANOUT_SECONDS, register_connection_metrics
+from .outbound import ConnectionWriter, OverflowPolicy
+from .rate_limit import RateLimit, RateLimiter, TokenBucket
+from .rooms import RoomRegistry
+from .timer_wheel import TimerWheel
+
+__all__ = [
+    'Codec',
+    'FrameDecodeError',
+    'JSON_CODEC',
+    'MSGPACK_CODEC',
+    'negotiate_codec',
+    'Frame',
+    'encode_frame',
+    'Heartbeat',
+    'FANOUT_SECONDS',
+    'register_connection_metrics',
+    'ConnectionWriter',
+    'OverflowPolicy',
+    'RateLimit',
+    'RateLimiter',
+    'TokenBucket',
+    'RoomRegistry',
+    'TimerWheel'
+]
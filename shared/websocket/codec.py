@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar, Union
+
+import msgpack
+from fastapi import WebSocket
+from pydantic import BaseModel, ValidationError
+from pydantic_core import SchemaValidator, core_schema
+
+from .frames import Frame
+from .metrics import FRAMES_IN
+
+M = TypeVar("M", bound=BaseModel)
+
+MSGPACK_SUBPROTOCOL = "socket-hub.msgpack"
+
+
+class FrameDecodeError(ValueError):
+    """Raised when an inbound frame is not valid for the connection's codec"""
+
+
+class Codec:
+    """
+    Wire format of a WebSocket connection, chosen during the handshake.
+
+    JSON over text frames is the default; other formats are negotiated
+    through Sec-WebSocket-Protocol.
+    """
+    name = "JSON"
+    subprotocol: Optional[str] = None
+
+    async def receive(self, websocket: WebSocket) -> Union[str, bytes]:
+        raw = await websocket.receive_text()
+        FRAMES_IN.inc()
+        return raw
+
+    def decode(self, raw: Union[str, bytes], model: Type[M]) -> M:
+        # Parse and validate in one pass inside pydantic-core, no intermediate dict
+        try:
+            return model.model_validate_json(raw)
+        except ValidationError as e:
+            if e.errors()[0]["type"] == "json_invalid":
+                raise FrameDecodeError(e.errors()[0]["msg"]) from e
+            raise
+
+    async def send(self, websocket: WebSocket, frame: Frame) -> None:
+        await websocket.send_text(frame.text)
+
+
+class MsgPackCodec(Codec):
+    """
+    MessagePack over binary frames.
+
+    Inbound frames may be maps, or arrays holding the model's fields in
+    declaration order, e.g. ["message", "hello", "room-1", "user-1", <ts>]
+    for MessageRequest. Arrays carry no key strings at all on the wire, and
+    are validated positionally straight into the model, without building a
+    keyed dict first. Trailing fields with defaults may be left out.
+    """
+    name = "MessagePack"
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    def __init__(self) -> None:
+        # (model, array length) -> validator, or None when the model cannot take arrays of that length
+        self._positional: Dict[Tuple[type, int], Optional[SchemaValidator]] = {}
+
+    async def receive(self, websocket: WebSocket) -> Union[str, bytes]:
+        raw = await websocket.receive_bytes()
+        FRAMES_IN.inc()
+        return raw
+
+    def decode(self, raw: Union[str, bytes], model: Type[M]) -> M:
+        try:
+            # timestamp=3 turns MessagePack timestamps straight into datetimes
+            data = msgpack.unpackb(raw, timestamp=3)
+        except (msgpack.UnpackException, ValueError, TypeError) as e:
+            raise FrameDecodeError(str(e)) from e
+
+        if isinstance(data, (list, tuple)):
+            key = (model, len(data))
+            validator = self._positional.get(key, False)
+            if validator is False:
+                validator = self._positional[key] = _positional_validator(model, len(data))
+            if validator is not None:
+                return validator.validate_python(data)
+            data = dict(zip(model.model_fields, data))
+        elif not isinstance(data, dict):
+            raise FrameDecodeError("MessagePack frame must be a map or an array")
+        return model.model_validate(data)
+
+    async def send(self, websocket: WebSocket, frame: Frame) -> None:
+        await websocket.send_bytes(frame.packed)
+
+
+def _positional_validator(model: Type[M], length: int) -> Optional[SchemaValidator]:
+    """
+    Validator turning an array of the first `length` fields into `model`.
+
+    It reuses the model's own field schemas, constraints and field validators
+    included, under a tuple schema. Models whose schema is not a plain field
+    list (e.g. with model validators), and lengths that leave out a required
+    field or exceed the field count, get None and go through a dict instead.
+    """
+    schema = model.__pydantic_core_schema__
+    if schema["type"] != "model" or schema["schema"]["type"] != "model-fields":
+        return None
+    fields = schema["schema"]["fields"]
+    names = tuple(model.model_fields)
+    present = names[:length]
+    missing = [(name, model.model_fields[name]) for name in names[length:]]
+    if length > len(names) or any(field.is_required() for _, field in missing):
+        return None
+    fields_set = set(present)
+
+    def to_model(values: List[Any]):
+        # Shape the model validator expects from its inner schema: (__dict__, extra, fields set)
+        data = dict(zip(present, values))
+        for name, field in missing:
+            data[name] = field.get_default(call_default_factory=True)
+        return data, None, fields_set
+
+    return SchemaValidator(core_schema.model_schema(
+        model,
+        core_schema.chain_schema([
+            _tuple_schema([fields[name]["schema"] for name in present]),
+            core_schema.no_info_plain_validator_function(to_model)
+        ]),
+        config=schema.get("config")
+    ))
+
+
+def _tuple_schema(items_schema: List[core_schema.CoreSchema]) -> core_schema.CoreSchema:
+    # pydantic-core 2.16 deprecated tuple_positional_schema in favour of tuple_schema
+    if hasattr(core_schema, "tuple_schema"):
+        return core_schema.tuple_schema(items_schema)
+    return core_schema.tuple_positional_schema(items_schema)
+
+
+JSON_CODEC = Codec()
+MSGPACK_CODEC = MsgPackCodec()
+
+_CODECS = {MSGPACK_SUBPROTOCOL: MSGPACK_CODEC}
+
+
+def negotiate_codec(websocket: WebSocket) -> Codec:
+    """Pick the first subprotocol offered by the client that we speak"""
+    for subprotocol in websocket.scope.get("subprotocols", ()):
+        codec = _CODECS.get(subprotocol)
+        if codec is not None:
+            return codec
+    return JSON_CODEC
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import msgpack
+import orjson
+
+
+class Frame:
+    """
+    Outbound message serialized at most once per wire format.
+
+    A broadcast builds one Frame and puts the same instance in every
+    recipient's queue, so encoding cost no longer scales with room size.
+    The JSON text and the MessagePack bytes are each produced on first use,
+    so a room with only JSON clients never pays for MessagePack and vice versa.
+
+    Room messages may carry their per-room sequence number so writers can
+    track how far each connection has actually been delivered.
+    """
+    __slots__ = ("payload", "droppable", "room_id", "seq", "_text", "_data", "_packed")
+
+    def __init__(
+        self,
+        text: Optional[str] = None,
+        droppable: bool = False,
+        payload: Optional[Dict[str, Any]] = None,
+        room_id: Optional[str] = None,
+        seq: Optional[int] = None
+    ) -> None:
+        self.payload = payload
+        self.droppable = droppable
+        self.room_id = room_id
+        self.seq = seq
+        self._text = text
+        self._data: Optional[bytes] = None
+        self._packed: Optional[bytes] = None
+
+    @property
+    def text(self) -> str:
+        """JSON (or plain) text payload"""
+        if self._text is None:
+            self._text = self.data.decode("utf-8")
+        return self._text
+
+    @property
+    def data(self) -> bytes:
+        """UTF-8 payload, encoded on first use and shared afterwards"""
+        if self._data is None:
+            if self._text is not None:
+                self._data = self._text.encode("utf-8")
+            else:
+                # orjson writes UTF-8 bytes directly and handles datetimes natively
+                self._data = orjson.dumps(self.payload)
+        return self._data
+
+    @property
+    def packed(self) -> bytes:
+        """MessagePack payload, encoded on first use and shared afterwards"""
+        if self._packed is None:
+            source = self.payload if self.payload is not None else _text_payload(self._text)
+            self._packed = msgpack.packb(source, default=_msgpack_default)
+        return self._packed
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def _text_payload(text: str) -> Any:
+    # Frames built from pre-serialized JSON are re-packed as maps, anything else as a string
+    if text[:1] == "{":
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return text
+
+
+def encode_frame(
+    payload: Dict[str, Any],
+    droppable: bool = False,
+    room_id: Optional[str] = None,
+    seq: Optional[int] = None
+) -> Frame:
+    """Wrap a message dict in a Frame ready to be fanned out"""
+    return Frame(droppable=droppable, payload=payload, room_id=room_id, seq=seq)
@@ -0,0 +1,144 @@
+import asyncio
+import math
+import os
+from typing import Optional, Set, Union
+
+import msgpack
+import orjson
+
+from .frames import encode_frame
+from .metrics import HEARTBEAT_REAPED
+from .outbound import ConnectionWriter
+from .timer_wheel import TimerWheel
+
+# Seconds of silence before the server pings, and how long a ping may go unanswered
+HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+HEARTBEAT_TIMEOUT = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "10"))
+# Wheel resolution; a dead connection is reaped at most one tick late
+HEARTBEAT_TICK = float(os.getenv("WS_HEARTBEAT_TICK", "1"))
+
+# Close code for connections that stopped answering pings (RFC 6455 "Going Away")
+HEARTBEAT_CLOSE_CODE = 1001
+
+# Shared by every connection; each wire format is encoded once
+PING_FRAME = encode_frame({"type": "ping"})
+PONG_FRAME = encode_frame({"type": "pong"})
+
+# Control frames are tiny; anything bigger is not worth parsing twice
+_CONTROL_MAX_SIZE = 64
+
+
+def control_type(raw: Union[str, bytes]) -> Optional[str]:
+    """"ping" or "pong" for heartbeat frames, None for everything else"""
+    if len(raw) > _CONTROL_MAX_SIZE:
+        return None
+    try:
+        if isinstance(raw, str):
+            if "p" not in raw:
+                return None
+            data = orjson.loads(raw)
+        else:
+            data = msgpack.unpackb(raw)
+    except (orjson.JSONDecodeError, msgpack.UnpackException, ValueError, TypeError):
+        return None
+    if isinstance(data, dict):
+        kind = data.get("type")
+    elif isinstance(data, (list, tuple)) and data:
+        # MessagePack clients may send the fields as an array, type first
+        kind = data[0]
+    else:
+        return None
+    return kind if kind in ("ping", "pong") else None
+
+
+class Heartbeat:
+    """
+    Server-driven ping/pong supervision for every connection of a manager.
+
+    Any inbound frame counts as a sign of life. A connection that has been
+    silent for `interval` seconds gets {"type": "ping"}; if nothing arrives
+    within `timeout` seconds after that, it is closed and its manager cleans
+    up through the writer's on_close callback. All deadlines live in one
+    TimerWheel advanced by a single task, so idle connections cost a dict
+    entry each and no per-connection tasks or timers.
+    """
+
+    def __init__(
+        self,
+        interval: float = HEARTBEAT_INTERVAL,
+        timeout: float = HEARTBEAT_TIMEOUT,
+        tick: float = HEARTBEAT_TICK
+    ) -> None:
+        self.interval = interval
+        self.timeout = timeout
+        self.tick = tick
+        self.enabled = interval > 0
+        self._interval_ticks = max(1, math.ceil(interval / tick)) if self.enabled else 0
+        self._timeout_ticks = max(1, math.ceil(timeout / tick))
+        self.wheel = TimerWheel()
+        # Connections with an unanswered ping
+        self._pinged: Set[ConnectionWriter] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, writer: ConnectionWriter) -> None:
+        if not self.enabled:
+            return
+        self.wheel.schedule(writer, self.wheel.now + self._interval_ticks)
+        self._ensure_running()
+
+    def seen(self, writer: ConnectionWriter) -> None:
+        """The connection sent something; called for every inbound frame"""
+        if self._pinged:
+            self._pinged.discard(writer)
+        self.wheel.touch(writer, self.wheel.now + self._interval_ticks)
+
+    def remove(self, writer: ConnectionWriter) -> None:
+        self.wheel.cancel(writer)
+        self._pinged.discard(writer)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Runs while there are connections to supervise
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while len(self.wheel):
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            for writer in self.wheel.advance():
+                self._expired(writer)
+
+    def _expired(self, writer: ConnectionWriter) -> None:
+        if writer.closed:
+            self._pinged.discard(writer)
+        elif writer in self._pinged:
+            # Silent through a whole ping timeout: half-open or hung client
+            self._pinged.discard(writer)
+            HEARTBEAT_REAPED.inc()
+            writer.abort(HEARTBEAT_CLOSE_CODE)
+        else:
+            self._pinged.add(writer)
+            writer.enqueue(PING_FRAME)
+            self.wheel.schedule(writer, self.wheel.now + self._timeout_ticks)
+
+    def handle_control(self, raw: Union[str, bytes], writer: ConnectionWriter) -> bool:
+        """
+        Consume heartbeat frames before they reach message validation.
+        Client pings are answered with a pong. Returns True if `raw` was one.
+        """
+        kind = control_type(raw)
+        if kind is None:
+            return False
+        if kind == "ping":
+            writer.enqueue(PONG_FRAME)
+        return True
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,55 @@
+from typing import TYPE_CHECKING, Dict
+from weakref import WeakKeyDictionary
+
+from ..metrics import REGISTRY, Gauge, Histogram, Registry
+
+if TYPE_CHECKING:
+    from .outbound import ConnectionWriter
+    from .rooms import RoomRegistry
+
+# Frames per second come from rate() over these counters
+FRAMES_IN = REGISTRY.counter("socket_hub_ws_frames_in_total", "WebSocket frames received from clients.")
+FRAMES_OUT = REGISTRY.counter("socket_hub_ws_frames_out_total", "WebSocket frames sent to clients.")
+FRAMES_DROPPED = REGISTRY.counter("socket_hub_ws_frames_dropped_total", "Outbound frames dropped because a send queue was full.")
+HEARTBEAT_REAPED = REGISTRY.counter("socket_hub_ws_heartbeat_reaped_total", "Connections closed for not answering a heartbeat ping.")
+FANOUT_SECONDS = REGISTRY.histogram("socket_hub_ws_fanout_seconds", "Time to enqueue one broadcast for every local room member.")
+
+ROOM_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+# Per registry: the live connection managers' state, keyed weakly by their RoomRegistry
+_connection_sources: "Dict[int, WeakKeyDictionary[RoomRegistry, Dict[str, ConnectionWriter]]]" = {}
+
+
+def register_connection_metrics(writers: Dict[str, "ConnectionWriter"], rooms: "RoomRegistry", registry: Registry = REGISTRY) -> None:
+    """
+    Export a connection manager's live state. Everything here is computed
+    at scrape time from the manager's own dicts, so connect, join and send
+    do not maintain any extra counters.
+
+    One collector per registry covers every manager registered with it, so
+    building several managers (tests, benchmarks) never duplicates series,
+    and a manager that is garbage collected drops out on its own.
+    """
+    sources = _connection_sources.get(id(registry))
+    if sources is None:
+        sources = _connection_sources[id(registry)] = WeakKeyDictionary()
+        registry.add_collector(lambda: _collect_connections(sources))
+    sources[rooms] = writers
+
+
+def _collect_connections(sources: "WeakKeyDictionary[RoomRegistry, Dict[str, ConnectionWriter]]") -> list:
+    managers = list(sources.items())
+    depths = [writer.depth for _, writers in managers for writer in writers.values()]
+    connections = sum(len(writers) for _, writers in managers)
+    room_count = sum(len(rooms.rooms) for rooms, _ in managers)
+    return [
+        Gauge("socket_hub_ws_active_connections", "Open WebSocket connections.", lambda: connections),
+        Gauge("socket_hub_ws_rooms", "Rooms with at least one local member.", lambda: room_count),
+        Histogram("socket_hub_ws_room_size", "Local members per room.", ROOM_SIZE_BUCKETS).observe_many(
+            len(members) for rooms, _ in managers for members in rooms.rooms.values()
+        ),
+        Histogram("socket_hub_ws_send_queue_depth", "Frames waiting in each connection's send queue.", QUEUE_DEPTH_BUCKETS).observe_many(depths),
+        Gauge("socket_hub_ws_send_queue_depth_max", "Deepest send queue across connections.", lambda: max(depths, default=0)),
+    ]
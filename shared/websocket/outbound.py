@@ -0,0 +1,147 @@
+import asyncio
+import os
+from collections import deque
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from fastapi import WebSocket
+
+from .codec import JSON_CODEC, Codec
+from .frames import Frame
+from .metrics import FRAMES_DROPPED, FRAMES_OUT
+
+
+class OverflowPolicy(str, Enum):
+    """What to do when a connection's outbound queue is full"""
+    DROP_OLDEST = "drop_oldest"
+    DROP_TYPING_FIRST = "drop_typing_first"
+    DISCONNECT = "disconnect"
+
+
+# Close code sent to consumers that cannot keep up (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+OVERFLOW_POLICY = OverflowPolicy(os.getenv("WS_OVERFLOW_POLICY", OverflowPolicy.DROP_OLDEST.value))
+
+
+class ConnectionWriter:
+    """
+    Bounded outbound queue for a single WebSocket, drained by its own task.
+
+    Producers only call `enqueue`, which never awaits, so a slow client can
+    only ever fill its own queue instead of stalling the whole room.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        max_queue: int = SEND_QUEUE_SIZE,
+        policy: OverflowPolicy = OVERFLOW_POLICY,
+        codec: Codec = JSON_CODEC,
+        on_close: Optional[Callable[["ConnectionWriter"], Awaitable[None]]] = None
+    ) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.codec = codec
+        self.on_close = on_close
+        self.dropped = 0
+        self.closed = False
+        # room_id -> sequence number of the last room message actually sent
+        self.cursors: Dict[str, int] = {}
+        # Frames are shared between every queue they were broadcast to
+        self._queue: Deque[Frame] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Queue a frame for delivery. Returns False if it was not queued."""
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == OverflowPolicy.DISCONNECT:
+                self.abort()
+                return False
+            if frame.droppable and self.policy == OverflowPolicy.DROP_TYPING_FIRST:
+                # A fresh typing frame is the least valuable thing to keep
+                self.dropped += 1
+                FRAMES_DROPPED.inc()
+                return False
+            self._evict()
+
+        self._queue.append(frame)
+        self._ready.set()
+        return True
+
+    def _evict(self) -> None:
+        if self.policy == OverflowPolicy.DROP_TYPING_FIRST:
+            for index, queued in enumerate(self._queue):
+                if queued.droppable:
+                    del self._queue[index]
+                    self.dropped += 1
+                    FRAMES_DROPPED.inc()
+                    return
+        self._queue.popleft()
+        self.dropped += 1
+        FRAMES_DROPPED.inc()
+
+    def abort(self, code: int = SLOW_CONSUMER_CLOSE_CODE) -> None:
+        """Drop pending frames, close the socket with `code` and notify the owner"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _run(self) -> None:
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                frame = self._queue.popleft()
+                await self.codec.send(self.websocket, frame)
+                FRAMES_OUT.inc()
+                if frame.seq is not None:
+                    self.cursors[frame.room_id] = frame.seq
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; let the owner clean up its bookkeeping
+            self.closed = True
+            self._queue.clear()
+            if self.on_close:
+                await self.on_close(self)
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+        if self.on_close:
+            await self.on_close(self)
+
+    async def close(self) -> None:
+        """Stop the writer task; pending messages are discarded."""
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,169 @@
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+
+# Budgeted frame types; anything else (leave_room, heartbeats) is not limited
+KINDS = ("message", "typing", "join")
+
+# "<tokens per second>/<burst>", overridable as WS_RATE_<SCOPE>_<KIND>, e.g. WS_RATE_ROOM_MESSAGE=200/400.
+# Per-user budgets survive reconnects; per-room budgets cap what one room can push through fan-out.
+DEFAULT_LIMITS = {
+    ("connection", "message"): "10/20",
+    ("connection", "typing"): "5/10",
+    ("connection", "join"): "5/20",
+    ("user", "message"): "20/40",
+    ("user", "typing"): "10/20",
+    ("user", "join"): "10/40",
+    ("room", "message"): "100/200",
+    ("room", "typing"): "50/100",
+    ("room", "join"): "50/200",
+}
+
+# How often idle user and room buckets are dropped
+SWEEP_INTERVAL = float(os.getenv("WS_RATE_SWEEP_INTERVAL", "60"))
+
+
+class RateLimit:
+    """Refill rate (tokens per second) and burst size, shared by every bucket it governs"""
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        if rate <= 0:
+            raise ValueError(f"Rate limit needs a positive rate, got {rate}")
+        if burst < 1:
+            raise ValueError(f"Rate limit burst must allow at least one frame, got {burst}")
+        self.rate = rate
+        self.burst = burst
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional["RateLimit"]:
+        """"10/20" -> 10 per second, bursts of 20; "", "0" or a rate of 0 ("0/5") disables the limit"""
+        spec = spec.strip()
+        if not spec:
+            return None
+        rate, _, burst = spec.partition("/")
+        if float(rate) == 0:
+            return None
+        return cls(float(rate), float(burst or rate))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled lazily on use.
+
+    The rate and burst live in a shared RateLimit, so a bucket is just two
+    floats and thousands of them per node cost next to nothing.
+    """
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, limit: RateLimit, now: float) -> None:
+        self.tokens = limit.burst
+        self.updated = now
+
+    def refill(self, limit: RateLimit, now: float) -> float:
+        tokens = self.tokens + (now - self.updated) * limit.rate
+        self.tokens = tokens if tokens < limit.burst else limit.burst
+        self.updated = now
+        return self.tokens
+
+    def allow(self, limit: RateLimit, now: float, cost: float = 1.0) -> bool:
+        if self.refill(limit, now) >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def retry_after(self, limit: RateLimit, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available, as of the last refill"""
+        return max(0.0, (cost - self.tokens) / limit.rate)
+
+    def is_full(self, limit: RateLimit, now: float) -> bool:
+        return self.tokens + (now - self.updated) * limit.rate >= limit.burst
+
+
+class ConnectionBuckets:
+    """Per-connection budgets; owned by the endpoint and gone with the socket"""
+    __slots__ = ("message", "typing", "join", "notified")
+
+    def __init__(self) -> None:
+        self.message: Optional[TokenBucket] = None
+        self.typing: Optional[TokenBucket] = None
+        self.join: Optional[TokenBucket] = None
+        # An error frame was already sent for the current run of rejections
+        self.notified = False
+
+
+class RateLimiter:
+    """
+    Checks a frame against connection, user and room budgets at once.
+
+    Tokens are only taken when every scope has enough, so a frame rejected
+    by its room does not also eat into the sender's own budget.
+    """
+
+    def __init__(self, limits: Optional[Dict[Tuple[str, str], Optional[RateLimit]]] = None) -> None:
+        if limits is None:
+            limits = {
+                key: RateLimit.parse(os.getenv(f"WS_RATE_{key[0].upper()}_{key[1].upper()}", default))
+                for key, default in DEFAULT_LIMITS.items()
+            }
+        self.limits = limits
+        self._users: Dict[Tuple[str, str], TokenBucket] = {}
+        self._rooms: Dict[Tuple[str, str], TokenBucket] = {}
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+        self.rejected = {
+            kind: REGISTRY.counter(f"socket_hub_ws_rate_limited_{kind}_total", f"{kind} frames rejected by rate limits.")
+            for kind in KINDS
+        }
+
+    def connection(self) -> ConnectionBuckets:
+        return ConnectionBuckets()
+
+    def check(self, kind: str, connection: ConnectionBuckets, user_id: str, room_id: str) -> float:
+        """
+        Take one token from every scope for `kind`.
+        Returns 0.0 if the frame is allowed, otherwise seconds until it would be.
+        """
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        checks = []
+        limit = self.limits.get(("connection", kind))
+        if limit is not None:
+            bucket = getattr(connection, kind)
+            if bucket is None:
+                bucket = TokenBucket(limit, now)
+                setattr(connection, kind, bucket)
+            checks.append((bucket, limit))
+        for scope, buckets, key in (("user", self._users, (kind, user_id)), ("room", self._rooms, (kind, room_id))):
+            limit = self.limits.get((scope, kind))
+            if limit is not None:
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = TokenBucket(limit, now)
+                checks.append((bucket, limit))
+
+        wait = 0.0
+        for bucket, limit in checks:
+            if bucket.refill(limit, now) < 1.0:
+                wait = max(wait, bucket.retry_after(limit))
+        if wait:
+            self.rejected[kind].inc()
+            return wait
+
+        for bucket, _ in checks:
+            bucket.tokens -= 1.0
+        connection.notified = False
+        return 0.0
+
+    def _sweep(self, now: float) -> None:
+        # A bucket that has refilled completely is indistinguishable from a new one
+        for scope, buckets in (("user", self._users), ("room", self._rooms)):
+            for key, bucket in list(buckets.items()):
+                limit = self.limits.get((scope, key[0]))
+                # Buckets of a limit that has been removed are not checked anymore either
+                if limit is None or bucket.is_full(limit, now):
+                    del buckets[key]
+        self._next_sweep = now + SWEEP_INTERVAL
@@ -0,0 +1,67 @@
+from typing import Dict, List, Set
+
+
+class RoomRegistry:
+    """
+    Room membership kept as two indexes that are updated together:
+    room -> users and user -> rooms.
+
+    Every operation only touches the rooms of the user involved, so
+    disconnecting someone costs the same with 10 rooms or 100k rooms.
+    Rooms are dropped as soon as their last member leaves.
+    """
+
+    def __init__(self) -> None:
+        self.rooms: Dict[str, Set[str]] = {}
+        self.user_rooms: Dict[str, Set[str]] = {}
+
+    def join(self, room_id: str, user_id: str) -> bool:
+        """Add a member. Returns True if the room was created by this join."""
+        members = self.rooms.get(room_id)
+        created = members is None
+        if created:
+            members = self.rooms[room_id] = set()
+        members.add(user_id)
+
+        user_rooms = self.user_rooms.get(user_id)
+        if user_rooms is None:
+            user_rooms = self.user_rooms[user_id] = set()
+        user_rooms.add(room_id)
+        return created
+
+    def leave(self, room_id: str, user_id: str) -> bool:
+        """Remove a member. Returns False if the user was not in the room."""
+        members = self.rooms.get(room_id)
+        if members is None or user_id not in members:
+            return False
+
+        self._discard_member(room_id, members, user_id)
+        user_rooms = self.user_rooms[user_id]
+        user_rooms.discard(room_id)
+        if not user_rooms:
+            del self.user_rooms[user_id]
+        return True
+
+    def remove_user(self, user_id: str) -> List[str]:
+        """Remove a user from every room they are in and return those rooms."""
+        user_rooms = self.user_rooms.pop(user_id, None)
+        if not user_rooms:
+            return []
+
+        for room_id in user_rooms:
+            self._discard_member(room_id, self.rooms[room_id], user_id)
+        return list(user_rooms)
+
+    def members(self, room_id: str) -> Set[str]:
+        return self.rooms.get(room_id, set())
+
+    def rooms_of(self, user_id: str) -> Set[str]:
+        return self.user_rooms.get(user_id, set())
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self.rooms
+
+    def _discard_member(self, room_id: str, members: Set[str], user_id: str) -> None:
+        members.discard(user_id)
+        if not members:
+            del self.rooms[room_id]
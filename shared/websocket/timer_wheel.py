@@ -0,0 +1,91 @@
+from typing import Dict, Hashable, List, Set
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel keyed by arbitrary hashable objects.
+
+    Time is counted in integer ticks driven by `advance`. Level 0 has one
+    slot per tick, and each higher level has slots that cover `slots` times
+    more ticks. A far deadline sits in a coarse slot and cascades down as it
+    gets closer, so scheduling and expiring are O(1) no matter how many keys
+    are tracked.
+
+    Deadlines are rescheduled lazily. `touch` only updates a dict entry;
+    the key stays in its current slot and is moved when that slot comes due
+    and the recorded deadline turns out to be later. Connections that keep
+    talking therefore never touch the wheel itself.
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 3) -> None:
+        self.slots = slots
+        self.levels = levels
+        self.now = 0
+        self._spans = [slots ** level for level in range(levels)]
+        self._wheels: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        # The source of truth; slot entries without a matching deadline are stale and skipped
+        self._deadlines: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, deadline: int) -> None:
+        """Track `key` until tick `deadline`, replacing its current deadline"""
+        deadline = max(deadline, self.now + 1)
+        previous = self._deadlines.get(key)
+        self._deadlines[key] = deadline
+        if previous is None or deadline < previous:
+            self._insert(key, deadline)
+
+    def touch(self, key: Hashable, deadline: int) -> None:
+        """Push a tracked key's deadline later; unknown keys are ignored"""
+        previous = self._deadlines.get(key)
+        if previous is not None and deadline > previous:
+            self._deadlines[key] = deadline
+
+    def cancel(self, key: Hashable) -> None:
+        self._deadlines.pop(key, None)
+
+    def _insert(self, key: Hashable, deadline: int) -> None:
+        delta = max(deadline - self.now, 0)
+        level = 0
+        while level < self.levels - 1 and delta >= self._spans[level + 1]:
+            level += 1
+        if level == self.levels - 1 and delta >= self._spans[level] * self.slots:
+            # Beyond the wheel's horizon: park in the farthest slot and re-check from there
+            deadline = self.now + self._spans[level] * self.slots - 1
+        span = self._spans[level]
+        self._wheels[level][(deadline // span) % self.slots].add(key)
+
+    def advance(self) -> List[Hashable]:
+        """Move one tick forward and return the keys whose deadline has passed"""
+        self.now += 1
+        now = self.now
+
+        # Coarser levels first, so cascaded keys can land in the level-0 slot due now
+        for level in range(self.levels - 1, 0, -1):
+            span = self._spans[level]
+            if now % span == 0:
+                index = (now // span) % self.slots
+                due, self._wheels[level][index] = self._wheels[level][index], set()
+                for key in due:
+                    deadline = self._deadlines.get(key)
+                    if deadline is not None:
+                        self._insert(key, deadline)
+
+        index = now % self.slots
+        due, self._wheels[0][index] = self._wheels[0][index], set()
+        expired = []
+        for key in due:
+            deadline = self._deadlines.get(key)
+            if deadline is None:
+                continue
+            if deadline <= now:
+                del self._deadlines[key]
+                expired.append(key)
+            else:
+                self._insert(key, deadline)
+        return expired